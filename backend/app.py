@@ -1,15 +1,29 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect, Form
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Literal, Set, Tuple
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
 import json
 import uuid
 import os
 import pathlib
+import time
+import weakref
 from dotenv import load_dotenv
 
-from utils.workflow_engine import Workflow, NodeConnection
+from utils.workflow_engine import Workflow, NodeConnection, RunContext, INGESTION_NODE_TYPES, creates_cycle
+from utils.ingestion_cache import IngestionCache
+from utils.document_sessions import DocumentSession, DocumentSessionStore
+from utils.executors import run_blocking, shutdown_pools
+from utils.openai_client import close_clients
+from utils.index_store import IndexStore, resident_indexes
+from utils.events import EventBus
+from utils.workflow_cache import WorkflowCache
+from utils.position_writes import PositionWriteBuffer
+from utils.uploads import InvalidUpload, UploadSpool, SpooledUpload, UploadTooLarge
 from nodes.pdf_loader import PDFLoaderNode
 from nodes.text_splitter import TextSplitterNode
 from nodes.embeddings import EmbeddingsNode
@@ -17,9 +31,9 @@ from nodes.vector_store import VectorStoreNode
 from nodes.qa_chain import QAChainNode
 from nodes.web_search import WebSearchNode
 try:
-    from database import init_db, get_db, WorkflowModel, NodeModel, ConnectionModel
+    from database import init_db, dispose_db, SessionLocal, workflow_graph_query, WorkflowModel, NodeModel, ConnectionModel
     from components.config_panel import NodeConfigSchema
-    from sqlalchemy.orm import Session
+    from sqlalchemy import select, insert, update, delete, or_, bindparam
     DB_ENABLED = True
 except ImportError:
     DB_ENABLED = False
@@ -76,17 +90,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active workflows (in-memory cache)
-active_workflows: Dict[str, Workflow] = {}
-
-# Initialize database if available
-if DB_ENABLED:
+# Reuse chunks and FAISS indexes across uploads of the same document
+ingestion_cache: Optional[IngestionCache] = None
+if os.getenv("INGESTION_CACHE_ENABLED", "true").lower() not in ("0", "false", "no"):
     try:
-        init_db()
-        print("✓ Database initialized successfully")
+        ingestion_cache = IngestionCache.from_env()
     except Exception as e:
-        print(f"Warning: Database initialization failed: {e}")
-        DB_ENABLED = False
+        print(f"Warning: Ingestion cache disabled: {e}")
+
+# Request files are streamed here and deleted when their request is done
+upload_spool = UploadSpool.from_env()
+
+# Ingested documents that can be queried without re-uploading
+document_sessions = DocumentSessionStore.from_env()
+
+# Live progress events, fanned out to /ws/{workflow_id} subscribers
+event_bus = EventBus.from_env()
+
+# Vector store indexes saved per workflow node, reopened lazily on first use
+index_store: Optional[IndexStore] = None
+try:
+    index_store = IndexStore.from_env()
+except Exception as e:
+    print(f"Warning: Index persistence disabled: {e}")
+
+# Store active workflows (in-memory cache). Evicted workflows reload lazily from
+# the database, so without one nothing is ever evicted (set at startup).
+active_workflows = WorkflowCache.from_env(evict=False)
+
+# Serializes cold loads of the same workflow so concurrent requests share one instance
+workflow_load_locks: Dict[str, asyncio.Lock] = {}
+
+# Serializes graph edits of one workflow, so an edit is validated, written and applied
+# against a graph nothing else changes meanwhile; a lock goes away once nobody holds it
+workflow_edit_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+# Canvas drags update positions in memory at once; the database catches up in batches
+position_writes = PositionWriteBuffer.from_env()
+
+# Long-running tasks started at startup and cancelled at shutdown
+background_tasks: List[asyncio.Task] = []
 
 class CreateWorkflowRequest(BaseModel):
     name: str
@@ -110,10 +153,34 @@ class ExecuteWorkflowRequest(BaseModel):
     workflow_id: str
     question: str
 
+class AskDocumentRequest(BaseModel):
+    workflow_id: str
+    # Omit to query the index the workflow built on its last run
+    document_id: Optional[str] = None
+    question: str
+
 class UpdateNodePositionRequest(BaseModel):
     x: float
     y: float
 
+class GraphOperation(BaseModel):
+    op: Literal["add_node", "remove_node", "connect", "move", "update_config"]
+    # Client-chosen handle for a node added in this batch; later operations may use it as a node id
+    ref: Optional[str] = None
+    node_id: Optional[str] = None
+    node_type: Optional[str] = None
+    config: Optional[Dict[str, Any]] = None
+    position: Optional[Dict[str, float]] = None
+    source_node: Optional[str] = None
+    source_output: Optional[str] = None
+    target_node: Optional[str] = None
+    target_input: Optional[str] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+
+class BatchGraphEditRequest(BaseModel):
+    operations: List[GraphOperation]
+
 def _safe_float(value: Any) -> float:
     try:
         if value is None:
@@ -150,7 +217,8 @@ def _json_sanitise(value: Any, *, max_depth: int = 5) -> Any:
 def build_node_instance(node_type: str, config: Optional[Dict[str, Any]] = None):
     cfg = config or {}
     if node_type == "pdf_loader":
-        return PDFLoaderNode()
+        node_config = PDFLoaderNode.Config(**cfg)
+        return PDFLoaderNode(node_config)
     elif node_type == "text_splitter":
         node_config = TextSplitterNode.Config(**cfg)
         return TextSplitterNode(node_config)
@@ -203,47 +271,180 @@ def build_node_instance(node_type: str, config: Optional[Dict[str, Any]] = None)
     else:
         raise HTTPException(status_code=400, detail=f"Unknown node type: {node_type}")
 
-def ensure_workflow_loaded(workflow_id: str) -> Workflow:
+def workflow_events(workflow_id: str) -> Callable[[Dict[str, Any]], None]:
+    def publish(event: Dict[str, Any]):
+        event_bus.publish(workflow_id, {**event, "workflow_id": workflow_id})
+    return publish
+
+def workflow_edit_lock(workflow_id: str) -> asyncio.Lock:
+    lock = workflow_edit_locks.get(workflow_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        workflow_edit_locks[workflow_id] = lock
+    return lock
+
+def attach_index_store(workflow_id: str, node_id: str, node: Any):
+    if index_store is not None and getattr(node, "type", None) == "vector_store":
+        node.persist_path = index_store.path_for(workflow_id, node_id)
+
+def raise_workflow_errors(context: RunContext, fallback: str):
+    """Raise an HTTP 500 naming every node that errored in this run."""
+    error_messages = context.errors()
+    if error_messages:
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Workflow execution failed: {'; '.join(error_messages)}"
+        )
+    raise HTTPException(status_code=500, detail=f"Workflow execution failed: {fallback}")
+
+async def load_workflow_model(db: Any, workflow_id: str) -> Optional[Any]:
+    """Fetch a workflow row together with its whole graph in a single query."""
+    result = await db.execute(workflow_graph_query(workflow_id))
+    return result.unique().scalar_one_or_none()
+
+def hydrate_workflow(workflow_id: str, workflow_model: Any) -> Workflow:
+    """Build the in-memory Workflow from a model loaded by load_workflow_model."""
+    workflow = Workflow(custom_prompt=workflow_model.custom_prompt)
+    
+    # Creation order keeps execution order ties stable across reloads
+    node_models = sorted(workflow_model.nodes, key=lambda n: (n.created_at is None, n.created_at, n.id))
+    connection_models = []
+    for node_model in node_models:
+        node_instance = build_node_instance(node_model.node_type, node_model.config or {})
+        # Saved indexes are reopened on first use, not here
+        attach_index_store(workflow_id, node_model.id, node_instance)
+        workflow.add_node(node_model.id, node_instance)
+        workflow.nodes[node_model.id]['config'] = node_model.config or {}
+        workflow.set_node_position(
+            node_model.id,
+            _safe_float(node_model.position_x),
+            _safe_float(node_model.position_y)
+        )
+        connection_models.extend(
+            conn for conn in node_model.connections_as_target if conn.workflow_id == workflow_id
+        )
+    
+    connection_models.sort(key=lambda c: (c.created_at is None, c.created_at, c.id))
+    for conn_model in connection_models:
+        connection = NodeConnection(
+            id=conn_model.id,
+            source_node=conn_model.source_node_id,
+            source_output=conn_model.source_output,
+            target_node=conn_model.target_node_id,
+            target_input=conn_model.target_input
+        )
+        workflow.connect_nodes(connection)
+    
+    # Drags newer than the last flush win over what the database still has
+    for node_id, (x, y) in position_writes.pending_for(workflow_id).items():
+        workflow.set_node_position(node_id, x, y)
+    
+    return workflow
+
+async def ensure_workflow_loaded(workflow_id: str, db: Any = None, workflow_model: Any = None) -> Workflow:
+    """
+    Return the cached workflow, loading it from the database on a miss.
+    Pass the endpoint's session (and a model from load_workflow_model, if it
+    already has one) to avoid opening another connection or querying twice.
+    """
     if workflow_id in active_workflows:
         return active_workflows[workflow_id]
     
     if not DB_ENABLED:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
-    db = next(get_db())
+    lock = workflow_load_locks.setdefault(workflow_id, asyncio.Lock())
     try:
-        workflow_model = db.query(WorkflowModel).filter(WorkflowModel.id == workflow_id).first()
-        if not workflow_model:
-            raise HTTPException(status_code=404, detail="Workflow not found")
-        
-        workflow = Workflow(custom_prompt=workflow_model.custom_prompt)
-        active_workflows[workflow_id] = workflow
-        
-        node_models = db.query(NodeModel).filter(NodeModel.workflow_id == workflow_id).all()
-        for node_model in node_models:
-            node_instance = build_node_instance(node_model.node_type, node_model.config or {})
-            workflow.add_node(node_model.id, node_instance)
-            workflow.nodes[node_model.id]['config'] = node_model.config or {}
-            workflow.set_node_position(
-                node_model.id,
-                _safe_float(node_model.position_x),
-                _safe_float(node_model.position_y)
-            )
-        
-        connection_models = db.query(ConnectionModel).filter(ConnectionModel.workflow_id == workflow_id).all()
-        for conn_model in connection_models:
-            connection = NodeConnection(
-                id=conn_model.id,
-                source_node=conn_model.source_node_id,
-                source_output=conn_model.source_output,
-                target_node=conn_model.target_node_id,
-                target_input=conn_model.target_input
-            )
-            workflow.connect_nodes(connection)
-        
-        return workflow
+        async with lock:
+            # Another request may have finished loading it while we waited
+            if workflow_id in active_workflows:
+                return active_workflows[workflow_id]
+            if workflow_model is None:
+                if db is None:
+                    async with SessionLocal() as own_db:
+                        workflow_model = await load_workflow_model(own_db, workflow_id)
+                else:
+                    workflow_model = await load_workflow_model(db, workflow_id)
+            if not workflow_model:
+                raise HTTPException(status_code=404, detail="Workflow not found")
+            
+            workflow = hydrate_workflow(workflow_id, workflow_model)
+            # Publish only a fully built workflow
+            active_workflows[workflow_id] = workflow
+            return workflow
     finally:
-        db.close()
+        if not lock.locked():
+            workflow_load_locks.pop(workflow_id, None)
+
+@asynccontextmanager
+async def db_session():
+    """One session shared by an endpoint's reads and writes, or None without a database."""
+    if not DB_ENABLED:
+        yield None
+        return
+    async with SessionLocal() as db:
+        yield db
+
+async def sweep_workflow_cache():
+    # Idle workflows must expire even when nothing new is being loaded
+    interval = float(os.getenv("WORKFLOW_CACHE_SWEEP_INTERVAL", 60))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            active_workflows.sweep()
+        except Exception as e:
+            print(f"Warning: Workflow cache sweep failed: {e}")
+
+async def write_node_positions(rows: List[Dict[str, Any]]):
+    """Write a coalesced batch of positions as one executemany UPDATE."""
+    statement = (
+        update(NodeModel.__table__)
+        .where(
+            NodeModel.__table__.c.id == bindparam("b_node_id"),
+            NodeModel.__table__.c.workflow_id == bindparam("b_workflow_id")
+        )
+        .values(position_x=bindparam("b_x"), position_y=bindparam("b_y"))
+    )
+    async with SessionLocal() as db:
+        await db.execute(statement, [
+            {
+                "b_node_id": row["node_id"],
+                "b_workflow_id": row["workflow_id"],
+                "b_x": str(row["x"]),
+                "b_y": str(row["y"])
+            }
+            for row in rows
+        ])
+        await db.commit()
+
+@app.on_event("startup")
+async def startup_event():
+    global DB_ENABLED
+    # Initialize database if available
+    if DB_ENABLED:
+        try:
+            await init_db()
+            print("✓ Database initialized successfully")
+        except Exception as e:
+            print(f"Warning: Database initialization failed: {e}")
+            DB_ENABLED = False
+    active_workflows.evict = DB_ENABLED
+    background_tasks.append(asyncio.create_task(sweep_workflow_cache()))
+    if DB_ENABLED:
+        background_tasks.append(asyncio.create_task(position_writes.run(write_node_positions)))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    # Let cancelled tasks unwind first so an interrupted position flush is requeued
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await close_clients()
+    shutdown_pools(wait=False)
+    if DB_ENABLED:
+        await position_writes.flush(write_node_positions)
+        await dispose_db()
 
 @app.get("/")
 async def root():
@@ -253,10 +454,10 @@ async def root():
 async def list_stacks():
     """List all stacks/workflows"""
     if DB_ENABLED:
-        db = None
         try:
-            db = next(get_db())
-            workflows = db.query(WorkflowModel).order_by(WorkflowModel.created_at.desc()).all()
+            async with SessionLocal() as db:
+                result = await db.execute(select(WorkflowModel).order_by(WorkflowModel.created_at.desc()))
+                workflows = result.scalars().all()
             return {
                 "stacks": [
                     {
@@ -273,9 +474,6 @@ async def list_stacks():
         except Exception as e:
             print(f"Error listing stacks: {e}")
             return {"stacks": []}
-        finally:
-            if db:
-                db.close()
     else:
         # Return in-memory workflows
         return {
@@ -296,14 +494,16 @@ async def list_stacks():
 async def get_stack(stack_id: str):
     """Get a specific stack by ID"""
     if DB_ENABLED:
-        db = None
         try:
-            db = next(get_db())
-            workflow = db.query(WorkflowModel).filter(WorkflowModel.id == stack_id).first()
-            if not workflow:
-                raise HTTPException(status_code=404, detail="Stack not found")
-            
-            ensure_workflow_loaded(stack_id)
+            async with SessionLocal() as db:
+                if stack_id in active_workflows:
+                    workflow = await db.get(WorkflowModel, stack_id)
+                else:
+                    workflow = await load_workflow_model(db, stack_id)
+                if not workflow:
+                    raise HTTPException(status_code=404, detail="Stack not found")
+                
+                await ensure_workflow_loaded(stack_id, db=db, workflow_model=workflow)
             
             return {
                 "id": workflow.id,
@@ -318,9 +518,6 @@ async def get_stack(stack_id: str):
         except Exception as e:
             print(f"Error getting stack: {e}")
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if db:
-                db.close()
     else:
         if stack_id not in active_workflows:
             raise HTTPException(status_code=404, detail="Stack not found")
@@ -336,26 +533,31 @@ async def get_stack(stack_id: str):
 @app.delete("/stack/{stack_id}")
 async def delete_stack(stack_id: str):
     """Delete a stack"""
-    if stack_id in active_workflows:
-        del active_workflows[stack_id]
-    
-    if DB_ENABLED:
-        db = None
-        try:
-            db = next(get_db())
-            workflow = db.query(WorkflowModel).filter(WorkflowModel.id == stack_id).first()
-            if workflow:
-                db.delete(workflow)
-                db.commit()
-            return {"message": "Stack deleted successfully"}
-        except Exception as e:
-            print(f"Error deleting stack: {e}")
-            raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if db:
-                db.close()
-    
-    return {"message": "Stack deleted successfully"}
+    async with workflow_edit_lock(stack_id):
+        if stack_id in active_workflows:
+            del active_workflows[stack_id]
+        document_sessions.discard_workflow(stack_id)
+        position_writes.discard(stack_id)
+        if index_store is not None:
+            try:
+                await run_blocking(index_store.delete_workflow, stack_id)
+            except ValueError:
+                pass
+        
+        if DB_ENABLED:
+            try:
+                async with SessionLocal() as db:
+                    # Bulk deletes skip the ORM cascade, so remove children first
+                    await db.execute(delete(ConnectionModel).where(ConnectionModel.workflow_id == stack_id))
+                    await db.execute(delete(NodeModel).where(NodeModel.workflow_id == stack_id))
+                    await db.execute(delete(WorkflowModel).where(WorkflowModel.id == stack_id))
+                    await db.commit()
+                return {"message": "Stack deleted successfully"}
+            except Exception as e:
+                print(f"Error deleting stack: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
+        
+        return {"message": "Stack deleted successfully"}
 
 @app.post("/create-workflow")
 async def create_workflow(request: CreateWorkflowRequest):
@@ -365,23 +567,19 @@ async def create_workflow(request: CreateWorkflowRequest):
     
     # Persist to database if enabled
     if DB_ENABLED:
-        db = None
         try:
-            db = next(get_db())
-            db_workflow = WorkflowModel(
-                id=workflow_id,
-                name=request.name,
-                description=request.description,
-                custom_prompt=(request.custom_prompt or "").strip()
-            )
-            db.add(db_workflow)
-            db.commit()
+            async with SessionLocal() as db:
+                db_workflow = WorkflowModel(
+                    id=workflow_id,
+                    name=request.name,
+                    description=request.description,
+                    custom_prompt=(request.custom_prompt or "").strip()
+                )
+                db.add(db_workflow)
+                await db.commit()
             print(f"✓ Workflow {workflow_id} saved to database")
         except Exception as e:
             print(f"Warning: Failed to save workflow to database: {e}")
-        finally:
-            if db:
-                db.close()
     
     return {
         "workflow_id": workflow_id,
@@ -392,163 +590,449 @@ async def create_workflow(request: CreateWorkflowRequest):
 
 @app.post("/add-node")
 async def add_node(request: AddNodeRequest):
-    if request.workflow_id not in active_workflows:
-        ensure_workflow_loaded(request.workflow_id)
-    if request.workflow_id not in active_workflows:
-        ensure_workflow_loaded(request.workflow_id)
-    if request.workflow_id not in active_workflows:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    
-    workflow = active_workflows[request.workflow_id]
-    node_id = str(uuid.uuid4())
-    
-    try:
-        node = build_node_instance(request.node_type, request.config)
-        workflow.add_node(node_id, node)
-        workflow.nodes[node_id]['config'] = request.config or {}
-        position_payload = request.position or {}
-        workflow.set_node_position(
-            node_id,
-            position_payload.get('x', 0.0),
-            position_payload.get('y', 0.0)
+    async with workflow_edit_lock(request.workflow_id):
+        workflow = await ensure_workflow_loaded(request.workflow_id)
+        node_id = str(uuid.uuid4())
+        
+        try:
+            node = build_node_instance(request.node_type, request.config)
+            attach_index_store(request.workflow_id, node_id, node)
+            workflow.add_node(node_id, node)
+            workflow.nodes[node_id]['config'] = request.config or {}
+            position_payload = request.position or {}
+            workflow.set_node_position(
+                node_id,
+                position_payload.get('x', 0.0),
+                position_payload.get('y', 0.0)
+            )
+            
+            # Persist to database if enabled
+            if DB_ENABLED:
+                try:
+                    async with SessionLocal() as db:
+                        db_node = NodeModel(
+                            id=node_id,
+                            workflow_id=request.workflow_id,
+                            node_type=request.node_type,
+                            config=request.config or {},
+                            position_x=str(position_payload.get('x', 0.0)),
+                            position_y=str(position_payload.get('y', 0.0))
+                        )
+                        db.add(db_node)
+                        await db.commit()
+                    print(f"✓ Node {node_id} saved to database")
+                except Exception as e:
+                    print(f"Warning: Failed to save node to database: {e}")
+            
+            return {
+                "node_id": node_id,
+                "node_type": request.node_type,
+                "inputs": node.inputs,
+                "outputs": node.outputs,
+                "position": workflow.nodes[node_id].get('position', {'x': 0.0, 'y': 0.0})
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, 
+                detail=f"Failed to create node: {str(e)}"
+            )
+
+@app.post("/connect-nodes")
+async def connect_nodes(request: ConnectNodesRequest):
+    async with workflow_edit_lock(request.workflow_id):
+        workflow = await ensure_workflow_loaded(request.workflow_id)
+        if workflow.creates_cycle(request.source_node, request.target_node):
+            raise HTTPException(status_code=400, detail="Connection would create a cycle")
+        connection_id = str(uuid.uuid4())
+        connection = NodeConnection(
+            id=connection_id,
+            source_node=request.source_node,
+            source_output=request.source_output,
+            target_node=request.target_node,
+            target_input=request.target_input
         )
         
+        workflow.connect_nodes(connection)
+        
         # Persist to database if enabled
         if DB_ENABLED:
-            db = None
             try:
-                db = next(get_db())
-                db_node = NodeModel(
-                    id=node_id,
-                    workflow_id=request.workflow_id,
-                    node_type=request.node_type,
-                    config=request.config or {},
-                    position_x=str(position_payload.get('x', 0.0)),
-                    position_y=str(position_payload.get('y', 0.0))
-                )
-                db.add(db_node)
-                db.commit()
-                print(f"✓ Node {node_id} saved to database")
+                async with SessionLocal() as db:
+                    db_conn = ConnectionModel(
+                        id=connection_id,
+                        workflow_id=request.workflow_id,
+                        source_node_id=request.source_node,
+                        target_node_id=request.target_node,
+                        source_output=request.source_output,
+                        target_input=request.target_input
+                    )
+                    db.add(db_conn)
+                    await db.commit()
+                print(f"✓ Connection {connection_id} saved to database")
             except Exception as e:
-                print(f"Warning: Failed to save node to database: {e}")
-            finally:
-                if db:
-                    db.close()
+                print(f"Warning: Failed to save connection to database: {e}")
         
-        return {
-            "node_id": node_id,
-            "node_type": request.node_type,
-            "inputs": node.inputs,
-            "outputs": node.outputs,
-            "position": workflow.nodes[node_id].get('position', {'x': 0.0, 'y': 0.0})
+        return {"message": "Nodes connected successfully"}
+
+def plan_graph_edits(workflow_id: str, workflow: Workflow, operations: List[GraphOperation]) -> Dict[str, Any]:
+    """
+    Validate a batch against a scratch copy of the graph and return its net effect.
+    Nothing is changed here, so a bad operation anywhere rejects the whole batch.
+    """
+    nodes = {
+        node_id: {
+            'type': getattr(data['instance'], 'type', None),
+            'config': data.get('config', {}),
+            'position': dict(data.get('position', {'x': 0.0, 'y': 0.0})),
+            'instance': None
         }
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Failed to create node: {str(e)}"
+        for node_id, data in workflow.nodes.items()
+    }
+    connections = list(workflow.connections)
+    refs: Dict[str, str] = {}
+    added: List[str] = []
+    removed, config_changed, moved = set(), set(), set()
+    new_connections: List[NodeConnection] = []
+    
+    for index, operation in enumerate(operations):
+        def fail(detail: str, status_code: int = 400):
+            raise HTTPException(status_code=status_code, detail=f"Operation {index} ({operation.op}): {detail}")
+        
+        def resolve(value: Optional[str], field: str) -> str:
+            node_id = refs.get(value, value)
+            if not node_id or node_id not in nodes:
+                fail(f"unknown node {value!r} in {field}", 404)
+            return node_id
+        
+        def build(node_type: Optional[str], config: Dict[str, Any], node_id: str) -> Any:
+            try:
+                instance = build_node_instance(node_type, config)
+            except HTTPException as e:
+                fail(e.detail, e.status_code)
+            except Exception as e:
+                fail(f"Invalid configuration: {str(e)}")
+            attach_index_store(workflow_id, node_id, instance)
+            return instance
+        
+        if operation.op == "add_node":
+            if not operation.node_type:
+                fail("node_type is required")
+            node_id = str(uuid.uuid4())
+            config = operation.config or {}
+            position = operation.position or {}
+            nodes[node_id] = {
+                'type': operation.node_type,
+                'config': config,
+                'position': {'x': _safe_float(position.get('x')), 'y': _safe_float(position.get('y'))},
+                'instance': build(operation.node_type, config, node_id)
+            }
+            added.append(node_id)
+            if operation.ref:
+                refs[operation.ref] = node_id
+        elif operation.op == "remove_node":
+            node_id = resolve(operation.node_id, "node_id")
+            del nodes[node_id]
+            touches = lambda conn: node_id in (conn.source_node, conn.target_node)
+            connections = [conn for conn in connections if not touches(conn)]
+            new_connections = [conn for conn in new_connections if not touches(conn)]
+            if node_id in added:
+                added.remove(node_id)
+            else:
+                removed.add(node_id)
+            config_changed.discard(node_id)
+            moved.discard(node_id)
+        elif operation.op == "connect":
+            source_node = resolve(operation.source_node, "source_node")
+            target_node = resolve(operation.target_node, "target_node")
+            if not operation.source_output or not operation.target_input:
+                fail("source_output and target_input are required")
+            if creates_cycle(connections, source_node, target_node):
+                fail("Connection would create a cycle")
+            connection = NodeConnection(
+                id=str(uuid.uuid4()),
+                source_node=source_node,
+                source_output=operation.source_output,
+                target_node=target_node,
+                target_input=operation.target_input
+            )
+            connections.append(connection)
+            new_connections.append(connection)
+        elif operation.op == "move":
+            node_id = resolve(operation.node_id, "node_id")
+            if operation.x is None or operation.y is None:
+                fail("x and y are required")
+            nodes[node_id]['position'] = {'x': float(operation.x), 'y': float(operation.y)}
+            if node_id not in added:
+                moved.add(node_id)
+        elif operation.op == "update_config":
+            node_id = resolve(operation.node_id, "node_id")
+            config = operation.config or {}
+            nodes[node_id]['config'] = config
+            nodes[node_id]['instance'] = build(nodes[node_id]['type'], config, node_id)
+            if node_id not in added:
+                config_changed.add(node_id)
+    
+    return {
+        'nodes': nodes,
+        'refs': refs,
+        'added': added,
+        'removed': removed,
+        'config_changed': config_changed,
+        'moved': moved,
+        'connections': new_connections
+    }
+
+async def write_graph_edits(db: Any, workflow_id: str, plan: Dict[str, Any]):
+    """Write a planned batch with bulk statements; the caller commits."""
+    nodes = plan['nodes']
+    # Spaced timestamps keep batch order when the graph is reloaded in creation order
+    now = datetime.datetime.utcnow()
+    removed = list(plan['removed'])
+    if removed:
+        await db.execute(
+            delete(ConnectionModel).where(
+                ConnectionModel.workflow_id == workflow_id,
+                or_(ConnectionModel.source_node_id.in_(removed), ConnectionModel.target_node_id.in_(removed))
+            )
+        )
+        await db.execute(
+            delete(NodeModel).where(NodeModel.workflow_id == workflow_id, NodeModel.id.in_(removed))
         )
+    if plan['added']:
+        await db.execute(insert(NodeModel), [
+            {
+                'id': node_id,
+                'workflow_id': workflow_id,
+                'node_type': nodes[node_id]['type'],
+                'config': nodes[node_id]['config'],
+                'position_x': str(nodes[node_id]['position']['x']),
+                'position_y': str(nodes[node_id]['position']['y']),
+                'created_at': now + datetime.timedelta(microseconds=i)
+            }
+            for i, node_id in enumerate(plan['added'])
+        ])
+    if plan['connections']:
+        await db.execute(insert(ConnectionModel), [
+            {
+                'id': conn.id,
+                'workflow_id': workflow_id,
+                'source_node_id': conn.source_node,
+                'target_node_id': conn.target_node,
+                'source_output': conn.source_output,
+                'target_input': conn.target_input,
+                'created_at': now + datetime.timedelta(microseconds=i)
+            }
+            for i, conn in enumerate(plan['connections'])
+        ])
+    # Bulk UPDATE by primary key, one executemany per column set
+    if plan['config_changed']:
+        await db.execute(update(NodeModel), [
+            {'id': node_id, 'config': nodes[node_id]['config']} for node_id in plan['config_changed']
+        ])
+    if plan['moved']:
+        await db.execute(update(NodeModel), [
+            {
+                'id': node_id,
+                'position_x': str(nodes[node_id]['position']['x']),
+                'position_y': str(nodes[node_id]['position']['y'])
+            }
+            for node_id in plan['moved']
+        ])
 
-@app.post("/connect-nodes")
-async def connect_nodes(request: ConnectNodesRequest):
-    if request.workflow_id not in active_workflows:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    
-    workflow = active_workflows[request.workflow_id]
-    connection_id = str(uuid.uuid4())
-    connection = NodeConnection(
-        id=connection_id,
-        source_node=request.source_node,
-        source_output=request.source_output,
-        target_node=request.target_node,
-        target_input=request.target_input
+def apply_graph_edits(workflow_id: str, workflow: Workflow, plan: Dict[str, Any]):
+    # No awaits in here, so other requests see the batch all at once
+    nodes = plan['nodes']
+    for node_id in plan['removed'] | plan['moved']:
+        position_writes.discard(workflow_id, node_id)
+    for node_id in plan['removed']:
+        workflow.remove_node(node_id)
+    for node_id in plan['added']:
+        workflow.add_node(node_id, nodes[node_id]['instance'])
+        workflow.nodes[node_id]['config'] = nodes[node_id]['config']
+    for node_id in plan['config_changed']:
+        workflow.update_node_config(node_id, nodes[node_id]['config'], nodes[node_id]['instance'])
+    for node_id in list(plan['added']) + list(plan['moved']):
+        position = nodes[node_id]['position']
+        workflow.set_node_position(node_id, position['x'], position['y'])
+    for connection in plan['connections']:
+        workflow.connect_nodes(connection)
+
+@app.post("/workflow/{workflow_id}/batch")
+async def batch_edit_workflow(workflow_id: str, request: BatchGraphEditRequest):
+    """Apply many node/connection/position/config edits atomically in one transaction"""
+    async with workflow_edit_lock(workflow_id):
+        async with db_session() as db:
+            workflow = await ensure_workflow_loaded(workflow_id, db=db)
+            plan = plan_graph_edits(workflow_id, workflow, request.operations)
+            
+            if db is not None:
+                try:
+                    await write_graph_edits(db, workflow_id, plan)
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    print(f"Failed to save graph edits to database: {e}")
+                    raise HTTPException(status_code=500, detail=f"Failed to save graph edits: {str(e)}")
+            
+            apply_graph_edits(workflow_id, workflow, plan)
+            if index_store is not None:
+                # Still under the edit lock, so a re-added node cannot save into a folder being removed
+                for node_id in plan['removed']:
+                    await run_blocking(index_store.delete_node, workflow_id, node_id)
+        
+        ref_by_node = {node_id: ref for ref, node_id in plan['refs'].items()}
+        return {
+            "message": "Graph updated successfully",
+            "refs": {ref: node_id for ref, node_id in plan['refs'].items() if node_id in workflow.nodes},
+            "nodes": [
+                {
+                    "node_id": node_id,
+                    "ref": ref_by_node.get(node_id),
+                    "node_type": workflow.nodes[node_id]['instance'].type,
+                    "inputs": workflow.nodes[node_id]['instance'].inputs,
+                    "outputs": workflow.nodes[node_id]['instance'].outputs,
+                    "position": workflow.nodes[node_id].get('position', {'x': 0.0, 'y': 0.0})
+                }
+                for node_id in plan['added']
+            ],
+            "connections": [
+                {
+                    "id": conn.id,
+                    "source_node": conn.source_node,
+                    "source_output": conn.source_output,
+                    "target_node": conn.target_node,
+                    "target_input": conn.target_input
+                }
+                for conn in plan['connections']
+            ],
+            "removed_nodes": sorted(plan['removed'])
+        }
+
+def upload_form(*fields: str) -> Dict[str, Any]:
+    """OpenAPI body of an endpoint that reads its multipart form itself, via receive_upload."""
+    properties = {name: {"type": "string"} for name in fields}
+    properties["file"] = {"type": "string", "format": "binary"}
+    schema = {"type": "object", "properties": properties, "required": [*fields, "file"]}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": schema}}}}
+
+async def receive_upload(request: Request, *fields: str) -> Tuple[Dict[str, str], SpooledUpload]:
+    """
+    Stream a multipart form's file into the spool as the body arrives, instead of
+    letting Starlette buffer it first. Oversized bodies get a 413, from the
+    Content-Length header when there is one; malformed forms a 422.
+    """
+    try:
+        form, upload = await upload_spool.spool_form(request.headers, request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUpload as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    missing = [name for name in fields if not form.get(name)]
+    if missing:
+        upload.cleanup()
+        raise HTTPException(status_code=422, detail=f"Missing form fields: {', '.join(missing)}")
+    return form, upload
+
+@asynccontextmanager
+async def spooled_upload(request: Request, *fields: str):
+    """receive_upload for the block; the spooled file is deleted after it."""
+    form, upload = await receive_upload(request, *fields)
+    try:
+        yield form, upload
+    finally:
+        upload.cleanup()
+
+async def run_execute(
+    workflow: Workflow,
+    upload: SpooledUpload,
+    question: str,
+    on_token: Optional[Callable[[str], Awaitable[Any]]] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> RunContext:
+    initial_data = {
+        'file_path': str(upload.path),
+        'file_name': upload.filename,
+        'content_hash': upload.content_hash,
+        'question': question,
+        'custom_prompt': workflow.custom_prompt if hasattr(workflow, "custom_prompt") else ""
+    }
+    context = await workflow.run(
+        initial_data,
+        ingestion_cache=ingestion_cache,
+        on_token=on_token,
+        on_event=on_event
     )
+    if 'answer' not in context.results:
+        raise_workflow_errors(context, "No answer generated. Check node connections and execution order.")
+    return context
+
+def stream_answer(
+    run: Callable[[Callable[[str], Awaitable[Any]]], Awaitable[RunContext]],
+    cleanup: Optional[Callable[[], Any]] = None
+) -> StreamingResponse:
+    """
+    Server-Sent Events: one `token` event per streamed delta, then `answer` or `error`.
+    cleanup runs once the run has finished or been cancelled.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
     
-    workflow.connect_nodes(connection)
+    async def on_token(token: str):
+        await queue.put(("token", {"token": token}))
     
-    # Persist to database if enabled
-    if DB_ENABLED:
-        db = None
+    async def runner():
         try:
-            db = next(get_db())
-            db_conn = ConnectionModel(
-                id=connection_id,
-                workflow_id=request.workflow_id,
-                source_node_id=request.source_node,
-                target_node_id=request.target_node,
-                source_output=request.source_output,
-                target_input=request.target_input
-            )
-            db.add(db_conn)
-            db.commit()
-            print(f"✓ Connection {connection_id} saved to database")
+            context = await run(on_token)
+            await queue.put(("answer", {"answer": context.results.get('answer', '')}))
+        except HTTPException as e:
+            await queue.put(("error", {"detail": e.detail}))
         except Exception as e:
-            print(f"Warning: Failed to save connection to database: {e}")
+            print(f"Streaming execution error: {str(e)}")
+            await queue.put(("error", {"detail": f"Workflow execution failed: {str(e)}"}))
         finally:
-            if db:
-                db.close()
+            if cleanup is not None:
+                cleanup()
+            await queue.put(None)
     
-    return {"message": "Nodes connected successfully"}
-
-@app.post("/execute-workflow")
-async def execute_workflow(
-    workflow_id: str = Form(...),
-    question: str = Form(...),
-    file: UploadFile = File(...)
-):
-    if workflow_id not in active_workflows:
-        ensure_workflow_loaded(workflow_id)
-    if workflow_id not in active_workflows:
-        raise HTTPException(status_code=404, detail="Workflow not found")
+    # Started here, not on first read, so cleanup happens even if the stream never starts
+    task = asyncio.create_task(runner())
     
-    workflow = active_workflows[workflow_id]
+    async def events():
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                event, data = item
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            # Client went away mid-stream; stop paying for tokens, and wait for cleanup
+            if not task.done():
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
     
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/execute-workflow", openapi_extra=upload_form("workflow_id", "question"))
+async def execute_workflow(request: Request):
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Prepare initial data
-        initial_data = {
-            'file_content': file_content,
-            'question': question,
-            'custom_prompt': workflow.custom_prompt if hasattr(workflow, "custom_prompt") else ""
+        async with spooled_upload(request, "workflow_id", "question") as (form, upload):
+            workflow_id = form["workflow_id"]
+            workflow = await ensure_workflow_loaded(workflow_id)
+            context = await run_execute(workflow, upload, form["question"], on_event=workflow_events(workflow_id))
+        return {
+            "success": True,
+            "results": {
+                "answer": context.results.get('answer', 'No answer generated')
+            },
+            "execution_order": context.execution_order
         }
         
-        # Execute workflow
-        results = await workflow.execute(initial_data)
-        
-        # Check if execution was successful
-        if 'answer' in results:
-            return {
-                "success": True,
-                "results": {
-                    "answer": results.get('answer', 'No answer generated')
-                },
-                "execution_order": workflow.execution_order
-            }
-        else:
-            # Check for errors in node execution
-            error_messages = []
-            for node_id, node_data in workflow.nodes.items():
-                if node_data.get('status') == 'error':
-                    error_info = node_data.get('data', {})
-                    error_msg = error_info.get('error', 'Unknown error')
-                    node_instance = node_data.get('instance')
-                    node_name = node_instance.name if node_instance and hasattr(node_instance, 'name') else node_id
-                    error_messages.append(f"{node_name}: {error_msg}")
-            
-            if error_messages:
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Workflow execution failed: {'; '.join(error_messages)}"
-                )
-            else:
-                raise HTTPException(
-                    status_code=500, 
-                    detail="Workflow execution failed: No answer generated. Check node connections and execution order."
-                )
-        
     except HTTPException:
         raise
     except Exception as e:
@@ -558,14 +1042,178 @@ async def execute_workflow(
         print(f"Traceback: {error_trace}")
         raise HTTPException(status_code=500, detail=f"Workflow execution failed: {str(e)}")
 
+@app.post("/execute-workflow/stream", openapi_extra=upload_form("workflow_id", "question"))
+async def execute_workflow_stream(request: Request):
+    """Same as /execute-workflow, but streams answer tokens as Server-Sent Events"""
+    form, upload = await receive_upload(request, "workflow_id", "question")
+    workflow_id = form["workflow_id"]
+    try:
+        workflow = await ensure_workflow_loaded(workflow_id)
+    except BaseException:
+        upload.cleanup()
+        raise
+    on_event = workflow_events(workflow_id)
+    # The run outlives this handler, so the spooled file is removed by stream_answer
+    return stream_answer(
+        lambda on_token: run_execute(workflow, upload, form["question"], on_token, on_event),
+        cleanup=upload.cleanup
+    )
+
+@app.post("/ingest-document", openapi_extra=upload_form("workflow_id"))
+async def ingest_document(request: Request):
+    """Run only the loader -> splitter -> vector store part and return a document handle"""
+    try:
+        async with spooled_upload(request, "workflow_id") as (form, upload):
+            workflow_id = form["workflow_id"]
+            workflow = await ensure_workflow_loaded(workflow_id)
+            # Cacheable chains get a content-addressed handle that survives restarts
+            document_id = await run_blocking(workflow.ingestion_key, upload.content_hash) or str(uuid.uuid4())
+            
+            context = await workflow.run(
+                {'file_path': str(upload.path), 'file_name': upload.filename, 'content_hash': upload.content_hash},
+                ingestion_cache=ingestion_cache,
+                node_types=set(INGESTION_NODE_TYPES),
+                on_event=workflow_events(workflow_id)
+            )
+        results = context.results
+        
+        if 'vector_store' not in results:
+            raise_workflow_errors(context, "No vector store built. Check node connections.")
+        
+        vector_store = results['vector_store']
+        document_sessions.put(
+            document_id,
+            workflow_id,
+            vector_store,
+            results.get('retriever') or workflow.retriever_for(vector_store),
+            {
+                "file_name": upload.filename,
+                "total_chunks": len(results.get('chunks') or [])
+            }
+        )
+        return {
+            "success": True,
+            "document_id": document_id,
+            "file_name": upload.filename,
+            "total_chunks": len(results.get('chunks') or []),
+            "index_size": vector_store.index.ntotal
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"Document ingestion error: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Document ingestion failed: {str(e)}")
+
+async def resolve_document_session(workflow: Workflow, workflow_id: str, document_id: Optional[str]):
+    if document_id is None:
+        vector_store = await run_blocking(workflow.load_saved_vector_store)
+        if vector_store is None:
+            raise HTTPException(status_code=404, detail="Workflow has no saved index. Run or ingest a document first.")
+        now = time.time()
+        return DocumentSession(
+            document_id=workflow_id,
+            workflow_id=workflow_id,
+            vector_store=vector_store,
+            retriever=workflow.retriever_for(vector_store),
+            created_at=now,
+            last_used=now
+        )
+    session = document_sessions.get(workflow_id, document_id)
+    if session is not None:
+        return session
+    # Handles are ingestion cache keys, so a restarted server can still find them.
+    # The cached index is only opened for this session; the workflow's own is untouched.
+    if ingestion_cache is not None and document_id in ingestion_cache:
+        cached = await run_blocking(workflow.load_ingestion, ingestion_cache, document_id)
+        if cached is not None:
+            vector_store = cached['vector_store']
+            return document_sessions.put(
+                document_id,
+                workflow_id,
+                vector_store,
+                workflow.retriever_for(vector_store),
+                cached['metadata']
+            )
+    raise HTTPException(status_code=404, detail="Document not found. Ingest it first.")
+
+async def run_ask(
+    workflow: Workflow,
+    session: DocumentSession,
+    question: str,
+    on_token: Optional[Callable[[str], Awaitable[Any]]] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> RunContext:
+    context = await workflow.run(
+        {
+            'question': question,
+            'vector_store': session.vector_store,
+            # Built per question so edits to the search settings apply to open documents
+            'retriever': workflow.retriever_for(session.vector_store),
+            'custom_prompt': workflow.custom_prompt if hasattr(workflow, "custom_prompt") else ""
+        },
+        node_types={"qa_chain"},
+        on_token=on_token,
+        on_event=on_event
+    )
+    if 'answer' not in context.results:
+        raise_workflow_errors(context, "No answer generated. Check that a QA Chain node is connected.")
+    return context
+
+@app.post("/ask")
+async def ask_document(request: AskDocumentRequest):
+    """Answer a question against an ingested document, running only the QA chain"""
+    workflow = await ensure_workflow_loaded(request.workflow_id)
+    session = await resolve_document_session(workflow, request.workflow_id, request.document_id)
+    
+    try:
+        context = await run_ask(workflow, session, request.question, on_event=workflow_events(request.workflow_id))
+        return {
+            "success": True,
+            "document_id": request.document_id,
+            "results": {
+                "answer": context.results.get('answer', 'No answer generated')
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"Ask error: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Workflow execution failed: {str(e)}")
+
+@app.post("/ask/stream")
+async def ask_document_stream(request: AskDocumentRequest):
+    """Same as /ask, but streams answer tokens as Server-Sent Events"""
+    workflow = await ensure_workflow_loaded(request.workflow_id)
+    session = await resolve_document_session(workflow, request.workflow_id, request.document_id)
+    on_event = workflow_events(request.workflow_id)
+    return stream_answer(lambda on_token: run_ask(workflow, session, request.question, on_token, on_event))
+
+@app.get("/ingestion-cache/stats")
+async def get_ingestion_cache_stats():
+    if ingestion_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **ingestion_cache.stats()}
+
+@app.get("/workflow-cache/stats")
+async def get_workflow_cache_stats():
+    active_workflows.sweep()
+    return active_workflows.stats()
+
+@app.get("/index-store/stats")
+async def get_index_store_stats():
+    return {"enabled": index_store is not None, "resident": resident_indexes.stats()}
+
+@app.get("/position-writes/stats")
+async def get_position_write_stats():
+    return position_writes.stats()
+
 @app.get("/workflow/{workflow_id}")
 async def get_workflow(workflow_id: str):
-    if workflow_id not in active_workflows:
-        ensure_workflow_loaded(workflow_id)
-    if workflow_id not in active_workflows:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    
-    workflow = active_workflows[workflow_id]
+    workflow = await ensure_workflow_loaded(workflow_id)
     
     nodes_payload = []
     for node_id, data in workflow.nodes.items():
@@ -615,12 +1263,7 @@ async def get_node_config_schema(node_type: str):
 @app.get("/node/{workflow_id}/{node_id}/config")
 async def get_node_config(workflow_id: str, node_id: str):
     """Get current configuration for a node"""
-    if workflow_id not in active_workflows:
-        ensure_workflow_loaded(workflow_id)
-    if workflow_id not in active_workflows:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    
-    workflow = active_workflows[workflow_id]
+    workflow = await ensure_workflow_loaded(workflow_id)
     if node_id not in workflow.nodes:
         raise HTTPException(status_code=404, detail="Node not found")
     
@@ -642,122 +1285,156 @@ async def get_node_config(workflow_id: str, node_id: str):
 @app.post("/node/{workflow_id}/{node_id}/config")
 async def update_node_config(workflow_id: str, node_id: str, request: Dict[str, Any]):
     """Update configuration for a node"""
-    if workflow_id not in active_workflows:
-        ensure_workflow_loaded(workflow_id)
-    if workflow_id not in active_workflows:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    
-    workflow = active_workflows[workflow_id]
-    if node_id not in workflow.nodes:
-        raise HTTPException(status_code=404, detail="Node not found")
-    
-    config = request.get("config", {})
-    node_data = workflow.nodes[node_id]
-    node_instance = node_data['instance']
-    
-    # Store config in node data
-    node_data['config'] = config
-    
-    # If DB is enabled, persist to database
-    if DB_ENABLED:
-        db = None
-        try:
-            db = next(get_db())
-            db_node = db.query(NodeModel).filter(
-                NodeModel.id == node_id,
-                NodeModel.workflow_id == workflow_id
-            ).first()
-            if db_node:
-                db_node.config = config
-                db.commit()
-        except Exception as e:
-            print(f"Failed to persist config to database: {e}")
-        finally:
-            if db:
-                db.close()
-    
-    return {"message": "Configuration updated successfully", "config": config}
+    async with workflow_edit_lock(workflow_id):
+        async with db_session() as db:
+            workflow = await ensure_workflow_loaded(workflow_id, db=db)
+            if node_id not in workflow.nodes:
+                raise HTTPException(status_code=404, detail="Node not found")
+            
+            config = request.get("config", {})
+            node_type = getattr(workflow.nodes[node_id]['instance'], 'type', None)
+            try:
+                node_instance = build_node_instance(node_type, config)
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid configuration: {str(e)}")
+            attach_index_store(workflow_id, node_id, node_instance)
+            
+            # Swap in the reconfigured node; the workflow recompiles on its next run
+            workflow.update_node_config(node_id, config, node_instance)
+            
+            # If DB is enabled, persist to database
+            if db is not None:
+                try:
+                    await db.execute(
+                        update(NodeModel)
+                        .where(NodeModel.id == node_id, NodeModel.workflow_id == workflow_id)
+                        .values(config=config)
+                    )
+                    await db.commit()
+                except Exception as e:
+                    print(f"Failed to persist config to database: {e}")
+        
+        return {"message": "Configuration updated successfully", "config": config}
 
 @app.post("/node/{workflow_id}/{node_id}/position")
 async def update_node_position(workflow_id: str, node_id: str, request: UpdateNodePositionRequest):
-    if workflow_id not in active_workflows:
-        ensure_workflow_loaded(workflow_id)
-    if workflow_id not in active_workflows:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    
-    workflow = active_workflows[workflow_id]
+    # Sent many times a second while dragging; only a cold load touches the database here
+    workflow = await ensure_workflow_loaded(workflow_id)
     if node_id not in workflow.nodes:
         raise HTTPException(status_code=404, detail="Node not found")
     
     workflow.set_node_position(node_id, request.x, request.y)
-    
     if DB_ENABLED:
-        db = None
-        try:
-            db = next(get_db())
-            db_node = db.query(NodeModel).filter(
-                NodeModel.id == node_id,
-                NodeModel.workflow_id == workflow_id
-            ).first()
-            if db_node:
-                db_node.position_x = str(request.x)
-                db_node.position_y = str(request.y)
-                db.commit()
-        except Exception as e:
-            print(f"Failed to persist node position to database: {e}")
-        finally:
-            if db:
-                db.close()
+        position_writes.record(workflow_id, node_id, request.x, request.y)
     
     return {"message": "Position updated successfully"}
 
 @app.delete("/node/{workflow_id}/{node_id}")
 async def delete_node(workflow_id: str, node_id: str):
-    if workflow_id not in active_workflows:
-        ensure_workflow_loaded(workflow_id)
-    if workflow_id not in active_workflows:
-        raise HTTPException(status_code=404, detail="Workflow not found")
+    async with workflow_edit_lock(workflow_id):
+        async with db_session() as db:
+            workflow = await ensure_workflow_loaded(workflow_id, db=db)
+            if node_id not in workflow.nodes:
+                raise HTTPException(status_code=404, detail="Node not found")
+            
+            workflow.remove_node(node_id)
+            position_writes.discard(workflow_id, node_id)
+            if index_store is not None:
+                await run_blocking(index_store.delete_node, workflow_id, node_id)
+            
+            if db is not None:
+                try:
+                    await db.execute(
+                        delete(ConnectionModel).where(
+                            ConnectionModel.workflow_id == workflow_id,
+                            or_(ConnectionModel.source_node_id == node_id, ConnectionModel.target_node_id == node_id)
+                        )
+                    )
+                    await db.execute(
+                        delete(NodeModel).where(NodeModel.id == node_id, NodeModel.workflow_id == workflow_id)
+                    )
+                    await db.commit()
+                except Exception as e:
+                    print(f"Failed to delete node from database: {e}")
+                    raise HTTPException(status_code=500, detail="Failed to delete node from database")
+        
+        return {"message": "Node deleted successfully"}
+
+@app.websocket("/ws/{workflow_id}")
+async def websocket_endpoint(websocket: WebSocket, workflow_id: str):
+    """Streams progress events of every run of this workflow.
+
+    Send {"type": "ask", "question": ..., "document_id": optional, "id": optional}
+    to also stream an answer over the same socket. Each question runs as its own
+    task, so the socket keeps reading while it is answered; its token, answer and
+    error messages carry the id it was sent with.
+    """
+    await websocket.accept()
+    queue = event_bus.subscribe(workflow_id)
+    send_lock = asyncio.Lock()
+    asks: Set[asyncio.Task] = set()
     
-    workflow = active_workflows[workflow_id]
-    if node_id not in workflow.nodes:
-        raise HTTPException(status_code=404, detail="Node not found")
+    async def send(payload: Dict[str, Any]):
+        async with send_lock:
+            await websocket.send_text(json.dumps(payload))
     
-    workflow.remove_node(node_id)
+    async def forward_events():
+        while True:
+            event = await queue.get()
+            await send({"type": "event", "data": event})
     
-    if DB_ENABLED:
-        db = None
+    async def ask(message: Dict[str, Any]):
+        tag = {"id": message["id"]} if "id" in message else {}
+        
+        async def on_token(token: str):
+            await send({"type": "token", "data": token, **tag})
+        
         try:
-            db = next(get_db())
-            db.query(ConnectionModel).filter(
-                ConnectionModel.workflow_id == workflow_id,
-                (ConnectionModel.source_node_id == node_id) | (ConnectionModel.target_node_id == node_id)
-            ).delete(synchronize_session=False)
-            db_node = db.query(NodeModel).filter(
-                NodeModel.id == node_id,
-                NodeModel.workflow_id == workflow_id
-            ).first()
-            if db_node:
-                db.delete(db_node)
-            db.commit()
+            workflow = await ensure_workflow_loaded(workflow_id)
+            session = await resolve_document_session(workflow, workflow_id, message.get("document_id"))
+            context = await run_ask(
+                workflow,
+                session,
+                message.get("question", ""),
+                on_token,
+                workflow_events(workflow_id)
+            )
+            reply = {"type": "answer", "data": context.results.get('answer', ''), **tag}
+        except HTTPException as e:
+            reply = {"type": "error", "data": e.detail, **tag}
         except Exception as e:
-            print(f"Failed to delete node from database: {e}")
-            raise HTTPException(status_code=500, detail="Failed to delete node from database")
-        finally:
-            if db:
-                db.close()
+            reply = {"type": "error", "data": f"Workflow execution failed: {str(e)}", **tag}
+        try:
+            await send(reply)
+        except Exception:
+            # The client left mid-answer; there is nobody to tell
+            pass
     
-    return {"message": "Node deleted successfully"}
-
-@app.websocket("/ws/{workflow_id}")
-async def websocket_endpoint(websocket: WebSocket, workflow_id: str):
-    await websocket.accept()
+    forwarder = asyncio.create_task(forward_events())
     try:
         while True:
             data = await websocket.receive_text()
-            # Handle real-time updates
-            await websocket.send_text(json.dumps({"type": "update", "data": "Processing..."}))
+            try:
+                message = json.loads(data)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict) or message.get("type") != "ask":
+                await send({"type": "update", "data": "Processing..."})
+                continue
+            task = asyncio.create_task(ask(message))
+            asks.add(task)
+            task.add_done_callback(asks.discard)
     except WebSocketDisconnect:
         print("Client disconnected")
+    finally:
+        # Stop paying for answers nobody will read, and retrieve every task's outcome
+        pending = [forwarder, *asks]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        event_bus.unsubscribe(workflow_id, queue)
 
 if __name__ == "__main__":
     import uvicorn
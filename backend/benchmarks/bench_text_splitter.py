@@ -0,0 +1,121 @@
+"""
+Text Splitter Benchmark - Checks the native splitter against RecursiveCharacterTextSplitter and times both
+
+Run from the backend directory:
+    python benchmarks/bench_text_splitter.py [--pages 500] [--repeat 3] [--seed 7]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from utils.text_splitting import NativeTextSplitter
+
+# (chunk_size, chunk_overlap) pairs exercised for equivalence and speed
+CONFIGS = [(1000, 200), (500, 50), (2000, 0), (200, 199)]
+
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which "
+    "but have an they you were their one all we can her has there been if more when will would "
+    "shareholders agreement pursuant liability indemnification notwithstanding thereof herein "
+    "consolidated depreciation amortization receivables subsidiaries jurisdiction"
+).split()
+
+
+def _paragraph(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(1, 12)):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 22))))
+    return "\n".join(lines)
+
+
+def make_corpus(kind: str, pages: int, rng: random.Random) -> List[Document]:
+    """Synthetic PDF-like pages; each kind stresses a different separator level."""
+    docs = []
+    for page in range(pages):
+        if kind == "prose":
+            text = "\n\n".join(_paragraph(rng) for _ in range(rng.randint(3, 10)))
+        elif kind == "long-lines":
+            # Extraction that lost line breaks: only spaces to split on
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(300, 900)))
+        elif kind == "tables":
+            # Many short lines and runs of blank lines and padding
+            rows = []
+            for _ in range(rng.randint(20, 80)):
+                rows.append("  ".join(f"{rng.random() * 1000:10.2f}" for _ in range(rng.randint(2, 8))))
+                if rng.random() < 0.2:
+                    rows.append("\n" * rng.randint(1, 3))
+            text = "\n".join(rows)
+        else:
+            # Unbroken tokens (base64, URLs) force character-level splitting
+            text = " ".join(
+                "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(rng.randint(50, 3000)))
+                for _ in range(rng.randint(1, 4))
+            )
+        docs.append(Document(page_content=text, metadata={"source": "synthetic.pdf", "page": page}))
+    return docs
+
+
+def _time(split: Callable[[List[Document]], List[Document]], docs: List[Document], repeat: int) -> Tuple[float, List[Document]]:
+    best = float("inf")
+    chunks: List[Document] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = split(docs)
+        best = min(best, time.perf_counter() - started)
+    return best, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500, help="pages per synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per splitter; the best is reported")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # LangChain warns about every oversized chunk; that noise would dominate its timing
+    logging.disable(logging.WARNING)
+    rng = random.Random(args.seed)
+    corpora: Dict[str, List[Document]] = {
+        kind: make_corpus(kind, args.pages, rng) for kind in ("prose", "long-lines", "tables", "unbroken")
+    }
+
+    print(f"{'corpus':<11} {'size/overlap':>12} {'chars':>11} {'chunks':>8} "
+          f"{'langchain c/s':>14} {'native c/s':>12} {'speedup':>8}  equal")
+    all_equal = True
+    for kind, docs in corpora.items():
+        chars = sum(len(doc.page_content) for doc in docs)
+        for chunk_size, chunk_overlap in CONFIGS:
+            reference = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
+            )
+            native = NativeTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            ref_time, ref_chunks = _time(reference.split_documents, docs, args.repeat)
+            nat_time, nat_chunks = _time(native.split_documents, docs, args.repeat)
+            equal = (
+                len(ref_chunks) == len(nat_chunks)
+                and all(
+                    a.page_content == b.page_content and a.metadata == b.metadata
+                    for a, b in zip(ref_chunks, nat_chunks)
+                )
+            )
+            all_equal = all_equal and equal
+            print(f"{kind:<11} {f'{chunk_size}/{chunk_overlap}':>12} {chars:>11,} {len(nat_chunks):>8,} "
+                  f"{len(ref_chunks) / ref_time:>14,.0f} {len(nat_chunks) / nat_time:>12,.0f} "
+                  f"{ref_time / nat_time:>7.1f}x  {'yes' if equal else 'NO'}")
+
+    if not all_equal:
+        print("Native splitter output differs from RecursiveCharacterTextSplitter")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
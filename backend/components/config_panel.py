@@ -31,6 +31,24 @@ class NodeConfigSchema:
                         "type": "text",
                         "default": "PDF Loader",
                         "required": False
+                    },
+                    {
+                        "name": "max_workers",
+                        "label": "Parallel Workers (0 = all)",
+                        "type": "number",
+                        "default": 0,
+                        "required": False,
+                        "min": 0,
+                        "max": 64
+                    },
+                    {
+                        "name": "parallel_page_threshold",
+                        "label": "Pages Before Parsing in Parallel",
+                        "type": "number",
+                        "default": 32,
+                        "required": False,
+                        "min": 2,
+                        "max": 10000
                     }
                 ]
             },
@@ -60,6 +78,28 @@ class NodeConfigSchema:
                         "required": False,
                         "min": 0,
                         "max": 1000
+                    },
+                    {
+                        "name": "engine",
+                        "label": "Splitter Engine",
+                        "type": "select",
+                        "options": [
+                            {"value": "native", "label": "Native (fast)"},
+                            {"value": "langchain", "label": "LangChain"}
+                        ],
+                        "default": "native",
+                        "required": False
+                    },
+                    {
+                        "name": "length_unit",
+                        "label": "Chunk Size Unit",
+                        "type": "select",
+                        "options": [
+                            {"value": "characters", "label": "Characters"},
+                            {"value": "tokens", "label": "Tokens"}
+                        ],
+                        "default": "characters",
+                        "required": False
                     }
                 ]
             },
@@ -116,6 +156,92 @@ class NodeConfigSchema:
                         ],
                         "default": "openai",
                         "required": True
+                    },
+                    {
+                        "name": "embedding_concurrency",
+                        "label": "Parallel Embedding Requests",
+                        "type": "number",
+                        "default": 4,
+                        "required": False,
+                        "min": 1,
+                        "max": 32
+                    },
+                    {
+                        "name": "embedding_batch_tokens",
+                        "label": "Tokens per Embedding Batch",
+                        "type": "number",
+                        "default": 32000,
+                        "required": False,
+                        "min": 1000,
+                        "max": 300000
+                    },
+                    {
+                        "name": "search_type",
+                        "label": "Search Type",
+                        "type": "select",
+                        "options": [
+                            {"value": "similarity", "label": "Similarity"},
+                            {"value": "mmr", "label": "Max Marginal Relevance"}
+                        ],
+                        "default": "similarity",
+                        "required": False
+                    },
+                    {
+                        "name": "k",
+                        "label": "Results (k)",
+                        "type": "number",
+                        "default": 4,
+                        "required": False,
+                        "min": 1,
+                        "max": 100
+                    },
+                    {
+                        "name": "fetch_k",
+                        "label": "MMR Candidates (fetch_k)",
+                        "type": "number",
+                        "default": 20,
+                        "required": False,
+                        "min": 1,
+                        "max": 1000
+                    },
+                    {
+                        "name": "lambda_mult",
+                        "label": "MMR Relevance Weight",
+                        "type": "number",
+                        "default": 0.5,
+                        "required": False,
+                        "min": 0,
+                        "max": 1,
+                        "step": 0.05
+                    },
+                    {
+                        "name": "score_threshold",
+                        "label": "Score Threshold",
+                        "type": "number",
+                        "required": False,
+                        "min": 0,
+                        "max": 1,
+                        "step": 0.05
+                    },
+                    {
+                        "name": "hybrid",
+                        "label": "Keyword Search",
+                        "type": "select",
+                        "options": [
+                            {"value": False, "label": "Off (vectors only)"},
+                            {"value": True, "label": "On (BM25 + vectors)"}
+                        ],
+                        "default": False,
+                        "required": False
+                    },
+                    {
+                        "name": "rrf_k",
+                        "label": "Rank Fusion Constant",
+                        "type": "number",
+                        "default": 60,
+                        "required": False,
+                        "min": 1,
+                        "max": 1000
                     }
                 ]
             },
@@ -160,6 +286,24 @@ class NodeConfigSchema:
                         "min": 0,
                         "max": 2,
                         "step": 0.1
+                    },
+                    {
+                        "name": "context_tokens",
+                        "label": "Context Token Budget",
+                        "type": "number",
+                        "default": 3000,
+                        "required": False,
+                        "min": 256,
+                        "max": 100000
+                    },
+                    {
+                        "name": "min_relevance_score",
+                        "label": "Minimum Relevance Score",
+                        "type": "number",
+                        "required": False,
+                        "min": 0,
+                        "max": 1,
+                        "step": 0.05
                     }
                 ]
             },
@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine, Column, String, JSON, DateTime, ForeignKey, Text
+from sqlalchemy import select, Column, String, JSON, DateTime, ForeignKey, Text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship, joinedload
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -42,8 +44,43 @@ if "://" not in _RAW_DATABASE_URL and "host=" in _RAW_DATABASE_URL:
 else:
     DATABASE_URL = _RAW_DATABASE_URL
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _to_async_url(url: str) -> str:
+    """
+    Swap the driver for its asyncio counterpart:
+      postgres[ql][+psycopg2]://... -> postgresql+asyncpg://...
+      sqlite:///local.db            -> sqlite+aiosqlite:///local.db  (local/test mode)
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    # SQLAlchemy reads the postgres:// alias (Heroku and friends) as its own backend name
+    if backend in ("postgresql", "postgres"):
+        query = dict(parsed.query)
+        # asyncpg spells libpq's sslmode as ssl
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        # Client-side cache of prepared statements per connection (0 disables, e.g. behind pgbouncer)
+        query.setdefault("prepared_statement_cache_size", os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+        parsed = parsed.set(drivername="postgresql+asyncpg", query=query)
+    elif backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() not in ("0", "false", "no")}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 20)),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        )
+    return options
+
+
+ASYNC_DATABASE_URL = _to_async_url(DATABASE_URL)
+engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -93,16 +130,32 @@ class ConnectionModel(Base):
     target_node = relationship("NodeModel", foreign_keys=[target_node_id], back_populates="connections_as_target")
 
 
+def workflow_graph_query(workflow_id: str):
+    """
+    Select a workflow with its nodes and every node's inbound connections.
+    Chaining the joins through the target node keeps it to one round trip with
+    about nodes + connections rows, instead of the nodes x connections product
+    that joining both collections off the workflow would return.
+    """
+    return (
+        select(WorkflowModel)
+        .where(WorkflowModel.id == workflow_id)
+        .options(joinedload(WorkflowModel.nodes).joinedload(NodeModel.connections_as_target))
+    )
+
+
 # Create tables
-def init_db():
-    Base.metadata.create_all(bind=engine)
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def dispose_db():
+    await engine.dispose()
 
 
 # Get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
@@ -1,12 +1,7 @@
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
-# Support both new (>=1.x) and legacy (0.27.x) OpenAI SDKs
-try:
-    from openai import OpenAI  # new SDK
-    _OPENAI_SDK = "new"
-except Exception:  # pragma: no cover
-    OpenAI = None
-    _OPENAI_SDK = "legacy"
+from utils.openai_client import _OPENAI_SDK, get_async_client
+if _OPENAI_SDK == "legacy":  # pragma: no cover
     import openai as openai_legacy  # legacy SDK
 
 class EmbeddingsNode:
@@ -27,34 +22,17 @@ class EmbeddingsNode:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
         self.model = config.model or "text-embedding-ada-002"
         self.api_key = api_key
-        # Lazy-create client in process() to avoid constructor-time SDK issues
         
-    def process(self, text: str) -> Dict[str, Any]:
+    async def process(self, text: str) -> Dict[str, Any]:
         try:
-            # Lazy init client per call for maximum compatibility
             if _OPENAI_SDK == "new":
-                # Initialize with minimal config to avoid proxy/environment issues
-                import os
-                import httpx
-                # Create httpx client without proxies to avoid version conflicts
-                # Don't pass proxies parameter - let httpx default to no proxies
-                http_client = httpx.Client(timeout=60.0)
-                client_kwargs = {
-                    "api_key": self.api_key,
-                    "http_client": http_client
-                }
-                if os.getenv("OPENAI_TIMEOUT"):
-                    try:
-                        timeout_val = float(os.getenv("OPENAI_TIMEOUT"))
-                        http_client = httpx.Client(timeout=timeout_val)
-                        client_kwargs["http_client"] = http_client
-                    except (ValueError, TypeError):
-                        pass
-                client = OpenAI(**client_kwargs)
-                response = client.embeddings.create(model=self.model, input=text)
+                # Shared pooled client; keeps TLS sessions and keep-alive across calls
+                client = get_async_client(self.api_key)
+                response = await client.embeddings.create(model=self.model, input=text)
                 embedding = response.data[0].embedding
             else:
-                response = openai_legacy.Embedding.create(model=self.model, input=text)
+                openai_legacy.api_key = self.api_key
+                response = await openai_legacy.Embedding.acreate(model=self.model, input=text)
                 embedding = response["data"][0]["embedding"]
             
             return {
@@ -69,4 +47,4 @@ class EmbeddingsNode:
             return {
                 "success": False,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
@@ -1,40 +1,170 @@
 from pydantic import BaseModel
-from typing import Dict, Any, List
-import tempfile
-import aiofiles
-from langchain_community.document_loaders import PyPDFLoader
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import asyncio
+import io
+import mmap
+import os
+from collections import deque
+from contextlib import contextmanager
+from pypdf import PdfReader
+from langchain_core.documents import Document
+
+from utils.executors import run_cpu_bound, process_pool_size
+
+# Ranges handed out per worker; more than one evens out pages of uneven cost
+RANGES_PER_WORKER = 4
+# Largest range when streaming, so the first pages reach the splitter early
+STREAM_RANGE_PAGES = 16
+
+
+@contextmanager
+def _open_pdf(file_path: str):
+    # The mmap lets pypdf seek around the file without reading it into memory
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield PdfReader(f)
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PdfReader(mapped)
+
+
+def _extract_pages(reader: PdfReader, source: str, start: int = 0, stop: Optional[int] = None) -> List[Document]:
+    # Same documents PyPDFLoader produces: one per page, source + absolute page number
+    pages = reader.pages
+    stop = len(pages) if stop is None else min(stop, len(pages))
+    return [
+        Document(page_content=pages[page_number].extract_text(), metadata={"source": source, "page": page_number})
+        for page_number in range(start, stop)
+    ]
+
+
+def _count_or_load_pdf(file_path: str, whole_below: float,
+                       source: Optional[str] = None) -> Tuple[int, Optional[List[Document]]]:
+    # Documents one worker would parse anyway are parsed in the same pass that counts them
+    with _open_pdf(file_path) as reader:
+        page_count = len(reader.pages)
+        if page_count < whole_below:
+            return page_count, _extract_pages(reader, source or file_path)
+        return page_count, None
+
+
+def _load_pdf(file_path: str, start: int = 0, stop: Optional[int] = None,
+              source: Optional[str] = None) -> List[Document]:
+    # Runs in a worker process; parsing is pure-Python and holds the GIL
+    with _open_pdf(file_path) as reader:
+        return _extract_pages(reader, source or file_path, start, stop)
+
+
+def _load_pdf_bytes(file_content: bytes, source: Optional[str] = None) -> List[Document]:
+    # BytesIO over bytes shares the buffer instead of copying it
+    return _extract_pages(PdfReader(io.BytesIO(file_content)), source or "upload.pdf")
+
+
+def _page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    if page_count <= 0:
+        return []
+    step = -(-page_count // max(1, parts))
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
 
 class PDFLoaderNode:
     class Config(BaseModel):
         name: str = "PDF Loader"
-        
-    def __init__(self):
+        # Worker processes one document may use; 0 means the whole process pool
+        max_workers: int = 0
+        # Smaller documents are parsed by a single worker
+        parallel_page_threshold: int = 32
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or self.Config()
         self.type = "pdf_loader"
-        self.name = "PDF Loader"
+        self.name = config.name
         self.inputs = ["file_path"]
         self.outputs = ["documents"]
-        
-    async def process(self, file_content: bytes) -> Dict[str, Any]:
+        self.config = config
+
+    def _workers(self, page_count: int) -> int:
+        if page_count < self._whole_below():
+            return 1
+        return max(1, self.config.max_workers or process_pool_size())
+
+    def _whole_below(self) -> float:
+        """Page count under which a document is parsed whole by a single worker."""
+        if max(1, self.config.max_workers or process_pool_size()) <= 1:
+            return float("inf")
+        return max(2, self.config.parallel_page_threshold)
+
+    async def _load_parallel(self, file_path: str, source: Optional[str] = None) -> Tuple[List[Document], int]:
+        """Extract page ranges in the process pool and merge them back in page order."""
+        page_count, documents = await run_cpu_bound(_count_or_load_pdf, file_path, self._whole_below(), source)
+        if documents is not None:
+            return documents, 1
+        workers = self._workers(page_count)
+
+        ranges = _page_ranges(page_count, workers * RANGES_PER_WORKER)
+        # The pool is shared; keep this document to its share of it
+        semaphore = asyncio.Semaphore(workers)
+
+        async def load_range(start: int, stop: int) -> List[Document]:
+            async with semaphore:
+                return await run_cpu_bound(_load_pdf, file_path, start, stop, source)
+
+        parts = await asyncio.gather(*(load_range(start, stop) for start, stop in ranges))
+        return [doc for part in parts for doc in part], len(ranges)
+
+    async def stream_pages(self, file_content: Optional[bytes] = None, file_path: Optional[str] = None,
+                           file_name: Optional[str] = None) -> AsyncIterator[List[Document]]:
+        """Yield pages in order, a range at a time, while the next ranges are being extracted."""
+        if not file_path:
+            if not file_content:
+                raise ValueError("No PDF provided")
+            yield await run_cpu_bound(_load_pdf_bytes, file_content, file_name)
+            return
+        file_path = str(file_path)
+        page_count, documents = await run_cpu_bound(_count_or_load_pdf, file_path, self._whole_below(), file_name)
+        if documents is not None:
+            yield documents
+            return
+        workers = self._workers(page_count)
+        parts = max(workers * RANGES_PER_WORKER if workers > 1 else 1, -(-page_count // STREAM_RANGE_PAGES))
+        # Only `workers` ranges are extracted ahead of the consumer
+        pending: deque = deque()
+        try:
+            for start, stop in _page_ranges(page_count, parts):
+                pending.append(asyncio.ensure_future(run_cpu_bound(_load_pdf, file_path, start, stop, file_name)))
+                if len(pending) >= workers:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def process(self, file_content: Optional[bytes] = None, file_path: Optional[str] = None,
+                      file_name: Optional[str] = None) -> Dict[str, Any]:
+        # file_name is the name the file was uploaded under; spooled uploads live at
+        # random paths, so it is what documents cite as their source
         try:
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-            
-            # Load PDF
-            loader = PyPDFLoader(temp_file_path)
-            documents = loader.load()
-            
+            # Spooled uploads are read in place; raw bytes never touch the disk
+            # but would be copied to every worker, so they are parsed in one
+            if file_path:
+                documents, ranges = await self._load_parallel(str(file_path), file_name)
+            elif file_content:
+                documents, ranges = await run_cpu_bound(_load_pdf_bytes, file_content, file_name), 1
+            else:
+                raise ValueError("No PDF provided")
+
             return {
                 "success": True,
                 "documents": documents,
                 "metadata": {
                     "total_pages": len(documents),
-                    "file_name": temp_file_path
+                    "page_ranges": ranges,
+                    "file_name": file_name or (os.path.basename(str(file_path)) if file_path else None)
                 }
             }
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
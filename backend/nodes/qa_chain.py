@@ -1,13 +1,18 @@
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
-try:
-    from openai import OpenAI  # new SDK
-    _OPENAI_SDK = "new"
-except Exception:  # pragma: no cover
-    OpenAI = None
-    _OPENAI_SDK = "legacy"
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+from utils.context_builder import PackedContext, pack_context
+from utils.executors import run_blocking
+from utils.tokenizer import get_tokenizer
+from utils.openai_client import _OPENAI_SDK, get_async_client
+if _OPENAI_SDK == "legacy":  # pragma: no cover
     import openai as openai_legacy
 
+PROMPT_TEMPLATE = (
+    "Use the following context to answer the question. "
+    "If the answer is not in the context, say you don't know.\n\n"
+    "CONTEXT:\n{context}\n\nQUESTION: {question}\nANSWER:"
+)
+
 class QAChainNode:
     class Config(BaseModel):
         # Provider kept for UI compatibility; backend always uses OpenAI
@@ -15,6 +20,10 @@ class QAChainNode:
         model: str = "gpt-3.5-turbo"
         temperature: float = 0
         name: str = "QA Chain"
+        # Retrieved text allowed into the prompt, most relevant first
+        context_tokens: int = 3000
+        # Chunks scored below this cosine similarity are dropped before packing
+        min_relevance_score: Optional[float] = None
         
     def __init__(self, config: Config, api_key: Optional[str] = None, gemini_key: Optional[str] = None):
         self.type = "qa_chain"
@@ -27,68 +36,45 @@ class QAChainNode:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
         self.model = config.model or "gpt-3.5-turbo"
         self.api_key = api_key
-        # Defer client creation until initialize_chain/process to avoid constructor-time issues
-        self.client = None
-        self.qa_chain = None
+        self.prompt_template = PROMPT_TEMPLATE
+        if _OPENAI_SDK == "legacy":
+            openai_legacy.api_key = self.api_key
         
-    def initialize_chain(self, retriever):
-        # Store retriever; prompt rendered directly during process()
-        self.retriever = retriever
-        self.prompt_template = (
-            "Use the following context to answer the question. "
-            "If the answer is not in the context, say you don't know.\n\n"
-            "CONTEXT:\n{context}\n\nQUESTION: {question}\nANSWER:"
-        )
-        # Lazily initialize client here
-        if self.client is None:
-            if _OPENAI_SDK == "new":
-                # Initialize with minimal config to avoid proxy/environment issues
-                import os
-                import httpx
-                # Create httpx client without proxies to avoid version conflicts
-                # Don't pass proxies parameter - let httpx default to no proxies
-                http_client = httpx.Client(timeout=60.0)
-                client_kwargs = {
-                    "api_key": self.api_key,
-                    "http_client": http_client
-                }
-                if os.getenv("OPENAI_TIMEOUT"):
-                    try:
-                        timeout_val = float(os.getenv("OPENAI_TIMEOUT"))
-                        http_client = httpx.Client(timeout=timeout_val)
-                        client_kwargs["http_client"] = http_client
-                    except (ValueError, TypeError):
-                        pass
-                self.client = OpenAI(**client_kwargs)
-            else:
-                openai_legacy.api_key = self.api_key
+    def _build_prompt(self, docs: List[Any], template: str, question: str) -> Tuple[PackedContext, str, int]:
+        tokenizer = get_tokenizer()
+        packed = pack_context(docs, self.config.context_tokens, tokenizer)
+        prompt = template.format(context=packed.text, question=question)
+        return packed, prompt, tokenizer.count(prompt)
         
-    def process(self, question: str, custom_prompt: Optional[str] = None) -> Dict[str, Any]:
+    async def process(
+        self,
+        question: str,
+        custom_prompt: Optional[str] = None,
+        on_token: Optional[Callable[[str], Awaitable[Any]]] = None,
+        retriever: Any = None
+    ) -> Dict[str, Any]:
+        # With on_token the completion is streamed and each delta is forwarded as it arrives.
+        # The retriever comes with every call; one node instance serves concurrent runs.
         try:
-            if not hasattr(self, "retriever") or self.retriever is None:
+            if retriever is None:
                 return {
                     "success": False,
                     "error": "QA chain not initialized. Please connect to a retriever first."
                 }
-            # Lazily ensure client exists (in case initialize_chain wasn't called yet)
-            if self.client is None:
-                if _OPENAI_SDK == "new":
-                    # Initialize with minimal config to avoid proxy/environment issues
-                    import os
-                    client_kwargs = {"api_key": self.api_key}
-                    if os.getenv("OPENAI_TIMEOUT"):
-                        try:
-                            client_kwargs["timeout"] = float(os.getenv("OPENAI_TIMEOUT"))
-                        except (ValueError, TypeError):
-                            pass
-                    self.client = OpenAI(**client_kwargs)
-                else:
-                    openai_legacy.api_key = self.api_key
             # Retrieve documents and build context (support both LC 0.0.x and 0.2 Runnables)
-            if hasattr(self.retriever, "get_relevant_documents"):
-                docs = self.retriever.get_relevant_documents(question)
-            elif hasattr(self.retriever, "invoke"):
-                maybe_docs = self.retriever.invoke(question)
+            low_relevance = 0
+            if hasattr(retriever, "ascored_search"):
+                scored = await retriever.ascored_search(question)
+                threshold = self.config.min_relevance_score
+                docs = [doc for doc, score in scored if threshold is None or score >= threshold]
+                low_relevance = len(scored) - len(docs)
+            elif hasattr(retriever, "ainvoke"):
+                maybe_docs = await retriever.ainvoke(question)
+                docs = maybe_docs if isinstance(maybe_docs, list) else []
+            elif hasattr(retriever, "get_relevant_documents"):
+                docs = await run_blocking(retriever.get_relevant_documents, question)
+            elif hasattr(retriever, "invoke"):
+                maybe_docs = await run_blocking(retriever.invoke, question)
                 docs = maybe_docs if isinstance(maybe_docs, list) else []
             else:
                 docs = []
@@ -110,7 +96,6 @@ class QAChainNode:
             if not isinstance(docs, list):
                 docs = list(docs) if docs is not None else []
             docs = [_coerce_doc(d) for d in docs]
-            context = "\n\n".join([getattr(d, "page_content", str(d)) for d in (docs[:6] if isinstance(docs, list) else [])])
             template = self.prompt_template
             if custom_prompt:
                 custom_prompt = custom_prompt.strip()
@@ -120,10 +105,30 @@ class QAChainNode:
                         "-----\n\n"
                         f"{self.prompt_template}"
                     )
-            prompt = template.format(context=context, question=question)
+            # Counting and trimming tokens is CPU work; keep it off the event loop
+            packed, prompt, prompt_tokens = await run_blocking(
+                self._build_prompt, docs, template, question
+            )
             # Call OpenAI chat completions directly
-            if _OPENAI_SDK == "new":
-                resp = self.client.chat.completions.create(
+            if _OPENAI_SDK == "new" and on_token is not None:
+                stream = await get_async_client(self.api_key).chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=self.config.temperature,
+                    max_tokens=800,
+                    stream=True,
+                )
+                parts = []
+                async for event in stream:
+                    if not event.choices:
+                        continue
+                    delta = event.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        await on_token(delta)
+                answer = "".join(parts).strip()
+            elif _OPENAI_SDK == "new":
+                resp = await get_async_client(self.api_key).chat.completions.create(
                     model=self.model,
                     messages=[{"role": "user", "content": prompt}],
                     temperature=self.config.temperature,
@@ -131,16 +136,16 @@ class QAChainNode:
                 )
                 answer = resp.choices[0].message.content.strip()
             else:
-                resp = openai_legacy.ChatCompletion.create(
+                resp = await openai_legacy.ChatCompletion.acreate(
                     model=self.model,
                     messages=[{"role": "user", "content": prompt}],
                     temperature=self.config.temperature,
                     max_tokens=800,
                 )
                 answer = resp["choices"][0]["message"]["content"].strip()
-            # Collect simple source hints
+            # Collect simple source hints from what the answer could actually see
             sources = []
-            for doc in docs:
+            for doc in packed.documents:
                 meta = getattr(doc, "metadata", {}) or {}
                 if "page" in meta:
                     sources.append(f"Page {meta['page'] + 1}")
@@ -150,7 +155,13 @@ class QAChainNode:
                 "sources": list(set(sources)),
                 "metadata": {
                     "model": self.config.model,
-                    "temperature": self.config.temperature
+                    "temperature": self.config.temperature,
+                    "prompt_tokens": prompt_tokens,
+                    "context_tokens": packed.tokens,
+                    "context_chunks": len(packed.documents),
+                    "dropped_chunks": packed.dropped,
+                    "context_truncated": packed.truncated,
+                    "low_relevance_chunks": low_relevance
                 }
             }
         except Exception as e:
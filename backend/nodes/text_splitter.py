@@ -1,13 +1,20 @@
 from pydantic import BaseModel
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Literal, Optional
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+from utils.text_splitting import NativeTextSplitter
+from utils.tokenizer import Tokenizer, get_tokenizer
+
 class TextSplitterNode:
     class Config(BaseModel):
         chunk_size: int = 1000
         chunk_overlap: int = 200
         name: str = "Text Splitter"
+        # "native" gives the same chunks as "langchain" in a single pass over offsets
+        engine: Literal["native", "langchain"] = "native"
+        # Whether chunk_size and chunk_overlap count characters or tokens
+        length_unit: Literal["characters", "tokens"] = "characters"
         
     def __init__(self, config: Config):
         self.type = "text_splitter"
@@ -15,16 +22,44 @@ class TextSplitterNode:
         self.inputs = ["documents"]
         self.outputs = ["chunks"]
         self.config = config
-        
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.chunk_size,
-            chunk_overlap=config.chunk_overlap,
-            length_function=len,
+        self.by_tokens = config.length_unit == "tokens"
+        # Nodes are built on the event loop; the vocabulary is only loaded by split(),
+        # which runs in the worker pool. Character splitters need none to be built.
+        self.splitter = None if self.by_tokens else self._build_splitter(None)
+    
+    @property
+    def length_unit(self) -> str:
+        # Token-sized chunks depend on the vocabulary they were counted with
+        return f"tokens:{get_tokenizer().name}" if self.by_tokens else "characters"
+    
+    def _build_splitter(self, tokenizer: Optional[Tokenizer]):
+        if self.config.engine == "native":
+            return NativeTextSplitter(
+                chunk_size=self.config.chunk_size,
+                chunk_overlap=self.config.chunk_overlap,
+                tokenizer=tokenizer
+            )
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.config.chunk_size,
+            chunk_overlap=self.config.chunk_overlap,
+            length_function=tokenizer.count if tokenizer is not None else len,
         )
         
+    def split(self, documents: List[Document]) -> List[Document]:
+        tokenizer = get_tokenizer()
+        # Rebuilt per call in token mode, so a vocabulary that loads later is used at once
+        splitter = self.splitter or self._build_splitter(tokenizer)
+        # Each document is split on its own, so batches of pages give the same chunks
+        chunks = splitter.split_documents(documents)
+        # Counted on the finished chunk, so embedding batches and prompts can pack to exact limits
+        counts = tokenizer.count_many([chunk.page_content for chunk in chunks])
+        for chunk, count in zip(chunks, counts):
+            chunk.metadata["token_count"] = count
+        return chunks
+        
     def process(self, documents: List[Document]) -> Dict[str, Any]:
         try:
-            chunks = self.splitter.split_documents(documents)
+            chunks = self.split(documents)
             
             return {
                 "success": True,
@@ -32,7 +67,10 @@ class TextSplitterNode:
                 "metadata": {
                     "total_chunks": len(chunks),
                     "chunk_size": self.config.chunk_size,
-                    "chunk_overlap": self.config.chunk_overlap
+                    "chunk_overlap": self.config.chunk_overlap,
+                    "length_unit": self.length_unit,
+                    "total_tokens": sum(chunk.metadata["token_count"] for chunk in chunks),
+                    "engine": self.config.engine
                 }
             }
         except Exception as e:
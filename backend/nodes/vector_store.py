@@ -1,20 +1,137 @@
+import asyncio
+import threading
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Literal, Optional, Callable
 from langchain_community.vectorstores import FAISS
-try:
-    from openai import OpenAI  # new SDK
-    _OPENAI_SDK = "new"
-except Exception:  # pragma: no cover
-    OpenAI = None
-    _OPENAI_SDK = "legacy"
-    import openai as openai_legacy
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from utils.bm25 import LEXICAL_ATTR, BM25Index
+from utils.embedding_cache import get_embedding_cache
+from utils.embedding_scheduler import EmbeddingScheduler
+from utils.executors import run_blocking
+from utils.ingestion_pipeline import PipelineStageError
+from utils.index_store import load_faiss, resident_indexes, save_faiss, saved_ingestion_key, saved_version
+from utils.retrieval import ScoredRetriever
+from utils.tokenizer import get_tokenizer
+from utils.openai_client import _OPENAI_SDK, get_async_client, get_sync_client
+if _OPENAI_SDK == "legacy":  # pragma: no cover
+    import openai as openai_legacy
+
+
+class _OpenAIEmbeddings(Embeddings):
+    """Embeddings backed by the process-wide OpenAI clients."""
+    
+    def __init__(self, api_key: str, model: str, batch_size: int = 64,
+                 batch_tokens: int = 32000, concurrency: int = 4):
+        self.api_key = api_key
+        self.model = model
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.concurrency = concurrency
+        if _OPENAI_SDK == "legacy":
+            openai_legacy.api_key = api_key
+    
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        if _OPENAI_SDK == "new":
+            # Retries are handled by the scheduler so it can see every 429
+            client = get_async_client(self.api_key).with_options(max_retries=0)
+            resp = await client.embeddings.create(model=self.model, input=texts)
+            return [d.embedding for d in resp.data]
+        resp = await openai_legacy.Embedding.acreate(model=self.model, input=texts)
+        return [d["embedding"] for d in resp["data"]]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            chunk = texts[i:i+self.batch_size]
+            if _OPENAI_SDK == "new":
+                resp = get_sync_client(self.api_key).embeddings.create(model=self.model, input=chunk)
+                vectors.extend([d.embedding for d in resp.data])
+            else:
+                resp = openai_legacy.Embedding.create(model=self.model, input=chunk)
+                vectors.extend([d["embedding"] for d in resp["data"]])
+        return vectors
+    
+    def embed_query(self, text: str) -> List[float]:
+        if _OPENAI_SDK == "new":
+            resp = get_sync_client(self.api_key).embeddings.create(model=self.model, input=text)
+            return resp.data[0].embedding
+        resp = openai_legacy.Embedding.create(model=self.model, input=text)
+        return resp["data"][0]["embedding"]
+    
+    async def aembed_documents(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int, int], Any]] = None,
+        token_counts: Optional[List[int]] = None
+    ) -> List[List[float]]:
+        cache = get_embedding_cache()
+        vectors: Dict[int, List[float]] = {}
+        if cache is not None:
+            vectors = await run_blocking(cache.get_many, self.model, texts)
+        # Only chunks never embedded with this model go to the API, once each
+        missing = list(dict.fromkeys(texts[i] for i in range(len(texts)) if i not in vectors))
+        cached_count = len(texts) - len(missing)
+        if on_progress is not None:
+            on_progress(cached_count, len(texts))
+        if missing:
+            scheduler = EmbeddingScheduler(
+                self._aembed_batch,
+                max_batch_tokens=self.batch_tokens,
+                concurrency=self.concurrency,
+                progress=(lambda done, _total: on_progress(cached_count + done, len(texts))) if on_progress else None
+            )
+            if token_counts is not None:
+                counts = dict(zip(texts, token_counts))
+                token_counts = [counts[text] for text in missing]
+            fresh = await scheduler.embed(missing, token_counts)
+            if cache is not None:
+                await run_blocking(cache.put_many, self.model, missing, fresh)
+            by_text = dict(zip(missing, fresh))
+            for i, text in enumerate(texts):
+                if i not in vectors:
+                    vectors[i] = by_text[text]
+        return [vectors[i] for i in range(len(texts))]
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        if _OPENAI_SDK == "new":
+            resp = await get_async_client(self.api_key).embeddings.create(model=self.model, input=text)
+            return resp.data[0].embedding
+        resp = await openai_legacy.Embedding.acreate(model=self.model, input=text)
+        return resp["data"][0]["embedding"]
+
+
+def _token_counts(documents: List[Document]) -> List[int]:
+    """Token counts the splitter recorded, counting only chunks that came without one."""
+    counts = [doc.metadata.get("token_count") for doc in documents]
+    missing = [i for i, count in enumerate(counts) if count is None]
+    if missing:
+        for i, count in zip(missing, get_tokenizer().count_many([documents[i].page_content for i in missing])):
+            counts[i] = count
+    return counts
+
 
 class VectorStoreNode:
     class Config(BaseModel):
         # Provider kept for UI compatibility; backend always uses OpenAI
         provider: str = "openai"
         name: str = "Vector Store"
+        # Embedding requests kept in flight at once during ingest
+        embedding_concurrency: int = 4
+        # Token budget per embedding request
+        embedding_batch_tokens: int = 32000
+        # Retrieval: "mmr" trades some relevance for diversity among the fetch_k best matches
+        search_type: Literal["similarity", "mmr"] = "similarity"
+        k: int = 4
+        fetch_k: int = 20
+        # 1 ranks purely by relevance, 0 purely by diversity
+        lambda_mult: float = 0.5
+        # Cosine similarity below which matches are never returned
+        score_threshold: Optional[float] = None
+        # Also query the BM25 index and merge both rankings by reciprocal-rank fusion
+        hybrid: bool = False
+        # RRF damping constant; larger values flatten the difference between ranks
+        rrf_k: int = 60
         
     def __init__(self, config: Config, api_key: Optional[str] = None, gemini_key: Optional[str] = None):
         self.type = "vector_store"
@@ -28,112 +145,186 @@ class VectorStoreNode:
         # Use a lightweight embeddings wrapper using the OpenAI client directly
         self.model = "text-embedding-ada-002"
         self.api_key = api_key
-        # Lazy initialize embeddings object in process() to avoid constructor-time SDK issues
         self.embeddings = None
-        self.vector_store = None
+        # Set by the app to persist built indexes and reattach them after restarts
+        self.persist_path: Optional[str] = None
+        # Indexes read from persist_path live in resident_indexes, which caps how many
+        # stay loaded. Runs never write there: what a run builds lives in its
+        # RunContext until it is saved to disk.
+        self._persist_lock = threading.Lock()
+        
+    def ensure_embeddings(self) -> Embeddings:
+        if self.embeddings is None:
+            self.embeddings = _OpenAIEmbeddings(
+                self.api_key,
+                self.model,
+                batch_tokens=self.config.embedding_batch_tokens,
+                concurrency=self.config.embedding_concurrency
+            )
+        return self.embeddings
+
+    def as_retriever(self, vector_store: FAISS) -> ScoredRetriever:
+        """Retriever over vector_store with this node's search settings."""
+        return ScoredRetriever(
+            vector_store,
+            search_type=self.config.search_type,
+            k=self.config.k,
+            fetch_k=self.config.fetch_k,
+            lambda_mult=self.config.lambda_mult,
+            score_threshold=self.config.score_threshold,
+            hybrid=self.config.hybrid,
+            rrf_k=self.config.rrf_k
+        )
+
+    @property
+    def loaded_vector_store(self) -> Optional[FAISS]:
+        """The saved index if it is loaded, without touching the disk."""
+        if not self.persist_path:
+            return None
+        return resident_indexes.peek(self.persist_path)
+    
+    def load_vector_store(self) -> Optional[FAISS]:
+        """Return the most recently saved index, rereading it only after a newer save."""
+        if not self.persist_path:
+            return None
+        with self._persist_lock:
+            version = saved_version(self.persist_path)
+            if version is None:
+                resident_indexes.discard(self.persist_path)
+                return None
+            return resident_indexes.get(
+                self.persist_path, version,
+                lambda: load_faiss(self.persist_path, self.ensure_embeddings())
+            )
+    
+    def _save(self, vector_store: FAISS, ingestion_key: Optional[str] = None):
+        # Concurrent runs may finish together; the last one to save wins
+        with self._persist_lock:
+            save_faiss(vector_store, self.persist_path, ingestion_key)
+    
+    async def persist(self, vector_store: FAISS, ingestion_key: Optional[str] = None):
+        """
+        Save vector_store as this node's index, if it has somewhere to save it.
+        ingestion_key records which cached ingestion it was built from, if any.
+        """
+        if self.persist_path:
+            await run_blocking(self._save, vector_store, ingestion_key)
+    
+    def saved_ingestion_key(self) -> Optional[str]:
+        """Ingestion cache key of the saved index, so a cache hit for it need not rewrite it."""
+        if not self.persist_path:
+            return None
+        return saved_ingestion_key(self.persist_path)
+    
+    async def _build(self, documents: List[Document], vectors: List[List[float]],
+                     ingestion_key: Optional[str] = None) -> Dict[str, Any]:
+        texts = [doc.page_content for doc in documents]
+        # Index construction is CPU work; keep it off the event loop. FAISS numbers
+        # vectors in insertion order, so BM25 document i is FAISS position i.
+        vector_store, lexical = await asyncio.gather(
+            run_blocking(
+                FAISS.from_embeddings,
+                list(zip(texts, vectors)),
+                self.ensure_embeddings(),
+                metadatas=[doc.metadata for doc in documents]
+            ),
+            run_blocking(BM25Index.build, texts)
+        )
+        setattr(vector_store, LEXICAL_ATTR, lexical)
+        await self.persist(vector_store, ingestion_key)
+        return {
+            "success": True,
+            "vector_store": vector_store,
+            "retriever": self.as_retriever(vector_store),
+            "metadata": {
+                "total_documents": len(documents),
+                "index_size": vector_store.index.ntotal
+            }
+        }
+    
+    async def process(
+        self,
+        documents: List[Document],
+        on_progress: Optional[Callable[[int, int], Any]] = None,
+        ingestion_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        try:
+            embeddings = self.ensure_embeddings()
+            texts = [doc.page_content for doc in documents]
+            # Tokenizing (and the first vocabulary load) is CPU work; keep it off the event loop
+            token_counts = await run_blocking(_token_counts, documents)
+            vectors = await embeddings.aembed_documents(
+                texts, on_progress=on_progress, token_counts=token_counts
+            )
+            return await self._build(documents, vectors, ingestion_key)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def process_stream(
+        self,
+        chunk_batches: AsyncIterator[List[Document]],
+        on_progress: Optional[Callable[[int, int], Any]] = None,
+        ingestion_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Embed chunks while they are still being produced. Each token-sized batch is
+        sent as soon as it fills; once embedding_concurrency batches are in flight,
+        reading stops, which stalls the stages upstream. Errors raised by those
+        stages propagate as PipelineStageError.
+        """
+        embeddings = self.ensure_embeddings()
+        slots = asyncio.Semaphore(max(1, self.config.embedding_concurrency))
+        documents: List[Document] = []
+        tasks: List[asyncio.Task] = []
+        batch: List[Document] = []
+        batch_counts: List[int] = []
+        batch_tokens = 0
+        done = 0
+        
+        async def embed(texts: List[str], token_counts: List[int]) -> List[List[float]]:
+            nonlocal done
+            try:
+                vectors = await embeddings.aembed_documents(texts, token_counts=token_counts)
+            finally:
+                slots.release()
+            done += len(texts)
+            if on_progress is not None:
+                on_progress(done, len(documents))
+            return vectors
+        
+        async def submit():
+            nonlocal batch, batch_counts, batch_tokens
+            await slots.acquire()
+            tasks.append(asyncio.create_task(embed([doc.page_content for doc in batch], batch_counts)))
+            batch, batch_counts, batch_tokens = [], [], 0
         
-    def process(self, documents: List[Document]) -> Dict[str, Any]:
         try:
-            # Lazy initialize embeddings wrapper
-            if self.embeddings is None:
-                if _OPENAI_SDK == "new":
-                    # Initialize client with minimal config to avoid proxy/environment issues
-                    import os
-                    import httpx
-                    # Create httpx client without proxies to avoid version conflicts
-                    # Don't pass proxies parameter - let httpx default to no proxies
-                    http_client = httpx.Client(timeout=60.0)
-                    client_kwargs = {
-                        "api_key": self.api_key,
-                        "http_client": http_client
-                    }
-                    if os.getenv("OPENAI_TIMEOUT"):
-                        try:
-                            timeout_val = float(os.getenv("OPENAI_TIMEOUT"))
-                            http_client = httpx.Client(timeout=timeout_val)
-                            client_kwargs["http_client"] = http_client
-                        except (ValueError, TypeError):
-                            pass
-                    client = OpenAI(**client_kwargs)
-                    def _embed_docs(texts):
-                        vectors = []
-                        batch = 64
-                        for i in range(0, len(texts), batch):
-                            chunk = texts[i:i+batch]
-                            resp = client.embeddings.create(model=self.model, input=chunk)
-                            vectors.extend([d.embedding for d in resp.data])
-                        return vectors
-                    def _embed_query(text):
-                        resp = client.embeddings.create(model=self.model, input=text)
-                        return resp.data[0].embedding
-                else:
-                    openai_legacy.api_key = self.api_key
-                    def _embed_docs(texts):
-                        vectors = []
-                        batch = 64
-                        for i in range(0, len(texts), batch):
-                            chunk = texts[i:i+batch]
-                            resp = openai_legacy.Embedding.create(model=self.model, input=chunk)
-                            vectors.extend([d["embedding"] for d in resp["data"]])
-                        return vectors
-                    def _embed_query(text):
-                        resp = openai_legacy.Embedding.create(model=self.model, input=text)
-                        return resp["data"][0]["embedding"]
-                class _Emb:
-                    def __init__(self, eq, ed):
-                        self._eq, self._ed = eq, ed
-                    def embed_query(self, t):
-                        return self._eq(t)
-                    def embed_documents(self, ts):
-                        return self._ed(ts)
-                    # Some vector stores expect a callable embedding function
-                    # that behaves like embed_documents(texts).
-                    def __call__(self, ts):
-                        # FAISS still calls the embedding function directly for queries.
-                        # When it does, it passes a single string (the query text).
-                        # Our document embedding helper `_ed` expects an iterable of
-                        # strings, so delegating to it would chunk the query by
-                        # characters and return multiple embeddings, breaking FAISS
-                        # (it expects a single vector and raises "too many values to
-                        # unpack" when given a higher dimensional array).
-                        if isinstance(ts, bytes):
-                            ts = ts.decode("utf-8", errors="ignore")
-                        if isinstance(ts, str):
-                            return self._eq(ts)
-                        if isinstance(ts, dict):
-                            payload = (
-                                ts.get("documents")
-                                or ts.get("texts")
-                                or ts.get("input")
-                                or ts.get("data")
-                            )
-                            if payload is not None:
-                                if not isinstance(payload, (list, tuple)):
-                                    payload = [payload]
-                                normalized = [
-                                    getattr(item, "page_content", item) for item in payload
-                                ]
-                                return self._ed(normalized)
-                        if isinstance(ts, (list, tuple)):
-                            normalized = [
-                                getattr(item, "page_content", item) for item in ts
-                            ]
-                            return self._ed(normalized)
-                        # Fallback: coerce to string and embed as a query
-                        return self._eq(str(ts))
-                self.embeddings = _Emb(_embed_query, _embed_docs)
-            self.vector_store = FAISS.from_documents(documents, self.embeddings)
-            retriever = self.vector_store.as_retriever()
-            
+            async for chunks in chunk_batches:
+                for doc, tokens in zip(chunks, await run_blocking(_token_counts, chunks)):
+                    if batch and batch_tokens + tokens > self.config.embedding_batch_tokens:
+                        await submit()
+                    documents.append(doc)
+                    batch.append(doc)
+                    batch_counts.append(tokens)
+                    batch_tokens += tokens
+            if batch:
+                await submit()
+            vectors = [vector for part in await asyncio.gather(*tasks) for vector in part]
+        except PipelineStageError:
+            raise
+        except Exception as e:
             return {
-                "success": True,
-                "vector_store": self.vector_store,
-                "retriever": retriever,
-                "metadata": {
-                    "total_documents": len(documents),
-                    "index_size": self.vector_store.index.ntotal if self.vector_store else 0
-                }
+                "success": False,
+                "error": str(e)
             }
+        finally:
+            for task in tasks:
+                task.cancel()
+        try:
+            return await self._build(documents, vectors, ingestion_key)
         except Exception as e:
             return {
                 "success": False,
@@ -141,6 +332,7 @@ class VectorStoreNode:
             }
     
     def similarity_search(self, query: str, k: int = 4) -> List[Document]:
-        if self.vector_store:
-            return self.vector_store.similarity_search(query, k=k)
+        vector_store = self.load_vector_store()
+        if vector_store is not None:
+            return vector_store.similarity_search(query, k=k)
         return []
\ No newline at end of file
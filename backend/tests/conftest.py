@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import importlib
+import pathlib
+import sys
+from typing import List
+
+import pytest
+
+# Modules import each other as top-level packages (utils.*, nodes.*), as when run from backend/
+BACKEND_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+class FakeEmbeddings:
+    """Deterministic bag-of-words vectors, so indexes can be built without calling OpenAI."""
+
+    dim = 16
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in text.lower().split():
+            bucket = int(hashlib.sha256(word.encode("utf-8")).hexdigest(), 16) % self.dim
+            vector[bucket] += 1.0
+        vector[-1] += 0.01
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+@pytest.fixture
+def embeddings():
+    pytest.importorskip("langchain_core")
+    from langchain_core.embeddings import Embeddings
+
+    class _Embeddings(FakeEmbeddings, Embeddings):
+        pass
+
+    return _Embeddings()
+
+
+@pytest.fixture
+def make_vector_store(embeddings):
+    """Build a FAISS store (with its BM25 index) over texts using the fake embeddings."""
+    pytest.importorskip("faiss")
+    from langchain_community.vectorstores import FAISS
+    from utils.bm25 import LEXICAL_ATTR, BM25Index
+
+    def make(texts: List[str], metadatas=None):
+        vector_store = FAISS.from_texts(list(texts), embeddings, metadatas=metadatas)
+        setattr(vector_store, LEXICAL_ATTR, BM25Index.build(list(texts)))
+        return vector_store
+
+    return make
+
+
+def _pdf(pages: List[str]) -> bytes:
+    # One Helvetica text line per page, with a valid xref table so pypdf needs no repairs
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(len(pages)))}] /Count {len(pages)} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]"
+                       f" /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+@pytest.fixture
+def make_pdf():
+    """Build a small text PDF with one page per string."""
+    return _pdf
+
+
+def run_with_db(app_module, scenario):
+    """Run scenario on a fresh event loop, closing the pooled database connections after."""
+    async def wrapped():
+        try:
+            return await scenario()
+        finally:
+            # Pooled aiosqlite connections belong to this event loop
+            await app_module.dispose_db()
+
+    return asyncio.run(wrapped())
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """The app, imported once against a throwaway SQLite database and cache directories."""
+    pytest.importorskip("fastapi")
+    pytest.importorskip("aiosqlite")
+    root = tmp_path_factory.mktemp("app")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("DATABASE_URL", f"sqlite:///{root / 'app.db'}")
+        patch.setenv("INDEX_STORE_DIR", str(root / "indexes"))
+        patch.setenv("INGESTION_CACHE_DIR", str(root / "ingestion"))
+        patch.setenv("UPLOAD_SPOOL_DIR", str(root / "uploads"))
+        patch.setenv("EMBEDDING_CACHE_PATH", str(root / "embeddings.sqlite3"))
+        patch.setenv("OPENAI_API_KEY", "sk-test")
+        module = importlib.import_module("app")
+    if not module.DB_ENABLED:
+        pytest.skip("database modules not available")
+    if "sqlite" not in module.SessionLocal.kw["bind"].url.drivername:
+        pytest.skip("app was already imported against another database")
+    run_with_db(module, module.init_db)
+    return module
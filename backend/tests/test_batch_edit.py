@@ -0,0 +1,100 @@
+import pytest
+
+from conftest import run_with_db
+
+
+async def stored_graph(app_module, workflow_id):
+    async with app_module.SessionLocal() as db:
+        model = await app_module.load_workflow_model(db, workflow_id)
+        connections = {conn.id for node in model.nodes for conn in node.connections_as_target}
+        return {node.id for node in model.nodes}, connections
+
+
+def op(**fields):
+    return fields
+
+
+async def new_workflow(app_module):
+    created = await app_module.create_workflow(app_module.CreateWorkflowRequest(name="batch"))
+    workflow_id = created["workflow_id"]
+    result = await app_module.batch_edit_workflow(workflow_id, app_module.BatchGraphEditRequest(operations=[
+        op(op="add_node", ref="loader", node_type="pdf_loader", position={"x": 1, "y": 2}),
+        op(op="add_node", ref="splitter", node_type="text_splitter"),
+        op(op="connect", source_node="loader", source_output="documents",
+           target_node="splitter", target_input="documents"),
+    ]))
+    return workflow_id, result
+
+
+def test_batch_is_written_and_applied_together(app_module):
+    async def scenario():
+        workflow_id, result = await new_workflow(app_module)
+        workflow = app_module.active_workflows[workflow_id]
+        loader, splitter = result["refs"]["loader"], result["refs"]["splitter"]
+
+        assert workflow.calculate_execution_order() == [loader, splitter]
+        assert workflow.nodes[loader]["position"] == {"x": 1.0, "y": 2.0}
+        assert await stored_graph(app_module, workflow_id) == (
+            {loader, splitter}, {result["connections"][0]["id"]}
+        )
+
+    run_with_db(app_module, scenario)
+
+
+def test_failed_write_rolls_back_database_and_memory(app_module, monkeypatch):
+    async def scenario():
+        workflow_id, result = await new_workflow(app_module)
+        workflow = app_module.active_workflows[workflow_id]
+        nodes_before, connections_before = dict(workflow.nodes), list(workflow.connections)
+        stored_before = await stored_graph(app_module, workflow_id)
+        real_write = app_module.write_graph_edits
+
+        async def failing_write(db, workflow_id, plan):
+            # Fail after the statements ran, so only a rollback can undo them
+            await real_write(db, workflow_id, plan)
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(app_module, "write_graph_edits", failing_write)
+        with pytest.raises(app_module.HTTPException) as error:
+            await app_module.batch_edit_workflow(workflow_id, app_module.BatchGraphEditRequest(operations=[
+                op(op="remove_node", node_id=result["refs"]["splitter"]),
+                op(op="add_node", node_type="pdf_loader"),
+            ]))
+
+        assert error.value.status_code == 500
+        assert await stored_graph(app_module, workflow_id) == stored_before
+        assert workflow.nodes == nodes_before
+        assert workflow.connections == connections_before
+
+    run_with_db(app_module, scenario)
+
+
+@pytest.mark.parametrize("operations, status_code", [
+    ([op(op="add_node")], 400),
+    ([op(op="move", node_id="missing", x=0, y=0)], 404),
+    ([op(op="add_node", ref="a", node_type="pdf_loader"), op(op="move", node_id="a")], 400),
+    ([op(op="connect", source_node="splitter", source_output="chunks",
+         target_node="loader", target_input="documents")], 400),
+])
+def test_invalid_batches_change_nothing(app_module, operations, status_code):
+    async def scenario():
+        workflow_id, result = await new_workflow(app_module)
+        refs = result["refs"]
+        for operation in operations:
+            for field in ("source_node", "target_node"):
+                if operation.get(field) in refs:
+                    operation[field] = refs[operation[field]]
+        workflow = app_module.active_workflows[workflow_id]
+        nodes_before = dict(workflow.nodes)
+        stored_before = await stored_graph(app_module, workflow_id)
+
+        with pytest.raises(app_module.HTTPException) as error:
+            await app_module.batch_edit_workflow(
+                workflow_id, app_module.BatchGraphEditRequest(operations=operations)
+            )
+
+        assert error.value.status_code == status_code
+        assert workflow.nodes == nodes_before
+        assert await stored_graph(app_module, workflow_id) == stored_before
+
+    run_with_db(app_module, scenario)
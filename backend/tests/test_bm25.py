@@ -0,0 +1,103 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.bm25 import LEXICAL_ATTR, BM25Index, lexical_index, tokenize
+from utils.retrieval import reciprocal_rank_fusion
+
+TEXTS = [
+    "invoice AB-1234 was paid in 10/2023",
+    "the contract renews every year",
+    "the contract the contract the contract",
+    "version 4.2.1 fixes the parser",
+    "",
+]
+
+
+def test_compounds_also_yield_their_parts():
+    assert tokenize("See AB-1234, v4.2.1!") == ["see", "ab-1234", "ab", "1234", "v4.2.1", "v4", "2", "1"]
+
+
+def test_scores_follow_okapi_bm25():
+    index = BM25Index.build(TEXTS)
+    positions, scores = index.search("contract renews", 5)
+
+    lengths = [len(tokenize(text)) for text in TEXTS]
+    average = sum(lengths) / len(lengths)
+
+    def expected(doc):
+        total = 0.0
+        for term in ("contract", "renews"):
+            tf = tokenize(TEXTS[doc]).count(term)
+            df = sum(term in tokenize(text) for text in TEXTS)
+            idf = math.log(1 + (len(TEXTS) - df + 0.5) / (df + 0.5))
+            total += idf * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * lengths[doc] / average))
+        return total
+
+    assert positions.tolist() == [1, 2]
+    assert scores.tolist() == pytest.approx([expected(1), expected(2)], rel=1e-5)
+
+
+def test_compound_identifiers_match_exactly_or_by_part():
+    index = BM25Index.build(TEXTS)
+    assert index.search("AB-1234", 1)[0].tolist() == [0]
+    assert index.search("1234", 1)[0].tolist() == [0]
+    assert index.search("4.2.1", 1)[0].tolist() == [3]
+    assert index.search("unknown words", 3)[0].tolist() == []
+    assert index.search("contract", 0)[0].tolist() == []
+
+
+def test_search_returns_the_top_k():
+    texts = [" ".join(["word"] * (i + 1) + ["filler"] * 20) for i in range(50)]
+    positions, scores = BM25Index.build(texts).search("word", 5)
+    assert positions.tolist() == [49, 48, 47, 46, 45]
+    assert np.all(np.diff(scores) <= 0)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_saved_index_searches_the_same(tmp_path, mmap):
+    index = BM25Index.build(TEXTS)
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path), mmap=mmap)
+
+    assert isinstance(loaded.doc_ids, np.memmap) == mmap
+    for query in ("contract", "AB-1234 parser", "the"):
+        expected, expected_scores = index.search(query, 5)
+        positions, scores = loaded.search(query, 5)
+        assert positions.tolist() == expected.tolist()
+        assert scores.tolist() == pytest.approx(expected_scores.tolist())
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_reciprocal_rank_fusion():
+    ids, scores = reciprocal_rank_fusion([np.array([3, 1, 2]), np.array([1, 4])], k=60)
+    assert ids.tolist() == [1, 3, 4, 2]
+    assert scores[0] == pytest.approx(1 / 62 + 1 / 61)
+    assert scores[1] == pytest.approx(1 / 61)
+    empty_ids, _ = reciprocal_rank_fusion([np.array([]), np.array([])])
+    assert empty_ids.tolist() == []
+
+
+def test_missing_or_stale_lexical_indexes_are_rebuilt(make_vector_store):
+    vector_store = make_vector_store(TEXTS[:4])
+    setattr(vector_store, LEXICAL_ATTR, None)
+    rebuilt = lexical_index(vector_store)
+    assert rebuilt.size == 4
+    assert lexical_index(vector_store) is rebuilt
+
+    setattr(vector_store, LEXICAL_ATTR, BM25Index.build(TEXTS[:2]))
+    assert lexical_index(vector_store).size == 4
+
+
+def test_hybrid_search_finds_exact_identifiers(make_vector_store):
+    from utils.retrieval import ScoredRetriever
+
+    texts = [f"quarterly report section {i} revenue growth" for i in range(20)] + ["reference code ZX-9981"]
+    vector_store = make_vector_store(texts)
+    hybrid = ScoredRetriever(vector_store, k=3, fetch_k=5, hybrid=True)
+
+    assert hybrid.lexical_search("ZX-9981").tolist() == [20]
+    results = hybrid.scored_search("ZX-9981")
+    assert results[0][0].page_content == "reference code ZX-9981"
+    assert all(isinstance(score, float) for _, score in results)
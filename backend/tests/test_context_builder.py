@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+from utils.context_builder import pack_context, splice, trim_to_tokens
+from utils.tokenizer import Tokenizer
+
+TOKENIZER = Tokenizer()
+
+
+def doc(text, page=None, source="a.pdf"):
+    metadata = {"source": source, "page": page} if page is not None else {}
+    return Document(page_content=text, metadata=metadata)
+
+
+def sentences(n, prefix="Fact"):
+    return " ".join(f"{prefix} number {i} is stated here." for i in range(n))
+
+
+def test_packed_context_never_exceeds_the_budget():
+    documents = [doc(sentences(20, f"Doc{i}"), page=i) for i in range(10)]
+    for budget in (30, 100, 250, 1000):
+        packed = pack_context(documents, budget, TOKENIZER)
+        assert packed.tokens <= budget
+        assert TOKENIZER.count(packed.text) <= budget
+        assert len(packed.documents) + packed.dropped == len(documents)
+
+
+def test_documents_that_fit_are_kept_in_relevance_order():
+    documents = [doc("Most relevant.", page=3), doc("Second.", page=1), doc("Third.", page=2)]
+    packed = pack_context(documents, 1000, TOKENIZER)
+
+    assert packed.text == "Most relevant.\n\nSecond.\n\nThird."
+    assert packed.documents == documents
+    assert (packed.dropped, packed.truncated) == (0, False)
+
+
+def test_a_chunk_that_does_not_fit_is_cut_at_a_sentence_once():
+    first = doc(sentences(5, "First"), page=0)
+    second = doc(sentences(40, "Second"), page=1)
+    third = doc(sentences(40, "Third"), page=2)
+    budget = TOKENIZER.count(first.page_content) + 60
+    packed = pack_context([first, second, third], budget, TOKENIZER)
+
+    assert packed.truncated
+    assert packed.documents == [first, second]
+    assert packed.dropped == 1
+    assert packed.text.endswith(".")
+    assert packed.tokens <= budget
+
+
+def test_small_chunks_after_a_cut_still_fit():
+    big = doc(sentences(40, "Big"), page=0)
+    small = doc("Tiny.", page=1)
+    packed = pack_context([big, small], 60, TOKENIZER)
+
+    assert packed.documents == [big, small]
+    assert packed.text.endswith("\n\nTiny.")
+
+
+def test_overlapping_chunks_of_a_page_are_spliced():
+    page = sentences(6)
+    head, tail = doc(page[:120], page=4), doc(page[80:], page=4)
+    other = doc("Other page.", page=5)
+    packed = pack_context([head, other, tail], 1000, TOKENIZER)
+
+    assert packed.text == page + "\n\nOther page."
+    # Separators are costed on their own, which can only overestimate
+    assert packed.tokens >= TOKENIZER.count(packed.text)
+
+
+def test_splice_needs_a_real_overlap():
+    assert splice("abcdefghijklmnopqrstuvwxyz", "uvwxyz and more") is None
+    text = "0123456789" * 5
+    assert splice(text[:35], text[10:]) == text
+    assert splice(text, text[5:15]) == text
+
+
+def test_trim_keeps_whole_sentences():
+    text = "One two three. Four five six. Seven eight nine."
+    assert trim_to_tokens(text, 100, TOKENIZER) == text
+    assert trim_to_tokens(text, 8, TOKENIZER) == "One two three. Four five six."
+    assert trim_to_tokens(text, 2, TOKENIZER) == ""
@@ -0,0 +1,73 @@
+import pytest
+
+
+@pytest.fixture
+def database(app_module):
+    # Imported through the app fixture so the module engine points at the test SQLite file
+    import database
+
+    return database
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("postgres://u:p@db:5432/app", "postgresql+asyncpg://u:p@db:5432/app?prepared_statement_cache_size=100"),
+    ("postgresql://u:p@db/app", "postgresql+asyncpg://u:p@db/app?prepared_statement_cache_size=100"),
+    ("postgresql+psycopg2://u:p@db/app", "postgresql+asyncpg://u:p@db/app?prepared_statement_cache_size=100"),
+    ("sqlite:///local.db", "sqlite+aiosqlite:///local.db"),
+    ("sqlite://", "sqlite+aiosqlite://"),
+])
+def test_async_url_swaps_the_driver(database, monkeypatch, url, expected):
+    monkeypatch.delenv("DB_STATEMENT_CACHE_SIZE", raising=False)
+
+    assert database._to_async_url(url) == expected
+
+
+def test_async_url_renames_sslmode_and_keeps_the_password(database, monkeypatch):
+    monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "0")
+    url = database._to_async_url("postgresql+psycopg2://u:s%40cret@db/app?sslmode=require")
+
+    assert url == "postgresql+asyncpg://u:s%40cret@db/app?prepared_statement_cache_size=0&ssl=require"
+
+
+def test_async_url_keeps_an_explicit_statement_cache_size(database):
+    url = database._to_async_url("postgresql://u:p@db/app?prepared_statement_cache_size=5")
+
+    assert url.endswith("?prepared_statement_cache_size=5")
+
+
+def test_dsn_converts_to_a_url(database):
+    url = database._convert_pg_dsn_to_url("host=db port=6543 dbname=app user=u password=p@ss sslmode=prefer")
+
+    assert url == "postgresql+psycopg2://u:p%40ss@db:6543/app?sslmode=prefer"
+    assert database._to_async_url(url).endswith("@db:6543/app?prepared_statement_cache_size=100&ssl=prefer")
+
+
+def test_engine_options_default(database, monkeypatch):
+    for name in ("DB_POOL_PRE_PING", "DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_TIMEOUT", "DB_POOL_RECYCLE"):
+        monkeypatch.delenv(name, raising=False)
+
+    assert database._engine_options("postgresql+asyncpg://u:p@db/app") == {
+        "pool_pre_ping": True, "pool_size": 10, "max_overflow": 20, "pool_timeout": 30.0, "pool_recycle": 1800,
+    }
+
+
+def test_engine_options_from_env(database, monkeypatch):
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "2.5")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "60")
+
+    assert database._engine_options("postgresql+asyncpg://u:p@db/app") == {
+        "pool_pre_ping": False, "pool_size": 3, "max_overflow": 0, "pool_timeout": 2.5, "pool_recycle": 60,
+    }
+
+
+def test_engine_options_skip_pool_sizing_for_sqlite(database, monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+
+    assert database._engine_options("sqlite+aiosqlite:///local.db") == {"pool_pre_ping": True}
+
+
+def test_module_engine_uses_the_async_driver(database):
+    assert database.engine.url.drivername == "sqlite+aiosqlite"
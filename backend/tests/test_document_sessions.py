@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+from utils.document_sessions import DocumentSessionStore
+
+
+def test_sessions_are_scoped_to_their_workflow():
+    store = DocumentSessionStore()
+    store.put("doc", "workflow-a", vector_store="index-a", retriever="retriever-a")
+
+    assert store.get("workflow-a", "doc").vector_store == "index-a"
+    # Another workflow holding the same handle must not reach workflow-a's index
+    assert store.get("workflow-b", "doc") is None
+
+    store.put("doc", "workflow-b", vector_store="index-b", retriever="retriever-b")
+    assert store.get("workflow-a", "doc").vector_store == "index-a"
+    assert store.get("workflow-b", "doc").vector_store == "index-b"
+
+
+def test_discard_workflow_only_drops_its_sessions():
+    store = DocumentSessionStore()
+    store.put("doc", "workflow-a", None, None)
+    store.put("doc", "workflow-b", None, None)
+
+    store.discard_workflow("workflow-a")
+
+    assert store.get("workflow-a", "doc") is None
+    assert store.get("workflow-b", "doc") is not None
+
+
+def test_least_recently_used_session_goes_first(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.document_sessions.time.time", lambda: now[0])
+    store = DocumentSessionStore(max_sessions=2)
+    store.put("one", "wf", None, None)
+    now[0] += 1
+    store.put("two", "wf", None, None)
+    now[0] += 1
+    store.get("wf", "one")
+    now[0] += 1
+    store.put("three", "wf", None, None)
+
+    assert store.get("wf", "two") is None
+    assert store.get("wf", "one") is not None
+    assert store.get("wf", "three") is not None
+
+
+def test_idle_sessions_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.document_sessions.time.time", lambda: now[0])
+    store = DocumentSessionStore(idle_ttl=60)
+    store.put("doc", "wf", None, None, {"file_name": "a.pdf"})
+
+    now[0] += 30
+    assert store.get("wf", "doc").metadata == {"file_name": "a.pdf"}
+    now[0] += 61
+    assert store.get("wf", "doc") is None
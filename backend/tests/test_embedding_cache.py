@@ -0,0 +1,87 @@
+import itertools
+import sqlite3
+import types
+
+import pytest
+
+from utils import embedding_cache
+from utils.embedding_cache import EmbeddingCache, text_hash
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Every access gets a distinct timestamp so LRU order is deterministic
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(embedding_cache, "time", types.SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def vector(value, dim=4):
+    return [float(value)] * dim
+
+
+def test_get_returns_hits_by_index(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite3"))
+    cache.put_many("m", ["a", "b"], [vector(1), vector(2)])
+
+    assert cache.get_many("m", ["b", "x", "a", "b"]) == {0: vector(2), 2: vector(1), 3: vector(2)}
+    assert cache.get_many("other-model", ["a"]) == {}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 2)
+    assert (stats["rows"], stats["bytes"]) == (2, 2 * 4 * 4)
+
+
+def test_duplicate_puts_keep_the_stored_vector(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite3"))
+    cache.put_many("m", ["a"], [vector(1)])
+    cache.put_many("m", ["a"], [vector(9)])
+
+    assert cache.get_many("m", ["a"]) == {0: vector(1)}
+    assert cache.stats()["rows"] == 1
+
+
+def test_least_recently_used_rows_are_evicted_by_count(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite3"), max_rows=2)
+    cache.put_many("m", ["a"], [vector(1)])
+    cache.put_many("m", ["b"], [vector(2)])
+    cache.get_many("m", ["a"])
+    cache.put_many("m", ["c"], [vector(3)])
+
+    assert cache.get_many("m", ["a", "b", "c"]) == {0: vector(1), 2: vector(3)}
+    stats = cache.stats()
+    assert (stats["rows"], stats["evictions"]) == (2, 1)
+
+
+def test_rows_are_evicted_by_bytes(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite3"), max_bytes=40)
+    cache.put_many("m", ["a", "b"], [vector(1), vector(2)])
+    cache.put_many("m", ["c"], [vector(3)])
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 40
+    assert cache.get_many("m", ["c"]) == {0: vector(3)}
+
+
+def test_reopening_enforces_new_bounds(tmp_path):
+    path = str(tmp_path / "e.sqlite3")
+    EmbeddingCache(path).put_many("m", ["a", "b", "c"], [vector(1), vector(2), vector(3)])
+
+    assert EmbeddingCache(path, max_rows=1).stats()["rows"] == 1
+
+
+def test_caches_without_last_access_are_migrated(tmp_path):
+    path = tmp_path / "e.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE embeddings (model TEXT NOT NULL, text_hash TEXT NOT NULL, dim INTEGER NOT NULL,"
+        " vector BLOB NOT NULL, PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+    )
+    conn.execute("INSERT INTO embeddings VALUES (?, ?, ?, ?)",
+                 ("m", text_hash("old"), 4, bytes(16)))
+    conn.commit()
+    conn.close()
+
+    cache = EmbeddingCache(str(path), max_rows=2)
+    assert cache.stats()["rows"] == 1
+    # Rows from before the migration count as the oldest
+    cache.put_many("m", ["new", "newer"], [vector(1), vector(2)])
+    assert cache.get_many("m", ["old", "new", "newer"]) == {1: vector(1), 2: vector(2)}
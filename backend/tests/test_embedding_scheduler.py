@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from utils.embedding_scheduler import EmbeddingScheduler, _retry_after
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after_ms="1"):
+        super().__init__("rate limited")
+        self.headers = {"retry-after-ms": retry_after_ms}
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def test_batches_respect_token_and_size_limits():
+    scheduler = EmbeddingScheduler(None, max_batch_tokens=10, max_batch_size=3)
+    batches = scheduler.batches(["t"] * 6, token_counts=[4, 4, 4, 1, 1, 1])
+    assert batches == [[0, 1], [2, 3, 4], [5]]
+    # A text larger than the budget still gets a batch of its own
+    assert scheduler.batches(["t", "t"], token_counts=[50, 1]) == [[0], [1]]
+
+
+def test_embed_keeps_order_and_bounds_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def embed_batch(texts):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [[float(text)] for text in texts]
+
+    progress = []
+    scheduler = EmbeddingScheduler(embed_batch, max_batch_tokens=2, concurrency=3,
+                                   progress=lambda done, total: progress.append((done, total)))
+    texts = [str(i) for i in range(20)]
+    vectors = asyncio.run(scheduler.embed(texts, token_counts=[1] * 20))
+
+    assert vectors == [[float(i)] for i in range(20)]
+    assert peak == 3
+    assert progress[-1] == (20, 20)
+
+
+def test_rate_limits_are_retried():
+    calls = []
+
+    async def embed_batch(texts):
+        calls.append(list(texts))
+        if len(calls) == 1:
+            raise RateLimited()
+        return [[1.0] for _ in texts]
+
+    scheduler = EmbeddingScheduler(embed_batch, concurrency=2)
+    assert asyncio.run(scheduler.embed(["a", "b"], token_counts=[1, 1])) == [[1.0], [1.0]]
+    assert calls == [["a", "b"], ["a", "b"]]
+
+
+def test_non_retryable_errors_propagate():
+    calls = 0
+
+    async def embed_batch(texts):
+        nonlocal calls
+        calls += 1
+        raise BadRequest("bad input")
+
+    scheduler = EmbeddingScheduler(embed_batch)
+    with pytest.raises(BadRequest):
+        asyncio.run(scheduler.embed(["a"], token_counts=[1]))
+    assert calls == 1
+
+
+def test_gives_up_after_max_retries():
+    async def embed_batch(texts):
+        raise RateLimited()
+
+    scheduler = EmbeddingScheduler(embed_batch, max_retries=2)
+    with pytest.raises(RateLimited):
+        asyncio.run(scheduler.embed(["a"], token_counts=[1]))
+
+
+def test_retry_after_headers():
+    assert _retry_after(RateLimited("1500")) == 1.5
+
+    class Plain(Exception):
+        headers = {"retry-after": "3"}
+
+    assert _retry_after(Plain()) == 3.0
+    assert _retry_after(Exception()) is None
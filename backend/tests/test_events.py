@@ -0,0 +1,41 @@
+import asyncio
+
+from utils.events import EventBus
+
+
+def test_events_fan_out_per_topic():
+    async def scenario():
+        bus = EventBus()
+        first, second = bus.subscribe("wf-1"), bus.subscribe("wf-1")
+        other = bus.subscribe("wf-2")
+        bus.publish("wf-1", {"type": "run_started"})
+        assert first.get_nowait() == second.get_nowait() == {"type": "run_started"}
+        assert other.empty()
+        # Topics nobody listens to are simply dropped
+        bus.publish("wf-3", {"type": "run_started"})
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscribers_lose_their_oldest_events():
+    async def scenario():
+        bus = EventBus(queue_size=2)
+        queue = bus.subscribe("wf")
+        for i in range(5):
+            bus.publish("wf", {"seq": i})
+        return [queue.get_nowait()["seq"] for _ in range(queue.qsize())]
+
+    assert asyncio.run(scenario()) == [3, 4]
+
+
+def test_unsubscribe_removes_empty_topics():
+    async def scenario():
+        bus = EventBus()
+        queue = bus.subscribe("wf")
+        assert bus.subscriber_count("wf") == 1
+        bus.unsubscribe("wf", queue)
+        bus.unsubscribe("wf", queue)
+        assert bus.subscriber_count("wf") == 0
+        assert "wf" not in bus._subscribers
+
+    asyncio.run(scenario())
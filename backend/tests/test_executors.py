@@ -0,0 +1,62 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from utils import executors
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    executors.shutdown_pools()
+    yield
+    executors.shutdown_pools()
+
+
+def test_run_blocking_keeps_the_event_loop_free():
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        thread_name, _ = await asyncio.gather(
+            executors.run_blocking(lambda: (time.sleep(0.1), threading.current_thread().name)[1]),
+            ticker()
+        )
+        return thread_name
+
+    thread_name = asyncio.run(main())
+
+    assert thread_name.startswith("node-io")
+    # All ticks happened while the blocking call was still sleeping
+    assert len(ticks) == 5 and ticks[-1] - ticks[0] < 0.1
+
+
+def test_run_cpu_bound_uses_worker_processes():
+    pid = asyncio.run(executors.run_cpu_bound(os.getpid))
+    assert pid != os.getpid()
+
+
+def test_pool_sizes_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("NODE_THREAD_POOL_SIZE", "3")
+    monkeypatch.setenv("NODE_PROCESS_POOL_SIZE", "not a number")
+
+    assert executors.get_thread_pool()._max_workers == 3
+    assert executors.process_pool_size() == (os.cpu_count() or 1)
+    # The pool is built once and shared
+    assert executors.get_thread_pool() is executors.get_thread_pool()
+
+
+def test_worker_processes_are_not_forked_from_the_server(monkeypatch):
+    monkeypatch.delenv("NODE_PROCESS_START_METHOD", raising=False)
+
+    assert executors.get_process_pool()._mp_context.get_start_method() in ("forkserver", "spawn")
+    executors.shutdown_pools()
+    monkeypatch.setenv("NODE_PROCESS_START_METHOD", "spawn")
+    assert executors.get_process_pool()._mp_context.get_start_method() == "spawn"
+    assert asyncio.run(executors.run_cpu_bound(os.getpid)) != os.getpid()
@@ -0,0 +1,92 @@
+import contextlib
+
+from sqlalchemy import event
+
+from conftest import run_with_db
+
+
+@contextlib.contextmanager
+def count_selects(app_module):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    engine = app_module.SessionLocal.kw["bind"].sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+async def new_graph(app_module):
+    created = await app_module.create_workflow(app_module.CreateWorkflowRequest(name="graph"))
+    workflow_id = created["workflow_id"]
+    operations = [
+        {"op": "add_node", "ref": "loader", "node_type": "pdf_loader"},
+        {"op": "add_node", "ref": "other_loader", "node_type": "pdf_loader"},
+        {"op": "add_node", "ref": "splitter", "node_type": "text_splitter"},
+        {"op": "add_node", "ref": "other_splitter", "node_type": "text_splitter"},
+        {"op": "connect", "source_node": "loader", "source_output": "documents",
+         "target_node": "splitter", "target_input": "documents"},
+        {"op": "connect", "source_node": "other_loader", "source_output": "documents",
+         "target_node": "other_splitter", "target_input": "documents"},
+    ]
+    result = await app_module.batch_edit_workflow(
+        workflow_id, app_module.BatchGraphEditRequest(operations=operations)
+    )
+    return workflow_id, result
+
+
+def test_loading_a_workflow_is_one_select(app_module):
+    async def scenario():
+        workflow_id, result = await new_graph(app_module)
+        app_module.active_workflows.pop(workflow_id)
+
+        with count_selects(app_module) as statements:
+            payload = await app_module.get_workflow(workflow_id)
+
+        assert len(statements) == 1
+        assert {node["id"] for node in payload["nodes"]} == set(result["refs"].values())
+        assert {conn["id"] for conn in payload["connections"]} == {c["id"] for c in result["connections"]}
+
+    run_with_db(app_module, scenario)
+
+
+def test_get_stack_queries_the_workflow_once(app_module):
+    async def scenario():
+        workflow_id, _ = await new_graph(app_module)
+
+        app_module.active_workflows.pop(workflow_id)
+        with count_selects(app_module) as cold:
+            stack = await app_module.get_stack(workflow_id)
+        with count_selects(app_module) as warm:
+            assert await app_module.get_stack(workflow_id) == stack
+
+        assert stack["name"] == "graph"
+        assert len(cold) == 1
+        # A cached graph only needs the workflow row itself
+        assert len(warm) == 1 and "JOIN" not in warm[0].upper()
+
+    run_with_db(app_module, scenario)
+
+
+def test_graph_query_returns_a_row_per_node_and_inbound_connection(app_module):
+    async def scenario():
+        workflow_id, result = await new_graph(app_module)
+
+        async with app_module.SessionLocal() as db:
+            # Core rows, before the ORM folds the joined collections together
+            rows = (await (await db.connection()).execute(app_module.workflow_graph_query(workflow_id))).all()
+            model = await app_module.load_workflow_model(db, workflow_id)
+
+        node_ids = [node.id for node in model.nodes]
+        connection_ids = [conn.id for node in model.nodes for conn in node.connections_as_target]
+        assert sorted(node_ids) == sorted(result["refs"].values())
+        assert sorted(connection_ids) == sorted(c["id"] for c in result["connections"])
+        # Each node joins only its inbound connections: no nodes x connections product
+        assert len(rows) == len(node_ids)
+
+    run_with_db(app_module, scenario)
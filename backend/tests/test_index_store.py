@@ -0,0 +1,153 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("faiss")
+
+from utils.bm25 import LEXICAL_ATTR
+from utils.index_store import (CURRENT_FILE, IndexStore, ResidentIndexes, has_saved_index, load_faiss,
+                               save_faiss, saved_ingestion_key, saved_version)
+
+
+def texts_of(vector_store):
+    return sorted(doc.page_content for doc in vector_store.docstore._dict.values())
+
+
+def versions(folder):
+    return sorted(entry.name for entry in folder.iterdir() if entry.name.startswith("v-"))
+
+
+def test_save_and_load_round_trip(tmp_path, embeddings, make_vector_store):
+    folder = tmp_path / "node"
+    assert not has_saved_index(str(folder))
+    assert saved_version(str(folder)) is None
+
+    save_faiss(make_vector_store(["alpha beta", "gamma delta"]), str(folder), ingestion_key="key-1")
+
+    assert has_saved_index(str(folder))
+    assert saved_ingestion_key(str(folder)) == "key-1"
+    loaded = load_faiss(str(folder), embeddings)
+    assert texts_of(loaded) == ["alpha beta", "gamma delta"]
+    assert loaded.similarity_search("gamma delta", k=1)[0].page_content == "gamma delta"
+    positions, _ = getattr(loaded, LEXICAL_ATTR).search("alpha", 1)
+    assert loaded.docstore.search(loaded.index_to_docstore_id[int(positions[0])]).page_content == "alpha beta"
+
+
+def test_save_swaps_the_current_version(tmp_path, embeddings, make_vector_store):
+    folder = tmp_path / "node"
+    save_faiss(make_vector_store(["first"]), str(folder), ingestion_key="key-1")
+    first = saved_version(str(folder))
+    save_faiss(make_vector_store(["second"]), str(folder))
+    second = saved_version(str(folder))
+
+    assert first != second
+    assert (folder / CURRENT_FILE).read_text() == second
+    # The replaced copy is removed once the pointer moves
+    assert versions(folder) == [second]
+    assert texts_of(load_faiss(str(folder), embeddings)) == ["second"]
+    assert saved_ingestion_key(str(folder)) is None
+
+
+def test_stale_versions_are_removed(tmp_path, make_vector_store):
+    folder = tmp_path / "node"
+    save_faiss(make_vector_store(["first"]), str(folder))
+    orphan = folder / "v-orphan"
+    orphan.mkdir()
+    os.utime(orphan, (0, 0))
+    save_faiss(make_vector_store(["second"]), str(folder))
+
+    assert versions(folder) == [saved_version(str(folder))]
+
+
+def test_flat_layout_is_read_and_replaced(tmp_path, embeddings, make_vector_store):
+    folder = tmp_path / "node"
+    make_vector_store(["legacy"]).save_local(str(folder))
+
+    assert has_saved_index(str(folder))
+    assert saved_version(str(folder)).startswith("flat-")
+    assert texts_of(load_faiss(str(folder), embeddings)) == ["legacy"]
+
+    save_faiss(make_vector_store(["current"]), str(folder))
+    assert not (folder / "index.faiss").exists()
+    assert texts_of(load_faiss(str(folder), embeddings)) == ["current"]
+
+
+def test_index_store_rejects_unsafe_ids(tmp_path):
+    store = IndexStore(str(tmp_path))
+    assert store.path_for("wf-1", "node_2") == str(tmp_path / "wf-1" / "node_2")
+    for bad in ("..", "a/b", "", "x y"):
+        with pytest.raises(ValueError):
+            store.path_for("wf", bad)
+
+
+def test_node_rereads_only_after_a_new_save(tmp_path, embeddings, make_vector_store):
+    from nodes.vector_store import VectorStoreNode
+
+    node = VectorStoreNode(VectorStoreNode.Config(), api_key="sk-test")
+    node.embeddings = embeddings
+    assert node.load_vector_store() is None
+    node.persist_path = str(tmp_path / "node")
+
+    asyncio.run(node.persist(make_vector_store(["first"]), "key-1"))
+    loaded = node.load_vector_store()
+    assert node.load_vector_store() is loaded
+    assert node.saved_ingestion_key() == "key-1"
+
+    asyncio.run(node.persist(make_vector_store(["second"]), "key-2"))
+    assert texts_of(node.load_vector_store()) == ["second"]
+    assert node.saved_ingestion_key() == "key-2"
+
+
+def test_resident_indexes_drop_the_least_recently_used(tmp_path, embeddings, make_vector_store):
+    resident = ResidentIndexes(max_indexes=2)
+    loads = []
+
+    def loader(name):
+        def load():
+            loads.append(name)
+            return make_vector_store([name])
+        return load
+
+    first = resident.get("a", "v1", loader("a"))
+    resident.get("b", "v1", loader("b"))
+    assert resident.get("a", "v1", loader("a")) is first
+    resident.get("c", "v1", loader("c"))
+
+    assert resident.peek("b") is None
+    assert resident.peek("a") is first
+    assert resident.stats()["evictions"] == 1
+    resident.get("b", "v1", loader("b"))
+    assert loads == ["a", "b", "c", "b"]
+
+
+def test_resident_indexes_reload_new_versions_and_respect_the_byte_budget(make_vector_store):
+    one = make_vector_store(["one"])
+    size = one.index.ntotal * one.index.d * 4
+    resident = ResidentIndexes(max_indexes=10, max_bytes=size * 2)
+
+    resident.get("a", "v1", lambda: one)
+    second = resident.get("a", "v2", lambda: make_vector_store(["two"]))
+    assert resident.peek("a") is second
+    assert resident.stats()["bytes"] == size
+
+    resident.get("b", "v1", lambda: make_vector_store(["b"]))
+    resident.get("c", "v1", lambda: make_vector_store(["c"]))
+    assert resident.peek("a") is None
+    assert resident.stats()["bytes"] == size * 2
+
+
+def test_deleting_a_workflow_unloads_its_indexes(tmp_path, embeddings, make_vector_store):
+    from nodes.vector_store import VectorStoreNode
+
+    store = IndexStore(str(tmp_path))
+    node = VectorStoreNode(VectorStoreNode.Config(), api_key="sk-test")
+    node.embeddings = embeddings
+    node.persist_path = store.path_for("wf", "node")
+    asyncio.run(node.persist(make_vector_store(["kept"])))
+    assert node.load_vector_store() is node.loaded_vector_store
+
+    store.delete_workflow("wf")
+
+    assert node.loaded_vector_store is None
+    assert node.load_vector_store() is None
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("faiss")
+
+from utils.ingestion_cache import META_FILE, IngestionCache, compute_ingestion_key, hash_bytes
+
+
+def test_key_depends_on_content_and_chunking():
+    content = hash_bytes(b"%PDF-1.4 example")
+    key = compute_ingestion_key(content, 1000, 200, "text-embedding-ada-002")
+    assert key == compute_ingestion_key(content, 1000, 200, "text-embedding-ada-002")
+    assert key != compute_ingestion_key(content, 500, 200, "text-embedding-ada-002")
+    assert key != compute_ingestion_key(content, 1000, 100, "text-embedding-ada-002")
+    assert key != compute_ingestion_key(content, 1000, 200, "text-embedding-3-small")
+    assert key != compute_ingestion_key(hash_bytes(b"other"), 1000, 200, "text-embedding-ada-002")
+    # Character sizes keep the key they had before token sizes existed
+    assert key == compute_ingestion_key(content, 1000, 200, "text-embedding-ada-002", "characters")
+    assert key != compute_ingestion_key(content, 1000, 200, "text-embedding-ada-002", "tokens")
+
+
+def test_miss_then_hit(tmp_path, embeddings, make_vector_store):
+    cache = IngestionCache(str(tmp_path))
+    assert cache.get("doc", embeddings) is None
+
+    cache.put("doc", make_vector_store(["alpha beta", "gamma delta"]), {"total_chunks": 2})
+    cached = cache.get("doc", embeddings)
+
+    assert cached is not None
+    assert [chunk.page_content for chunk in cached["chunks"]] == ["alpha beta", "gamma delta"]
+    assert cached["metadata"] == {"total_chunks": 2}
+    assert cached["vector_store"].index.ntotal == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_evicts_least_recently_used_entry(tmp_path, embeddings, make_vector_store):
+    cache = IngestionCache(str(tmp_path), max_entries=2)
+    cache.put("first", make_vector_store(["one"]))
+    cache.put("second", make_vector_store(["two"]))
+    # Reading "first" makes "second" the oldest
+    assert cache.get("first", embeddings) is not None
+    cache.put("third", make_vector_store(["three"]))
+
+    assert "first" in cache and "third" in cache
+    assert "second" not in cache
+    assert not (tmp_path / "second").exists()
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_down_to_byte_budget(tmp_path, make_vector_store):
+    cache = IngestionCache(str(tmp_path))
+    cache.put("probe", make_vector_store(["some text"]))
+    entry_size = cache.stats()["bytes"]
+
+    cache = IngestionCache(str(tmp_path / "bounded"), max_bytes=int(entry_size * 2.5))
+    for key in ("a", "b", "c"):
+        cache.put(key, make_vector_store(["some text"]))
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert "a" not in cache
+
+
+def test_restart_keeps_entries_and_drops_partial_ones(tmp_path, embeddings, make_vector_store):
+    IngestionCache(str(tmp_path)).put("doc", make_vector_store(["kept"]), {"total_chunks": 1})
+    # A crash between writing the index and its meta file leaves a directory without META_FILE
+    (tmp_path / "partial").mkdir()
+
+    cache = IngestionCache(str(tmp_path))
+
+    assert "doc" in cache
+    assert not (tmp_path / "partial").exists()
+    assert json.loads((tmp_path / "doc" / META_FILE).read_text())["metadata"] == {"total_chunks": 1}
+    assert cache.get("doc", embeddings)["chunks"][0].page_content == "kept"
+
+
+def test_unreadable_entry_is_dropped(tmp_path, embeddings, make_vector_store):
+    cache = IngestionCache(str(tmp_path))
+    cache.put("doc", make_vector_store(["text"]))
+    for path in (tmp_path / "doc").rglob("index.faiss"):
+        path.write_bytes(b"not an index")
+
+    assert cache.get("doc", embeddings) is None
+    assert "doc" not in cache
+
+
+def test_cache_hits_cite_the_current_upload(tmp_path, embeddings, make_vector_store):
+    from nodes.pdf_loader import PDFLoaderNode
+    from nodes.text_splitter import TextSplitterNode
+    from nodes.vector_store import VectorStoreNode
+    from utils.workflow_engine import NodeConnection, Workflow
+
+    workflow = Workflow()
+    vector_store_node = VectorStoreNode(VectorStoreNode.Config(), api_key="sk-test")
+    vector_store_node.embeddings = embeddings
+    workflow.add_node("loader", PDFLoaderNode())
+    workflow.add_node("splitter", TextSplitterNode(TextSplitterNode.Config()))
+    workflow.add_node("store", vector_store_node)
+    workflow.connect_nodes(NodeConnection(source_node="loader", source_output="documents",
+                                          target_node="splitter", target_input="documents"))
+    workflow.connect_nodes(NodeConnection(source_node="splitter", source_output="chunks",
+                                          target_node="store", target_input="documents"))
+    cache = IngestionCache(str(tmp_path))
+    content_hash = hash_bytes(b"%PDF same content")
+    cache.put(workflow.ingestion_key(content_hash),
+              make_vector_store(["alpha", "beta"], [{"source": "first.pdf", "page": 0}] * 2))
+
+    context = asyncio.run(workflow.run(
+        {"file_path": "/spool/3f2a.upload", "file_name": "second.pdf", "content_hash": content_hash},
+        ingestion_cache=cache
+    ))
+
+    assert context.cached_nodes == ["loader", "splitter", "store"]
+    assert [chunk.metadata for chunk in context.results["chunks"]] == [{"source": "second.pdf", "page": 0}] * 2
+    docstore = context.results["vector_store"].docstore
+    assert {doc.metadata["source"] for doc in docstore._dict.values()} == {"second.pdf"}
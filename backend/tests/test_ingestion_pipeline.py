@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from utils.ingestion_pipeline import PipelineStageError, buffered
+
+
+async def produce(items, produced, fail_at=None):
+    for i, item in enumerate(items):
+        if i == fail_at:
+            raise ValueError(f"bad item {i}")
+        produced.append(item)
+        yield item
+
+
+def test_items_arrive_in_order():
+    async def scenario():
+        return [item async for item in buffered(produce(range(10), []), 2, "pdf_loader")]
+
+    assert asyncio.run(scenario()) == list(range(10))
+
+
+def test_a_slow_consumer_stalls_the_producer():
+    async def scenario():
+        produced = []
+        stream = buffered(produce(range(100), produced), 3, "pdf_loader")
+        first = await stream.__anext__()
+        await asyncio.sleep(0.05)
+        ahead = len(produced)
+        await stream.aclose()
+        return first, ahead
+
+    first, ahead = asyncio.run(scenario())
+    # The queue holds maxsize items, plus one the producer is blocked putting
+    assert first == 0
+    assert ahead <= 1 + 3 + 1
+
+
+def test_errors_are_tagged_with_their_stage():
+    async def scenario():
+        received = []
+        splitter = buffered(
+            buffered(produce(range(10), [], fail_at=4), 2, "pdf_loader"), 2, "text_splitter"
+        )
+        with pytest.raises(PipelineStageError) as error:
+            async for item in splitter:
+                received.append(item)
+        return received, error.value
+
+    received, error = asyncio.run(scenario())
+    assert received == [0, 1, 2, 3]
+    # Errors from further upstream keep the stage they came from
+    assert error.stage == "pdf_loader"
+    assert isinstance(error.error, ValueError)
+    assert str(error) == "bad item 4"
+
+
+def test_closing_the_consumer_cancels_the_producer():
+    async def scenario():
+        cancelled = asyncio.Event()
+
+        async def endless():
+            try:
+                while True:
+                    yield "item"
+                    await asyncio.sleep(0)
+            finally:
+                cancelled.set()
+
+        stream = buffered(endless(), 1, "pdf_loader")
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return cancelled.is_set()
+
+    assert asyncio.run(scenario())
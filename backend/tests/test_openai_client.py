@@ -0,0 +1,64 @@
+import asyncio
+import gc
+
+import pytest
+
+pytest.importorskip("openai")
+
+from utils import openai_client
+
+
+@pytest.fixture(autouse=True)
+def no_shared_clients():
+    openai_client._async_clients.clear()
+    openai_client._sync_clients.clear()
+    yield
+    openai_client._async_clients.clear()
+    openai_client._sync_clients.clear()
+
+
+def test_one_async_client_per_loop_and_key():
+    async def clients():
+        return (
+            openai_client.get_async_client("key-a"),
+            openai_client.get_async_client("key-a"),
+            openai_client.get_async_client("key-b"),
+        )
+
+    first, again, other_key = asyncio.run(clients())
+    assert first is again
+    assert first is not other_key
+
+    second, _, _ = asyncio.run(clients())
+    # httpx pools are bound to the loop that opened them
+    assert second is not first
+
+
+def test_clients_of_closed_loops_are_dropped():
+    async def client():
+        return openai_client.get_async_client("key")
+
+    loops = [asyncio.new_event_loop() for _ in range(3)]
+    for loop in loops:
+        loop.run_until_complete(client())
+        loop.close()
+    # Each new client prunes the ones whose loop has closed
+    assert len(openai_client._async_clients["key"]) == 1
+
+    del loops, loop
+    gc.collect()
+    assert len(openai_client._async_clients["key"]) == 0
+
+
+def test_close_clients_closes_pools():
+    async def main():
+        client = openai_client.get_async_client("key")
+        sync_client = openai_client.get_sync_client("key")
+        assert openai_client.get_sync_client("key") is sync_client
+        await openai_client.close_clients()
+        return client, sync_client
+
+    client, sync_client = asyncio.run(main())
+    assert client._client.is_closed
+    assert sync_client._client.is_closed
+    assert not openai_client._async_clients and not openai_client._sync_clients
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pypdf")
+
+from nodes.pdf_loader import PDFLoaderNode, _page_ranges
+from utils.executors import shutdown_pools
+
+
+@pytest.fixture(autouse=True)
+def pools():
+    yield
+    shutdown_pools()
+
+
+@pytest.fixture
+def pdf_path(tmp_path, make_pdf):
+    path = tmp_path / "doc.upload"
+    path.write_bytes(make_pdf([f"Page{i}" for i in range(10)]))
+    return path
+
+
+def test_page_ranges_cover_every_page_once():
+    assert _page_ranges(0, 4) == []
+    assert _page_ranges(10, 4) == [(0, 3), (3, 6), (6, 9), (9, 10)]
+    assert _page_ranges(3, 8) == [(0, 1), (1, 2), (2, 3)]
+    assert _page_ranges(5, 1) == [(0, 5)]
+
+
+def test_parallel_extraction_keeps_page_order(pdf_path):
+    node = PDFLoaderNode(PDFLoaderNode.Config(max_workers=2, parallel_page_threshold=4))
+    result = asyncio.run(node.process(file_path=str(pdf_path)))
+
+    assert result["success"], result
+    # Four ranges per worker asked for; ten pages split two per range
+    assert result["metadata"]["page_ranges"] == 5
+    assert [doc.metadata["page"] for doc in result["documents"]] == list(range(10))
+    assert [doc.page_content.strip() for doc in result["documents"]] == [f"Page{i}" for i in range(10)]
+
+
+def test_parallel_and_single_worker_results_match(pdf_path):
+    single = PDFLoaderNode(PDFLoaderNode.Config(parallel_page_threshold=1000))
+    parallel = PDFLoaderNode(PDFLoaderNode.Config(max_workers=3, parallel_page_threshold=2))
+    one = asyncio.run(single.process(file_path=str(pdf_path)))
+    many = asyncio.run(parallel.process(file_path=str(pdf_path)))
+
+    assert one["metadata"]["page_ranges"] == 1
+    assert [(d.page_content, d.metadata) for d in one["documents"]] == \
+        [(d.page_content, d.metadata) for d in many["documents"]]
+
+
+def test_bytes_and_streamed_pages_match_the_file(pdf_path):
+    node = PDFLoaderNode(PDFLoaderNode.Config(max_workers=2, parallel_page_threshold=4))
+
+    async def streamed():
+        return [part async for part in node.stream_pages(file_path=str(pdf_path), file_name="doc.pdf")]
+
+    parts = asyncio.run(streamed())
+    from_bytes = asyncio.run(node.process(file_content=pdf_path.read_bytes(), file_name="doc.pdf"))
+
+    pages = [doc for part in parts for doc in part]
+    assert len(parts) > 1
+    assert [doc.metadata for doc in pages] == [{"source": "doc.pdf", "page": i} for i in range(10)]
+    assert [doc.page_content for doc in from_bytes["documents"]] == [doc.page_content for doc in pages]
+
+
+@pytest.mark.parametrize("config, calls", [
+    ({"parallel_page_threshold": 1000}, 1),
+    # Parsing is single-worker whatever the page count
+    ({"max_workers": 1, "parallel_page_threshold": 2}, 1),
+    # Counted first, then five ranges
+    ({"max_workers": 2, "parallel_page_threshold": 4}, 6),
+])
+def test_small_documents_are_opened_once(pdf_path, monkeypatch, config, calls):
+    from nodes import pdf_loader
+
+    submitted = []
+    real = pdf_loader.run_cpu_bound
+
+    async def counting(func, *args):
+        submitted.append(func.__name__)
+        return await real(func, *args)
+
+    monkeypatch.setattr(pdf_loader, "run_cpu_bound", counting)
+    node = PDFLoaderNode(PDFLoaderNode.Config(**config))
+
+    async def both():
+        loaded = await node.process(file_path=str(pdf_path))
+        streamed = [part async for part in node.stream_pages(file_path=str(pdf_path))]
+        return loaded, streamed
+
+    loaded, streamed = asyncio.run(both())
+
+    assert len(submitted) == 2 * calls
+    assert [doc.page_content for doc in loaded["documents"]] == \
+        [doc.page_content for part in streamed for doc in part]
+    assert len(loaded["documents"]) == 10
+
+
+def test_loader_settings_are_in_the_config_panel():
+    from components.config_panel import NodeConfigSchema
+
+    defaults = NodeConfigSchema.get_default_config("pdf_loader")
+    config = PDFLoaderNode.Config()
+    assert defaults == {"name": config.name, "max_workers": config.max_workers,
+                        "parallel_page_threshold": config.parallel_page_threshold}
+
+
+def test_missing_input_is_reported():
+    result = asyncio.run(PDFLoaderNode().process())
+    assert result == {"success": False, "error": "No PDF provided"}
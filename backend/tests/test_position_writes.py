@@ -0,0 +1,126 @@
+import asyncio
+
+from utils.position_writes import PositionWriteBuffer
+
+
+class Writer:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def __call__(self, rows):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.batches.append(sorted((row["node_id"], row["x"], row["y"]) for row in rows))
+
+
+def test_drags_coalesce_to_the_latest_position():
+    buffer = PositionWriteBuffer()
+    for x in range(10):
+        buffer.record("wf", "a", x, 0)
+    buffer.record("wf", "b", 1, 1)
+    buffer.record("other", "c", 2, 2)
+    writer = Writer()
+    asyncio.run(buffer.flush(writer))
+
+    assert writer.batches == [[("a", 9.0, 0.0), ("b", 1.0, 1.0), ("c", 2.0, 2.0)]]
+    stats = buffer.stats()
+    assert (stats["events"], stats["flushes"], stats["rows_written"], stats["pending"]) == (12, 1, 3, 0)
+
+
+def test_pending_positions_can_be_overlaid_and_discarded():
+    buffer = PositionWriteBuffer()
+    buffer.record("wf", "a", 1, 2)
+    buffer.record("wf", "b", 3, 4)
+    buffer.record("other", "a", 5, 6)
+
+    assert buffer.pending_for("wf") == {"a": (1.0, 2.0), "b": (3.0, 4.0)}
+    buffer.discard("wf", "a")
+    assert buffer.pending_for("wf") == {"b": (3.0, 4.0)}
+    buffer.discard("wf")
+    assert buffer.pending_for("wf") == {}
+    assert buffer.pending_for("other") == {"a": (5.0, 6.0)}
+
+
+def test_failed_flushes_are_retried_without_losing_newer_drags():
+    buffer = PositionWriteBuffer()
+    buffer.record("wf", "a", 1, 1)
+    asyncio.run(buffer.flush(Writer(fail=True)))
+    assert buffer.stats()["failures"] == 1
+    assert buffer.pending_for("wf") == {"a": (1.0, 1.0)}
+
+    # A drag made after the failed write wins over the requeued one
+    buffer.record("wf", "a", 2, 2)
+    writer = Writer()
+    asyncio.run(buffer.flush(writer))
+    assert writer.batches == [[("a", 2.0, 2.0)]]
+
+
+def test_background_loop_flushes_once_per_window():
+    async def scenario():
+        buffer = PositionWriteBuffer(flush_interval=0.2)
+        writer = Writer()
+        task = asyncio.create_task(buffer.run(writer))
+        for x in range(5):
+            buffer.record("wf", "a", x, 0)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.3)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return writer.batches
+
+    assert asyncio.run(scenario()) == [[("a", 4.0, 0.0)]]
+
+
+def test_failed_writes_back_off_and_give_up():
+    buffer = PositionWriteBuffer(flush_interval=1.0, max_attempts=3, max_backoff=3.0)
+    buffer.record("wf", "a", 1, 1)
+    failing = Writer(fail=True)
+
+    delays = []
+    for _ in range(2):
+        asyncio.run(buffer.flush(failing))
+        delays.append(buffer.retry_delay())
+    assert 0.9 < delays[0] <= 1.0 and 1.9 < delays[1] <= 2.0
+    assert buffer.pending_for("wf") == {"a": (1.0, 1.0)}
+
+    # A newer drag starts its own attempts; the stale one is not retried after it
+    buffer.record("wf", "b", 2, 2)
+    asyncio.run(buffer.flush(failing))
+    assert 2.9 < buffer.retry_delay() <= 3.0
+    assert buffer.pending_for("wf") == {"b": (2.0, 2.0)}
+    stats = buffer.stats()
+    assert (stats["failures"], stats["dropped"]) == (3, 1)
+
+    writer = Writer()
+    asyncio.run(buffer.flush(writer))
+    assert writer.batches == [[("b", 2.0, 2.0)]]
+    assert buffer.retry_delay() == 0.0
+
+
+def test_background_loop_waits_out_the_backoff():
+    class Flaky(Writer):
+        calls = 0
+
+        async def __call__(self, rows):
+            self.calls += 1
+            self.fail = self.calls == 1
+            await super().__call__(rows)
+
+    async def scenario():
+        buffer = PositionWriteBuffer(flush_interval=0.1, max_backoff=10.0)
+        buffer._consecutive_failures = 2
+        writer = Flaky()
+        task = asyncio.create_task(buffer.run(writer))
+        buffer.record("wf", "a", 1, 1)
+        # The write after the third failure in a row is due 0.1 * 2 ** 2 = 0.4s later
+        await asyncio.sleep(0.35)
+        calls_during_backoff = writer.calls
+        await asyncio.sleep(0.35)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return calls_during_backoff, writer
+
+    calls_during_backoff, writer = asyncio.run(scenario())
+    assert calls_during_backoff == 1
+    assert writer.batches == [[("a", 1.0, 1.0)]]
@@ -0,0 +1,97 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from utils.retrieval import ScoredRetriever, mmr_select, relevance_scores
+
+TEXTS = [
+    "apple banana cherry",
+    "apple banana cherry",
+    "apple banana grape",
+    "river mountain valley",
+    "ocean desert forest",
+]
+
+
+@pytest.fixture
+def vector_store(embeddings):
+    from langchain_community.vectorstores import FAISS
+
+    # Unit vectors, as OpenAI embeddings are, so L2 distances map onto cosine
+    return FAISS.from_texts(TEXTS, embeddings, normalize_L2=True)
+
+
+def cosine(a, b):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return float(a @ b / np.linalg.norm(a) / np.linalg.norm(b))
+
+
+def test_relevance_scores_are_cosine_similarities():
+    assert np.allclose(relevance_scores(np.array([0.0, 2.0, 0.5]), faiss.METRIC_L2), [1.0, 0.0, 0.75])
+    assert np.allclose(relevance_scores(np.array([0.3]), faiss.METRIC_INNER_PRODUCT), [0.3])
+
+
+def test_mmr_matches_the_naive_definition():
+    rng = np.random.default_rng(0)
+    candidates = rng.normal(size=(30, 8))
+    query = rng.normal(size=8)
+    picked = mmr_select(query, candidates, 6, lambda_mult=0.6)
+
+    unit = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    relevance = unit @ (query / np.linalg.norm(query))
+    expected = [int(np.argmax(relevance))]
+    while len(expected) < 6:
+        scores = {
+            i: 0.6 * relevance[i] - 0.4 * max(unit[i] @ unit[j] for j in expected)
+            for i in range(len(candidates)) if i not in expected
+        }
+        expected.append(max(scores, key=scores.get))
+    assert picked == expected
+
+
+def test_mmr_edge_cases():
+    candidates = np.eye(3)
+    assert mmr_select(np.ones(3), candidates, 0) == []
+    assert sorted(mmr_select(np.ones(3), candidates, 10)) == [0, 1, 2]
+    # Pure relevance keeps the similarity order
+    assert mmr_select(np.array([3.0, 2.0, 1.0]), candidates, 3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_similarity_search_returns_cosine_scores(vector_store, embeddings):
+    retriever = ScoredRetriever(vector_store, k=3)
+    results = retriever.scored_search("apple banana cherry")
+
+    assert [doc.page_content for doc, _ in results[:2]] == [TEXTS[0], TEXTS[1]]
+    query = embeddings.embed_query("apple banana cherry")
+    for doc, score in results:
+        assert score == pytest.approx(cosine(query, embeddings.embed_query(doc.page_content)), abs=1e-5)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_mmr_skips_duplicates(vector_store):
+    similarity = ScoredRetriever(vector_store, k=2).invoke("apple banana cherry")
+    diverse = ScoredRetriever(vector_store, search_type="mmr", k=2, fetch_k=5, lambda_mult=0.3).invoke("apple banana cherry")
+
+    assert [doc.page_content for doc in similarity] == [TEXTS[0], TEXTS[1]]
+    assert diverse[0].page_content == TEXTS[0]
+    assert diverse[1].page_content != TEXTS[1]
+
+
+def test_score_threshold_filters_weak_matches(vector_store, embeddings):
+    query = embeddings.embed_query("apple banana cherry")
+    threshold = 0.8
+    expected = {text for text in TEXTS if cosine(query, embeddings.embed_query(text)) >= threshold}
+    retriever = ScoredRetriever(vector_store, k=5, score_threshold=threshold)
+    results = asyncio.run(retriever.ascored_search("apple banana cherry"))
+
+    assert 0 < len(expected) < len(TEXTS)
+    assert {doc.page_content for doc, _ in results} == expected
+    assert ScoredRetriever(vector_store, score_threshold=1.1).invoke("apple") == []
+
+
+def test_unknown_search_types_are_rejected(vector_store):
+    with pytest.raises(ValueError):
+        ScoredRetriever(vector_store, search_type="similarity_score_threshold")
@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+import types
+import uuid
+
+import pytest
+
+pytest.importorskip("httpx")
+
+
+class FakeCompletions:
+    """Streams each question's scripted tokens; questions starting with "slow" wait for release."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.cancelled = threading.Event()
+
+    async def create(self, messages, stream=False, **kwargs):
+        import asyncio
+
+        prompt = messages[0]["content"]
+        question = prompt.rsplit("QUESTION: ", 1)[1].split("\n", 1)[0]
+        if question == "fail":
+            raise RuntimeError("model unavailable")
+
+        async def events():
+            try:
+                if question.startswith("slow"):
+                    while not self.release.is_set():
+                        await asyncio.sleep(0.01)
+                for token in ["Paris", " is", " the", " capital."]:
+                    yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=token))])
+            except BaseException:
+                self.cancelled.set()
+                raise
+
+        return events()
+
+
+@pytest.fixture
+def completions(app_module, monkeypatch):
+    from nodes import qa_chain
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    fake = FakeCompletions()
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=fake))
+    monkeypatch.setattr(qa_chain, "get_async_client", lambda api_key: client)
+    yield fake
+    fake.release.set()
+
+
+@pytest.fixture
+def client(app_module):
+    from fastapi.testclient import TestClient
+
+    # Not entered as a context manager: startup would start the database background tasks
+    return TestClient(app_module.app)
+
+
+@pytest.fixture
+def workflow_id(app_module, completions, make_vector_store):
+    from utils.workflow_engine import Workflow
+
+    workflow_id = str(uuid.uuid4())
+    workflow = Workflow()
+    workflow.add_node("qa", app_module.build_node_instance("qa_chain", {}))
+    app_module.active_workflows[workflow_id] = workflow
+    vector_store = make_vector_store(["Paris is the capital of France."], [{"page": 0}])
+    app_module.document_sessions.put("doc", workflow_id, vector_store, workflow.retriever_for(vector_store))
+    yield workflow_id
+    app_module.active_workflows.pop(workflow_id)
+    app_module.document_sessions.discard_workflow(workflow_id)
+
+
+def sse_events(body):
+    events = []
+    for frame in body.split("\n\n"):
+        if not frame:
+            continue
+        event, data = frame.split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_ask_stream_sends_tokens_then_the_answer(client, completions, workflow_id):
+    response = client.post("/ask/stream", json={"workflow_id": workflow_id, "document_id": "doc", "question": "capital?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.endswith("\n\n")
+    assert sse_events(response.text) == [
+        ("token", {"token": "Paris"}),
+        ("token", {"token": " is"}),
+        ("token", {"token": " the"}),
+        ("token", {"token": " capital."}),
+        ("answer", {"answer": "Paris is the capital."}),
+    ]
+
+
+def test_ask_stream_reports_failures_as_an_error_event(client, completions, workflow_id):
+    response = client.post("/ask/stream", json={"workflow_id": workflow_id, "document_id": "doc", "question": "fail"})
+
+    (event, data), = sse_events(response.text)
+    assert event == "error"
+    assert "model unavailable" in data["detail"]
+
+
+def test_execute_stream_removes_the_spooled_upload(app_module, client, completions, workflow_id):
+    response = client.post(
+        "/execute-workflow/stream",
+        data={"workflow_id": workflow_id, "question": "capital?"},
+        files={"file": ("doc.pdf", b"%PDF-1.4 not really", "application/pdf")}
+    )
+
+    # Without a loader the QA chain has no retriever; the failure still ends the stream
+    assert [event for event, _ in sse_events(response.text)] == ["error"]
+    assert list(app_module.upload_spool.root.glob("*.upload")) == []
+
+
+def receive_until(websocket, predicate):
+    messages = []
+    while True:
+        message = websocket.receive_json()
+        messages.append(message)
+        if predicate(message):
+            return messages
+
+
+def test_websocket_streams_tokens_answers_and_events(client, completions, workflow_id):
+    with client.websocket_connect(f"/ws/{workflow_id}") as websocket:
+        websocket.send_text(json.dumps({"type": "ask", "question": "capital?", "document_id": "doc", "id": 7}))
+        messages = receive_until(websocket, lambda m: m["type"] == "answer")
+        websocket.send_text("hello")
+        assert receive_until(websocket, lambda m: m["type"] == "update")[-1] == {"type": "update", "data": "Processing..."}
+
+    tokens = [m for m in messages if m["type"] == "token"]
+    assert [m["data"] for m in tokens] == ["Paris", " is", " the", " capital."]
+    assert all(m["id"] == 7 for m in tokens)
+    assert messages[-1] == {"type": "answer", "data": "Paris is the capital.", "id": 7}
+    events = [m["data"]["type"] for m in messages if m["type"] == "event"]
+    assert events[0] == "run_started" and "node_finished" in events
+
+
+def test_websocket_keeps_reading_while_an_answer_streams(client, completions, workflow_id):
+    with client.websocket_connect(f"/ws/{workflow_id}") as websocket:
+        websocket.send_text(json.dumps({"type": "ask", "question": "slow one", "document_id": "doc", "id": "slow"}))
+        websocket.send_text(json.dumps({"type": "ask", "question": "fast one", "document_id": "doc", "id": "fast"}))
+        first = receive_until(websocket, lambda m: m["type"] == "answer")
+        completions.release.set()
+        second = receive_until(websocket, lambda m: m["type"] == "answer")
+
+    assert first[-1]["id"] == "fast"
+    assert not any(m.get("id") == "slow" for m in first)
+    assert second[-1] == {"type": "answer", "data": "Paris is the capital.", "id": "slow"}
+
+
+def test_websocket_errors_and_disconnects(client, completions, workflow_id):
+    with client.websocket_connect(f"/ws/{workflow_id}") as websocket:
+        websocket.send_text(json.dumps({"type": "ask", "question": "capital?", "document_id": "missing"}))
+        error = receive_until(websocket, lambda m: m["type"] == "error")[-1]
+        assert error == {"type": "error", "data": "Document not found. Ingest it first."}
+        websocket.send_text(json.dumps({"type": "ask", "question": "slow", "document_id": "doc"}))
+        # Once the answer is streaming, leave without waiting for it
+        time.sleep(0.2)
+
+    # The answer in flight is cancelled rather than left running
+    assert completions.cancelled.wait(5)
+
+
+def test_uploads_over_the_limit_are_refused(app_module, client, monkeypatch, workflow_id):
+    monkeypatch.setattr(app_module.upload_spool, "max_bytes", 1024)
+    response = client.post(
+        "/ingest-document",
+        data={"workflow_id": workflow_id},
+        files={"file": ("big.pdf", b"x" * (2 * 1024 ** 2), "application/pdf")}
+    )
+
+    assert response.status_code == 413
+    assert list(app_module.upload_spool.root.glob("*.upload")) == []
+
+
+def test_upload_forms_need_their_fields(app_module, client):
+    response = client.post("/ingest-document", files={"file": ("doc.pdf", b"%PDF", "application/pdf")})
+
+    assert response.status_code == 422
+    assert "workflow_id" in response.json()["detail"]
+    assert list(app_module.upload_spool.root.glob("*.upload")) == []
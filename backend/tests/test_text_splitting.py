@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+pytest.importorskip("langchain_text_splitters")
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from benchmarks.bench_text_splitter import CONFIGS, make_corpus
+from utils.text_splitting import NativeTextSplitter
+
+
+@pytest.fixture(autouse=True)
+def quiet_reference(caplog):
+    # LangChain warns about every oversized chunk
+    caplog.set_level("ERROR")
+
+
+@pytest.mark.parametrize("kind", ["prose", "long-lines", "tables", "unbroken"])
+@pytest.mark.parametrize("chunk_size, chunk_overlap", CONFIGS)
+def test_chunks_match_recursive_character_splitter(kind, chunk_size, chunk_overlap):
+    docs = make_corpus(kind, 20, random.Random(f"{kind}-{chunk_size}-{chunk_overlap}"))
+    reference = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len)
+    native = NativeTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    expected = reference.split_documents(docs)
+    actual = native.split_documents(docs)
+    assert [(doc.page_content, doc.metadata) for doc in actual] == \
+        [(doc.page_content, doc.metadata) for doc in expected]
+
+
+@pytest.mark.parametrize("text", ["", "   ", "short", "a\n\n\n\nb", "x" * 25, "word " * 40])
+def test_edge_cases_match(text):
+    reference = RecursiveCharacterTextSplitter(chunk_size=10, chunk_overlap=3, length_function=len)
+    assert NativeTextSplitter(chunk_size=10, chunk_overlap=3).split_text(text) == reference.split_text(text)
+
+
+def test_chunks_get_their_own_metadata():
+    doc = Document(page_content="alpha beta gamma delta", metadata={"page": 1, "tags": ["a"]})
+    chunks = NativeTextSplitter(chunk_size=11, chunk_overlap=0).split_documents([doc])
+
+    assert [chunk.page_content for chunk in chunks] == ["alpha beta", "gamma", "delta"]
+    chunks[0].metadata["page"] = 9
+    chunks[0].metadata["tags"].append("b")
+    assert doc.metadata == {"page": 1, "tags": ["a"]}
+    assert chunks[2].metadata == {"page": 1, "tags": ["a"]}
+
+
+def test_overlap_larger_than_chunk_is_rejected():
+    with pytest.raises(ValueError):
+        NativeTextSplitter(chunk_size=10, chunk_overlap=11)
@@ -0,0 +1,117 @@
+import base64
+import random
+
+import pytest
+
+from utils import tokenizer as tokenizer_module
+from utils.tokenizer import CHARS_PER_TOKEN, Tokenizer, get_tokenizer, load_tokenizer
+
+
+def test_heuristic_counts_words_in_four_character_pieces():
+    tokenizer = Tokenizer()
+    assert tokenizer.count("") == 0
+    assert tokenizer.count("the cat") == 2
+    assert tokenizer.count("internationalization") == -(-len("internationalization") // CHARS_PER_TOKEN)
+    assert tokenizer.count_many(["a b c", "  "]) == [3, 1]
+
+
+def test_heuristic_offsets_mark_token_starts():
+    tokenizer = Tokenizer()
+    text = "hello world  \n"
+    offsets = tokenizer.offsets(text)
+
+    assert offsets == [0, 4, 5, 10, 11]
+    assert len(offsets) == tokenizer.count(text)
+    # Tokens tile the text: joining the spans between offsets gives it back
+    bounds = offsets + [len(text)]
+    assert "".join(text[a:b] for a, b in zip(bounds, bounds[1:])) == text
+
+
+def test_unknown_vocabularies_fall_back_to_the_heuristic(tmp_path):
+    assert load_tokenizer("heuristic").name == "heuristic"
+    fallback = load_tokenizer("no-such-encoding", vocab_dir=str(tmp_path))
+    assert fallback.name == "heuristic" and not fallback.exact
+
+
+def test_token_sized_chunks_stay_within_budget():
+    pytest.importorskip("langchain_core")
+    from utils.text_splitting import NativeTextSplitter
+
+    rng = random.Random(3)
+    words = ["alpha", "be", "consolidated", "x", "depreciation", "\n", "\n\n"]
+    text = " ".join(rng.choice(words) for _ in range(2000)) + " " + "z" * 300
+    tokenizer = Tokenizer()
+    chunks = NativeTextSplitter(chunk_size=50, chunk_overlap=10, tokenizer=tokenizer).split_text(text)
+
+    assert len(chunks) > 10
+    assert max(tokenizer.count(chunk) for chunk in chunks) <= 50
+    # The unbroken run is cut on token boundaries, not mid-token
+    assert "z" * 200 in "".join(chunks)
+    assert all(len(chunk) % CHARS_PER_TOKEN == 0 for chunk in chunks if set(chunk) == {"z"})
+
+
+def test_chunks_keep_recorded_token_counts():
+    pytest.importorskip("faiss")
+    from langchain_core.documents import Document
+    from nodes.vector_store import _token_counts
+    from utils.tokenizer import get_tokenizer
+
+    documents = [
+        Document(page_content="one two", metadata={"token_count": 7}),
+        Document(page_content="three four five"),
+    ]
+    assert _token_counts(documents) == [7, get_tokenizer().count("three four five")]
+
+
+@pytest.fixture
+def byte_vocabulary(tmp_path):
+    """A cl100k_base-named vocabulary of the 256 single bytes plus one merge."""
+    lines = [f"{base64.b64encode(bytes([i])).decode()} {i}" for i in range(256)]
+    lines.append(f"{base64.b64encode(b'ab').decode()} 256")
+    (tmp_path / "cl100k_base.tiktoken").write_text("\n".join(lines) + "\n")
+    return tmp_path
+
+
+@pytest.fixture
+def no_network(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("the tokenizer must not touch the network")
+
+    monkeypatch.setattr(tokenizer_module.urllib.request, "urlopen", refuse)
+
+
+def test_vocabulary_is_read_from_the_local_file(byte_vocabulary, no_network):
+    pytest.importorskip("tiktoken")
+    tokenizer = load_tokenizer("cl100k_base", vocab_dir=str(byte_vocabulary))
+
+    assert tokenizer.exact and tokenizer.name == "cl100k_base"
+    assert tokenizer.count("abc") == 2
+    assert tokenizer.offsets("abc") == [0, 2]
+
+
+def test_a_missing_vocabulary_is_retried_once_it_exists(tmp_path, byte_vocabulary, no_network, monkeypatch):
+    pytest.importorskip("tiktoken")
+    missing = tmp_path / "later"
+    monkeypatch.setenv("TOKENIZER_VOCAB_DIR", str(missing))
+    monkeypatch.setenv("TOKENIZER_ENCODING", "cl100k_base")
+    monkeypatch.setattr(tokenizer_module, "_shared_tokenizer", None)
+    monkeypatch.setattr(tokenizer_module, "RETRY_INTERVAL", 0.0)
+
+    assert not get_tokenizer().exact
+    missing.mkdir()
+    (missing / "cl100k_base.tiktoken").write_bytes((byte_vocabulary / "cl100k_base.tiktoken").read_bytes())
+    assert get_tokenizer().exact
+    assert get_tokenizer() is get_tokenizer()
+
+
+def test_character_splitters_never_load_a_vocabulary(monkeypatch):
+    pytest.importorskip("langchain_text_splitters")
+    from nodes import text_splitter
+
+    def fail():
+        raise AssertionError("vocabulary loaded while building the node")
+
+    monkeypatch.setattr(text_splitter, "get_tokenizer", fail)
+    node = text_splitter.TextSplitterNode(text_splitter.TextSplitterNode.Config(length_unit="characters"))
+    assert node.length_unit == "characters"
+    text_splitter.TextSplitterNode(text_splitter.TextSplitterNode.Config(length_unit="tokens"))
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip("aiofiles")
+
+from utils.uploads import InvalidUpload, UploadSpool, UploadTooLarge
+
+
+class FakeUpload:
+    """The part of starlette's UploadFile the spool reads."""
+
+    def __init__(self, content, filename="report.pdf"):
+        self.content = content
+        self.filename = filename
+        self.offset = 0
+        self.reads = []
+
+    async def read(self, size):
+        self.reads.append(size)
+        chunk = self.content[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        return chunk
+
+
+def spooled_files(spool):
+    return sorted(spool.root.glob("*.upload"))
+
+
+def test_uploads_are_hashed_while_streamed_in_chunks(tmp_path):
+    spool = UploadSpool(str(tmp_path), chunk_size=4)
+    content = b"0123456789"
+
+    async def scenario():
+        async with spool.open(FakeUpload(content)) as upload:
+            assert upload.path.read_bytes() == content
+            assert upload.size == len(content)
+            assert upload.content_hash == hashlib.sha256(content).hexdigest()
+            assert upload.filename == "report.pdf"
+            assert spooled_files(spool) == [upload.path]
+
+    asyncio.run(scenario())
+    assert spooled_files(spool) == []
+
+
+def test_oversized_uploads_are_rejected_and_removed(tmp_path):
+    spool = UploadSpool(str(tmp_path), max_bytes=8, chunk_size=4)
+    upload = FakeUpload(b"x" * 64)
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool.spool(upload))
+    # Reading stops at the first chunk past the limit
+    assert len(upload.reads) == 3
+    assert spooled_files(spool) == []
+
+
+def test_files_are_removed_when_the_block_fails(tmp_path):
+    spool = UploadSpool(str(tmp_path))
+
+    async def scenario():
+        async with spool.open(FakeUpload(b"data")):
+            raise RuntimeError("handler failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+    assert spooled_files(spool) == []
+
+
+def test_stale_spool_files_are_removed_at_startup(tmp_path):
+    stale, fresh = tmp_path / "old.upload", tmp_path / "new.upload"
+    stale.write_bytes(b"x")
+    fresh.write_bytes(b"x")
+    os.utime(stale, (0, 0))
+    UploadSpool(str(tmp_path))
+
+    assert sorted(tmp_path.iterdir()) == [fresh]
+
+
+BOUNDARY = "b0undary"
+FORM_HEADERS = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+def form_body(fields, file=None, close=True):
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    if file is not None:
+        filename, content = file
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode() + content + b"\r\n"
+        )
+    return b"".join(parts) + (f"--{BOUNDARY}--\r\n".encode() if close else b"")
+
+
+async def chunked(body, size=7, sent=None):
+    for start in range(0, len(body), size):
+        if sent is not None:
+            sent.append(start)
+        yield body[start:start + size]
+
+
+def test_forms_stream_their_file_into_the_spool(tmp_path):
+    spool = UploadSpool(str(tmp_path))
+    content = b"%PDF-1.4 " + bytes(range(256)) * 4
+    body = form_body({"workflow_id": "wf-1", "question": "Why?"}, ("report.pdf", content))
+
+    fields, upload = asyncio.run(spool.spool_form(FORM_HEADERS, chunked(body)))
+
+    assert fields == {"workflow_id": "wf-1", "question": "Why?"}
+    assert upload.filename == "report.pdf"
+    assert upload.path.read_bytes() == content
+    assert upload.size == len(content)
+    assert upload.content_hash == hashlib.sha256(content).hexdigest()
+    upload.cleanup()
+    assert spooled_files(spool) == []
+
+
+def test_forms_over_the_declared_length_are_refused_unread(tmp_path):
+    spool = UploadSpool(str(tmp_path), max_bytes=16)
+    sent = []
+    headers = {**FORM_HEADERS, "content-length": str(10 * 1024 ** 2)}
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool.spool_form(headers, chunked(form_body({}, ("a.pdf", b"x")), sent=sent)))
+    assert sent == []
+
+
+def test_oversized_form_files_stop_the_stream(tmp_path):
+    spool = UploadSpool(str(tmp_path), max_bytes=16)
+    sent = []
+    body = form_body({"workflow_id": "wf"}, ("a.pdf", b"x" * 4096))
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool.spool_form(FORM_HEADERS, chunked(body, size=64, sent=sent)))
+    assert len(sent) < len(body) // 64
+    assert spooled_files(spool) == []
+
+
+@pytest.mark.parametrize("headers, body", [
+    ({"content-type": "application/json"}, b"{}"),
+    (FORM_HEADERS, form_body({"workflow_id": "wf"})),
+    (FORM_HEADERS, form_body({"workflow_id": "wf"}, ("a.pdf", b"partial"), close=False)),
+    (FORM_HEADERS, form_body({"question": "x" * 70000}, ("a.pdf", b"data"))),
+])
+def test_malformed_forms_are_rejected_and_removed(tmp_path, headers, body):
+    spool = UploadSpool(str(tmp_path))
+
+    with pytest.raises(InvalidUpload):
+        asyncio.run(spool.spool_form(headers, chunked(body, size=1024)))
+    assert spooled_files(spool) == []
+
+
+def test_loaded_pages_cite_the_uploaded_name(tmp_path, make_pdf):
+    pytest.importorskip("pypdf")
+    from nodes.pdf_loader import PDFLoaderNode
+
+    path = tmp_path / "3f2a.upload"
+    path.write_bytes(make_pdf(["Hello", "World"]))
+    result = asyncio.run(PDFLoaderNode().process(file_path=str(path), file_name="report.pdf"))
+
+    assert result["success"], result
+    assert [doc.metadata["source"] for doc in result["documents"]] == ["report.pdf", "report.pdf"]
+    assert result["metadata"]["file_name"] == "report.pdf"
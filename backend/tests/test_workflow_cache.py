@@ -0,0 +1,123 @@
+import types
+
+import pytest
+
+from utils import workflow_cache
+from utils.workflow_cache import WorkflowCache, estimate_workflow_bytes
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(workflow_cache, "time", clock)
+    return clock
+
+
+def workflow(payload_bytes=0):
+    return types.SimpleNamespace(
+        nodes={"node": {"instance": object(), "data": {"text": "x" * payload_bytes}}},
+        last_run=None,
+        last_ingestion=None,
+    )
+
+
+def test_estimate_counts_shared_objects_once(make_vector_store):
+    vector_store = make_vector_store(["alpha beta", "gamma"])
+    run = types.SimpleNamespace(results={"vector_store": vector_store}, outputs={"node": {"text": "y" * 100}})
+    alone = estimate_workflow_bytes(types.SimpleNamespace(nodes={}, last_run=run, last_ingestion=None))
+    shared = estimate_workflow_bytes(types.SimpleNamespace(nodes={}, last_run=run, last_ingestion=run))
+
+    assert alone >= vector_store.index.ntotal * vector_store.index.d * 4 + 100
+    assert shared == alone
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = WorkflowCache(max_entries=2, idle_ttl=0)
+    cache["a"], cache["b"] = workflow(), workflow()
+    assert cache.get("a") is not None
+    cache["c"] = workflow()
+
+    assert list(cache) == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_are_evicted_by_size_but_never_the_new_one(clock):
+    cache = WorkflowCache(max_bytes=10_000, idle_ttl=0)
+    cache["small"] = workflow(100)
+    cache["big"] = workflow(20_000)
+
+    assert list(cache) == ["big"]
+
+
+def test_idle_entries_expire(clock):
+    cache = WorkflowCache(idle_ttl=60)
+    cache["old"] = workflow()
+    clock.now = 30
+    cache["recent"] = workflow()
+    clock.now = 70
+    cache.sweep()
+
+    assert list(cache) == ["recent"]
+    assert cache.stats()["expirations"] == 1
+
+
+def test_reads_remeasure_on_the_next_sweep(clock):
+    cache = WorkflowCache(idle_ttl=0)
+    entry = workflow(10)
+    cache["wf"] = entry
+    before = cache.stats()["bytes"]
+    cache["wf"].nodes["node"]["data"]["text"] = "x" * 5000
+    cache.sweep()
+
+    assert cache.stats()["bytes"] >= before + 4990
+
+
+def test_without_eviction_entries_stay_until_removed(clock):
+    cache = WorkflowCache(max_entries=1, idle_ttl=1, evict=False)
+    cache["a"], cache["b"] = workflow(), workflow()
+    clock.now = 100
+    cache.sweep()
+
+    assert list(cache) == ["a", "b"]
+    assert cache.pop("a") is not None
+    assert "a" not in cache and len(cache) == 1
+
+
+def test_inserts_measure_only_the_new_entry(clock, monkeypatch):
+    measured = []
+    real = workflow_cache.estimate_workflow_bytes
+    monkeypatch.setattr(workflow_cache, "estimate_workflow_bytes", lambda wf: measured.append(wf) or real(wf))
+    cache = WorkflowCache(idle_ttl=60)
+    entries = {name: workflow(100) for name in "abc"}
+    for name, entry in entries.items():
+        cache[name] = entry
+    # Reads and idle time only take effect in the periodic sweep
+    cache["a"].nodes["node"]["data"]["text"] = "x" * 5000
+    clock.now = 120
+    cache["d"] = workflow()
+
+    assert measured == [entries["a"], entries["b"], entries["c"], cache.get("d")]
+    assert list(cache) == ["b", "c", "a", "d"]
+    cache.sweep(keep="d")
+    assert list(cache) == ["d"]
+
+
+def test_byte_total_follows_replacements_and_removals(clock):
+    cache = WorkflowCache(idle_ttl=0)
+    cache["a"], cache["b"] = workflow(1000), workflow(2000)
+    sizes = {name: estimate_workflow_bytes(cache.get(name)) for name in "ab"}
+    assert cache.stats()["bytes"] == sizes["a"] + sizes["b"]
+
+    cache["a"] = workflow(10)
+    del cache["b"]
+    assert cache.stats()["bytes"] == estimate_workflow_bytes(cache.get("a"))
+    cache.pop("a")
+    assert cache.stats()["bytes"] == 0
@@ -0,0 +1,312 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from utils.workflow_engine import NodeConnection, Workflow
+
+
+class FakeNode:
+    """Records when it ran; roots take the run's file input like a PDF loader does."""
+
+    def __init__(self, name, inputs=(), outputs=(), delay=0.05, fail=False, root=False):
+        self.type = "pdf_loader" if root else "fake"
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+
+    async def process(self, **kwargs):
+        started = time.perf_counter()
+        await asyncio.sleep(self.delay)
+        self.calls.append((started, time.perf_counter(), kwargs))
+        if self.fail:
+            return {"success": False, "error": f"{self.name} failed"}
+        return {"success": True, **{output: f"{self.name}:{output}" for output in self.outputs}}
+
+
+def build(nodes, edges, max_concurrency=4):
+    workflow = Workflow()
+    workflow.max_concurrency = max_concurrency
+    for node_id, node in nodes.items():
+        workflow.add_node(node_id, node)
+    for source, output, target, target_input in edges:
+        workflow.connect_nodes(NodeConnection(
+            source_node=source, source_output=output, target_node=target, target_input=target_input
+        ))
+    return workflow
+
+
+def diamond(delay=0.05):
+    nodes = {
+        "root": FakeNode("root", outputs=["documents"], delay=delay, root=True),
+        "left": FakeNode("left", inputs=["documents"], outputs=["left"], delay=delay),
+        "right": FakeNode("right", inputs=["documents"], outputs=["right"], delay=delay),
+        "join": FakeNode("join", inputs=["left", "right"], outputs=["answer"], delay=delay),
+    }
+    edges = [
+        ("root", "documents", "left", "documents"),
+        ("root", "documents", "right", "documents"),
+        ("left", "left", "join", "left"),
+        ("right", "right", "join", "right"),
+    ]
+    return nodes, edges
+
+
+def run(workflow, **kwargs):
+    return asyncio.run(workflow.run({"file_path": "upload.pdf"}, **kwargs))
+
+
+def test_independent_branches_run_concurrently():
+    nodes, edges = diamond()
+    context = run(build(nodes, edges))
+
+    (left_start, left_end, _), = nodes["left"].calls
+    (right_start, right_end, _), = nodes["right"].calls
+    (join_start, _, join_kwargs), = nodes["join"].calls
+    assert left_start < right_end and right_start < left_end
+    assert join_start >= max(left_end, right_end)
+    assert join_kwargs == {"left": "left:left", "right": "right:right"}
+    assert context.results["answer"] == "join:answer"
+    assert not context.failed_nodes()
+
+
+def test_max_concurrency_one_runs_nodes_one_at_a_time():
+    nodes, edges = diamond()
+    run(build(nodes, edges, max_concurrency=1))
+
+    spans = sorted((call[0], call[1]) for node in nodes.values() for call in node.calls)
+    assert all(previous[1] <= following[0] for previous, following in zip(spans, spans[1:]))
+
+
+def test_execution_order_is_topological():
+    nodes, edges = diamond()
+    nodes = {node_id: nodes[node_id] for node_id in ("join", "right", "left", "root")}
+    order = build(nodes, edges).calculate_execution_order()
+
+    assert order[0] == "root" and order[-1] == "join"
+    assert set(order[1:3]) == {"left", "right"}
+
+
+def test_failed_node_is_reported_and_independent_nodes_still_run():
+    nodes, edges = diamond()
+    nodes["left"].fail = True
+    context = run(build(nodes, edges))
+
+    assert context.failed_nodes()[0] == "left"
+    assert "left: left failed" in context.errors()
+    assert len(nodes["right"].calls) == 1
+    assert context.statuses["right"] == "success"
+
+
+def test_cycles_are_rejected():
+    nodes, edges = diamond()
+    edges.append(("join", "answer", "root", "documents"))
+    workflow = build(nodes, edges)
+
+    assert workflow.creates_cycle("join", "root")
+    with pytest.raises(ValueError, match="cycle"):
+        workflow.compile()
+
+
+def test_runs_report_node_progress_events():
+    nodes, edges = diamond(delay=0.01)
+    nodes["right"].fail = True
+    events = []
+    context = run(build(nodes, edges), on_event=events.append)
+
+    types = [event["type"] for event in events]
+    assert types[0] == "run_started" and types[-1] == "run_finished"
+    assert events[0]["run_id"] == events[-1]["run_id"] == context.run_id
+    finished = {event["node_id"]: event for event in events if event["type"] == "node_finished"}
+    assert finished["left"]["status"] == "success"
+    assert finished["right"]["status"] == "error"
+    assert finished["right"]["error"] == "right failed"
+    for node_id, event in finished.items():
+        started = next(i for i, e in enumerate(events) if e["type"] == "node_started" and e["node_id"] == node_id)
+        assert started < events.index(event)
+    assert events[-1]["success"] is False
+
+
+def test_failing_event_subscribers_do_not_fail_the_run():
+    def broken(event):
+        raise RuntimeError("subscriber gone")
+
+    nodes, edges = diamond(delay=0.01)
+    context = run(build(nodes, edges), on_event=broken)
+    assert context.results["answer"] == "join:answer"
+
+
+class EchoNode(FakeNode):
+    """Passes its file input (or its documents input) through, tagged with its own name."""
+
+    async def process(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        value = kwargs.get("file_path", kwargs.get("documents"))
+        return {"success": True, **{output: f"{self.name}({value})" for output in self.outputs}}
+
+
+def test_concurrent_runs_keep_separate_results():
+    nodes = {
+        "root": EchoNode("root", outputs=["documents"], delay=0.02, root=True),
+        "leaf": EchoNode("leaf", inputs=["documents"], outputs=["answer"], delay=0.02),
+    }
+    workflow = build(nodes, [("root", "documents", "leaf", "documents")])
+    before = {node_id: dict(vars(node)) for node_id, node in nodes.items()}
+
+    async def both():
+        return await asyncio.gather(
+            workflow.run({"file_path": "a.pdf"}),
+            workflow.run({"file_path": "b.pdf"})
+        )
+
+    first, second = asyncio.run(both())
+    assert first.run_id != second.run_id
+    assert first.results["answer"] == "leaf(root(a.pdf))"
+    assert second.results["answer"] == "leaf(root(b.pdf))"
+    assert first.outputs["leaf"] is not second.outputs["leaf"]
+    # Runs keep their state in the RunContext, never on the shared nodes
+    assert {node_id: dict(vars(node)) for node_id, node in nodes.items()} == before
+    assert workflow.last_run in (first, second)
+    assert workflow.nodes["leaf"]["data"] is workflow.last_run.outputs["leaf"]
+
+
+def test_compiled_plan_is_reused_until_the_graph_changes():
+    nodes, edges = diamond()
+    workflow = build(nodes, edges)
+    compiled = workflow.compile()
+    assert workflow.compile() is compiled
+
+    workflow.add_node("extra", FakeNode("extra"))
+    after_add = workflow.compile()
+    assert after_add is not compiled and "extra" in after_add.execution_order
+
+    workflow.connect_nodes(NodeConnection(
+        source_node="join", source_output="answer", target_node="extra", target_input="answer"
+    ))
+    after_connect = workflow.compile()
+    assert after_connect is not after_add
+    assert after_connect.execution_order[-1] == "extra"
+
+    workflow.update_node_config("extra", {"name": "renamed"})
+    after_update = workflow.compile()
+    assert after_update is not after_connect
+
+    workflow.max_concurrency = 1
+    assert workflow.compile() is not after_update
+
+    workflow.remove_node("extra")
+    assert "extra" not in workflow.compile().execution_order
+    assert "extra" not in workflow.execution_order
+
+
+def test_compiled_plan_indexes_wiring():
+    nodes, edges = diamond()
+    compiled = build(nodes, edges).compile()
+
+    assert compiled.dependencies["root"] == frozenset()
+    assert compiled.dependencies["join"] == {"left", "right"}
+    assert set(compiled.dependents["root"]) == {"left", "right"}
+    assert compiled.dependents["join"] == ()
+    assert [conn.target_input for conn in compiled.inbound["join"]] == ["left", "right"]
+    assert [conn.target_node for conn in compiled.outbound["root"]] == ["left", "right"]
+    assert compiled.position["root"] == 0
+    with pytest.raises(TypeError):
+        compiled.nodes["other"] = FakeNode("other")
+
+
+def test_unwired_nodes_wait_for_producers_of_their_fallback_inputs():
+    loader = FakeNode("loader", outputs=["documents"], root=True)
+    splitter = FakeNode("splitter", inputs=["documents"], outputs=["chunks"])
+    splitter.type = "text_splitter"
+    compiled = build({"loader": loader, "splitter": splitter}, []).compile()
+
+    assert compiled.dependencies["splitter"] == {"loader"}
+    assert compiled.execution_order == ("loader", "splitter")
+
+
+class FailingVectorStore:
+    """Consumes the first chunk batch of a streamed ingestion, then fails or hangs."""
+
+    def __init__(self, hang=False):
+        self.type = "vector_store"
+        self.name = "Vector Store"
+        self.inputs = ["documents"]
+        self.outputs = ["vector_store", "retriever"]
+        self.hang = hang
+        self.consumed = asyncio.Event()
+
+    async def process_stream(self, chunks, on_progress=None, ingestion_key=None):
+        await chunks.__anext__()
+        self.consumed.set()
+        if self.hang:
+            await asyncio.Event().wait()
+        raise RuntimeError("embedding quota exceeded")
+
+
+def streaming_ingestion(pdf_path, vector_store):
+    pytest.importorskip("pypdf")
+    from nodes.pdf_loader import PDFLoaderNode
+    from nodes.text_splitter import TextSplitterNode
+
+    workflow = build({
+        "loader": PDFLoaderNode(PDFLoaderNode.Config(max_workers=2, parallel_page_threshold=2)),
+        "splitter": TextSplitterNode(TextSplitterNode.Config()),
+        "store": vector_store,
+    }, [
+        ("loader", "documents", "splitter", "documents"),
+        ("splitter", "chunks", "store", "documents"),
+    ])
+    workflow.streaming_ingestion = True
+    workflow.stream_queue_size = 1
+    return workflow
+
+
+def test_failed_streaming_stage_settles_every_stage(tmp_path, make_pdf):
+    from utils.executors import shutdown_pools
+
+    path = tmp_path / "doc.upload"
+    path.write_bytes(make_pdf([f"Page{i}" for i in range(64)]))
+    workflow = streaming_ingestion(path, FailingVectorStore())
+    events = []
+
+    try:
+        context = asyncio.run(workflow.run({"file_path": str(path)}, on_event=events.append))
+    finally:
+        shutdown_pools()
+
+    assert context.streaming
+    assert context.statuses == {"loader": "cancelled", "splitter": "cancelled", "store": "error"}
+    assert context.errors() == ["Vector Store: embedding quota exceeded"]
+    assert context.outputs["loader"]["error"] == "Stopped: Vector Store failed"
+    finished = {e["node_id"]: e["status"] for e in events if e["type"] == "node_finished"}
+    assert finished == context.statuses
+
+
+def test_cancelled_streaming_run_settles_every_stage(tmp_path, make_pdf):
+    from utils.executors import shutdown_pools
+
+    path = tmp_path / "doc.upload"
+    path.write_bytes(make_pdf([f"Page{i}" for i in range(64)]))
+    store = FailingVectorStore(hang=True)
+    workflow = streaming_ingestion(path, store)
+    events = []
+
+    async def scenario():
+        task = asyncio.create_task(workflow.run({"file_path": str(path)}, on_event=events.append))
+        await store.consumed.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        shutdown_pools()
+
+    finished = {e["node_id"]: e["status"] for e in events if e["type"] == "node_finished"}
+    assert finished == {"loader": "cancelled", "splitter": "cancelled", "store": "cancelled"}
@@ -0,0 +1,161 @@
+"""
+BM25 - Lexical inverted index with array-backed postings, kept alongside a FAISS index
+"""
+import json
+import math
+import pathlib
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+VOCABULARY_FILE = "bm25_terms.json"
+ARRAY_FILES = ("indptr", "doc_ids", "term_freqs", "doc_lengths")
+# Attribute the index rides on, so it travels with its vector store through caches and saves
+LEXICAL_ATTR = "lexical_index"
+
+# Words, plus compounds such as 4.2.1, AB-1234 or 10/2023 kept whole
+_TERM = re.compile(r"\w+(?:[./-]\w+)*")
+_PART = re.compile(r"[./-]")
+
+_build_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; a compound also yields its parts so either form matches."""
+    terms: List[str] = []
+    for match in _TERM.finditer(text.lower()):
+        term = match.group()
+        terms.append(term)
+        if _PART.search(term):
+            terms.extend(part for part in _PART.split(term) if part)
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 over documents numbered 0..n-1 (the positions of their vectors in FAISS).
+
+    Postings are stored CSR-style: the documents containing term t are
+    doc_ids[indptr[t]:indptr[t + 1]], with their counts in term_freqs. The arrays
+    are what gets saved, and they are memory-mapped back when loaded.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        average = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # Per-document part of the BM25 denominator, computed once instead of per query term
+        self._norms = (k1 * (1.0 - b + b * doc_lengths / max(average, 1e-9))).astype(np.float32)
+
+    @property
+    def size(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.indptr, self.doc_ids, self.term_freqs, self.doc_lengths, self._norms)
+        return sum(array.nbytes for array in arrays) + sum(len(term) + 64 for term in self.vocabulary)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        doc_lengths: List[int] = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_freqs.append(count)
+        terms = np.asarray(term_ids, dtype=np.int32)
+        # Stable, so each term's documents stay in ascending order
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocabulary)), out=indptr[1:])
+        return cls(
+            vocabulary,
+            indptr,
+            np.asarray(doc_ids, dtype=np.int32)[order],
+            np.minimum(np.asarray(term_freqs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)[order],
+            np.asarray(doc_lengths, dtype=np.float32)
+        )
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions and scores of the k best matching documents, best first."""
+        term_ids = {self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary}
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        n = self.size
+        scores = np.zeros(n, dtype=np.float32)
+        for term_id in term_ids:
+            start, stop = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+            docs = self.doc_ids[start:stop]
+            freqs = self.term_freqs[start:stop].astype(np.float32)
+            df = stop - start
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            # A term occurs once per document in its postings, so plain fancy-index adds are safe
+            scores[docs] += idf * freqs * (self.k1 + 1.0) / (freqs + self._norms[docs])
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return ranked, scores[ranked]
+
+    def save(self, folder: str):
+        path = pathlib.Path(folder)
+        terms = sorted(self.vocabulary, key=self.vocabulary.__getitem__)
+        with open(path / VOCABULARY_FILE, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "terms": terms}, f)
+        for name in ARRAY_FILES:
+            np.save(path / f"bm25_{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, folder: str, mmap: bool = True) -> Optional["BM25Index"]:
+        """The index saved in folder, or None if it has none."""
+        path = pathlib.Path(folder)
+        if not (path / VOCABULARY_FILE).exists():
+            return None
+        with open(path / VOCABULARY_FILE, encoding="utf-8") as f:
+            saved = json.load(f)
+        arrays = [np.load(path / f"bm25_{name}.npy", mmap_mode="r" if mmap else None) for name in ARRAY_FILES]
+        vocabulary = {term: term_id for term_id, term in enumerate(saved["terms"])}
+        return cls(vocabulary, *arrays, k1=saved["k1"], b=saved["b"])
+
+
+def build_for_vector_store(vector_store: Any) -> BM25Index:
+    """Index the docstore texts in the order of their FAISS positions."""
+    docstore, ids = vector_store.docstore, vector_store.index_to_docstore_id
+    texts = []
+    for position in range(vector_store.index.ntotal):
+        doc = docstore.search(ids[position]) if position in ids else None
+        texts.append(getattr(doc, "page_content", "") or "")
+    return BM25Index.build(texts)
+
+
+def lexical_index(vector_store: Any) -> BM25Index:
+    """The index attached to vector_store, built from its docstore first if it has none.
+
+    Indexes saved before lexical search existed, or whose document count no longer
+    matches, are rebuilt on first use rather than trusted.
+    """
+    index = getattr(vector_store, LEXICAL_ATTR, None)
+    if index is not None and index.size == vector_store.index.ntotal:
+        return index
+    with _build_lock:
+        index = getattr(vector_store, LEXICAL_ATTR, None)
+        if index is None or index.size != vector_store.index.ntotal:
+            index = build_for_vector_store(vector_store)
+            setattr(vector_store, LEXICAL_ATTR, index)
+        return index
@@ -0,0 +1,137 @@
+"""
+Context Builder - Packs retrieved chunks into a prompt context within a token budget
+"""
+import re
+from typing import Any, Dict, Hashable, List, Optional
+
+from utils.tokenizer import Tokenizer, get_tokenizer
+
+SEPARATOR = "\n\n"
+# Shared runs shorter than this are too likely to be coincidence to splice chunks on
+MIN_OVERLAP_CHARS = 20
+# A trimmed chunk shorter than this adds noise rather than evidence
+MIN_PARTIAL_TOKENS = 24
+
+# End of a sentence (with any closing quote or bracket) or of a paragraph
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s)|(?=\n[^\S\n]*\n)")
+
+
+class PackedContext:
+    """Context text plus the retrieved documents that went into it, in relevance order."""
+
+    def __init__(self, text: str, documents: List[Any], tokens: int, dropped: int, truncated: bool):
+        self.text = text
+        self.documents = documents
+        self.tokens = tokens
+        self.dropped = dropped
+        self.truncated = truncated
+
+
+def _page_key(doc: Any, rank: int) -> Hashable:
+    metadata = getattr(doc, "metadata", None) or {}
+    if "page" in metadata:
+        return (metadata.get("source"), metadata["page"])
+    # Without a page, a chunk has no neighbours to merge with
+    return ("rank", rank)
+
+
+def splice(head: str, tail: str) -> Optional[str]:
+    """head and tail written as one text when tail continues head, else None.
+
+    Consecutive chunks of a page share their overlap; finding where tail's
+    opening reappears in head means the shared text is paid for once.
+    """
+    if tail in head:
+        return head
+    probe = tail[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    index = head.rfind(probe)
+    while index != -1:
+        if tail.startswith(head[index:]):
+            return head[:index] + tail
+        index = head.rfind(probe, 0, index + len(probe) - 1)
+    return None
+
+
+def _add_segment(segments: List[str], text: str) -> List[str]:
+    """Segments of one page with text added, spliced into any segment it overlaps."""
+    segments = list(segments)
+    while True:
+        for i, segment in enumerate(segments):
+            merged = splice(segment, text) or splice(text, segment)
+            if merged is not None:
+                # The merged text may now bridge to another segment
+                del segments[i]
+                text = merged
+                break
+        else:
+            segments.append(text)
+            return segments
+
+
+def trim_to_tokens(text: str, max_tokens: int, tokenizer: Tokenizer) -> str:
+    """Whole sentences from the start of text that fit in max_tokens; '' if not even one does."""
+    while max_tokens > 0:
+        starts = tokenizer.offsets(text)
+        if len(starts) <= max_tokens:
+            return text
+        cut = starts[max_tokens]
+        end = 0
+        for match in _SENTENCE_END.finditer(text, 0, cut):
+            end = match.end()
+        trimmed = text[:end].rstrip()
+        # Re-encoding the prefix can merge differently at the cut; shrink until it fits
+        excess = tokenizer.count(trimmed) - max_tokens
+        if excess <= 0:
+            return trimmed
+        max_tokens -= excess
+    return ""
+
+
+def pack_context(documents: List[Any], max_tokens: int, tokenizer: Optional[Tokenizer] = None) -> PackedContext:
+    """
+    Fill up to max_tokens with documents, most relevant first.
+
+    Chunks from the same page are kept together, overlapping ones spliced into
+    one passage, and each page is placed where its most relevant chunk ranked.
+    A chunk that does not fit whole is cut at a sentence boundary once; later
+    chunks are still added if they fit.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    separator_tokens = tokenizer.count(SEPARATOR)
+    pages: Dict[Hashable, List[str]] = {}
+    page_tokens: Dict[Hashable, int] = {}
+    used: List[Any] = []
+    total = 0
+    dropped = 0
+    truncated = False
+    for rank, doc in enumerate(documents):
+        text = getattr(doc, "page_content", str(doc)).strip()
+        if not text:
+            continue
+        key = _page_key(doc, rank)
+        joining = 0 if key in pages or not pages else separator_tokens
+        segments = _add_segment(pages.get(key, []), text)
+        tokens = tokenizer.count(SEPARATOR.join(segments))
+        cost = tokens - page_tokens.get(key, 0) + joining
+        if total + cost > max_tokens:
+            remaining = max_tokens - total - joining
+            # Cutting into a passage already placed would drop text that fitted; only new pages are trimmed
+            if truncated or key in pages or remaining < MIN_PARTIAL_TOKENS:
+                dropped += 1
+                continue
+            text = trim_to_tokens(text, remaining, tokenizer)
+            if not text:
+                dropped += 1
+                continue
+            truncated = True
+            segments = [text]
+            tokens = tokenizer.count(text)
+            cost = tokens + joining
+        pages[key] = segments
+        page_tokens[key] = tokens
+        total += cost
+        used.append(doc)
+    text = SEPARATOR.join(SEPARATOR.join(segments) for segments in pages.values())
+    return PackedContext(text, used, total, dropped, truncated)
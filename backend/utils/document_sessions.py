@@ -0,0 +1,78 @@
+"""
+Document Sessions - Handles to already-ingested documents for follow-up questions
+"""
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+
+class DocumentSession(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    document_id: str
+    workflow_id: str
+    vector_store: Any
+    retriever: Any
+    metadata: Dict[str, Any] = {}
+    created_at: float
+    last_used: float
+
+
+class DocumentSessionStore:
+    """In-memory LRU of ingested documents with an idle timeout, scoped per workflow."""
+
+    def __init__(self, max_sessions: int = 32, idle_ttl: float = 3600.0):
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_ttl = float(idle_ttl)
+        # Keyed by (workflow_id, document_id): a handle only opens documents its own workflow ingested
+        self._sessions: Dict[Tuple[str, str], DocumentSession] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "DocumentSessionStore":
+        return cls(
+            max_sessions=int(os.getenv("DOCUMENT_SESSION_MAX", 32)),
+            idle_ttl=float(os.getenv("DOCUMENT_SESSION_TTL", 3600)),
+        )
+
+    def put(self, document_id: str, workflow_id: str, vector_store: Any, retriever: Any,
+            metadata: Optional[Dict[str, Any]] = None) -> DocumentSession:
+        now = time.time()
+        session = DocumentSession(
+            document_id=document_id,
+            workflow_id=workflow_id,
+            vector_store=vector_store,
+            retriever=retriever,
+            metadata=metadata or {},
+            created_at=now,
+            last_used=now,
+        )
+        with self._lock:
+            self._sessions[(workflow_id, document_id)] = session
+            self._expire_locked(now)
+        return session
+
+    def get(self, workflow_id: str, document_id: str) -> Optional[DocumentSession]:
+        now = time.time()
+        with self._lock:
+            self._expire_locked(now)
+            session = self._sessions.get((workflow_id, document_id))
+            if session is not None:
+                session.last_used = now
+            return session
+
+    def discard_workflow(self, workflow_id: str):
+        with self._lock:
+            for key in [k for k in self._sessions if k[0] == workflow_id]:
+                del self._sessions[key]
+
+    def _expire_locked(self, now: float):
+        for key in [k for k, s in self._sessions.items() if now - s.last_used > self.idle_ttl]:
+            del self._sessions[key]
+        if len(self._sessions) > self.max_sessions:
+            by_age = sorted(self._sessions.items(), key=lambda item: item[1].last_used)
+            for key, _ in by_age[:len(self._sessions) - self.max_sessions]:
+                del self._sessions[key]
@@ -0,0 +1,192 @@
+"""
+Embedding Cache - Per-chunk vectors keyed by (model, sha256(text)) in SQLite
+"""
+import hashlib
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = pathlib.Path(__file__).resolve().parent.parent / ".cache" / "embeddings.sqlite3"
+# SQLite caps bound parameters per statement; stay well under it
+_QUERY_CHUNK = 500
+
+_lock = threading.Lock()
+_shared_cache: Optional["EmbeddingCache"] = None
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Embedding vectors stored as float32 blobs, read through SQLite's mmap I/O.
+
+    Bounded by row count and total vector bytes; the least recently used rows go first.
+    """
+
+    def __init__(self, path: Optional[str] = None, mmap_bytes: int = 256 * 1024 ** 2,
+                 max_rows: int = 250_000, max_bytes: int = 1024 ** 3):
+        self.path = pathlib.Path(path) if path else DEFAULT_CACHE_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.mmap_bytes = int(mmap_bytes)
+        self.max_rows = max(1, int(max_rows))
+        self.max_bytes = max(1, int(max_bytes))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (model, text_hash)"
+            ") WITHOUT ROWID"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+        if "last_access" not in columns:
+            # Caches written before eviction existed; their rows count as oldest
+            conn.execute("ALTER TABLE embeddings ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        conn.commit()
+        # Running totals, so puts need not scan the table; other processes sharing the
+        # file are only seen when the totals are reloaded after an eviction
+        self._size_lock = threading.Lock()
+        self.rows, self.bytes = self._totals(conn)
+        with self._size_lock:
+            self._evict_locked(conn)
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        return cls(
+            path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+            mmap_bytes=int(os.getenv("EMBEDDING_CACHE_MMAP_BYTES", 256 * 1024 ** 2)),
+            max_rows=int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", 250_000)),
+            max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 1024 ** 3)),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """Return {index: vector} for every text already embedded with this model."""
+        hashes = [text_hash(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        conn = self._connection()
+        unique = list(dict.fromkeys(hashes))
+        now = time.time()
+        with conn:
+            for start in range(0, len(unique), _QUERY_CHUNK):
+                batch = unique[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                )
+                hit = []
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    hit.append(h)
+                if hit:
+                    conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash IN ({','.join('?' * len(hit))})",
+                        [now, model, *hit],
+                    )
+        result = {i: found[h] for i, h in enumerate(hashes) if h in found}
+        with self._stats_lock:
+            self.hits += len(result)
+            self.misses += len(texts) - len(result)
+        return result
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((model, text_hash(text), int(array.shape[0]), array.tobytes(), now))
+        if not rows:
+            return
+        conn = self._connection()
+        added_rows = added_bytes = 0
+        with self._size_lock:
+            with conn:
+                for row in rows:
+                    # A (model, text) pair always embeds to the same vector; keep the stored one
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO embeddings (model, text_hash, dim, vector, last_access)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        row,
+                    )
+                    if cursor.rowcount > 0:
+                        added_rows += 1
+                        added_bytes += len(row[3])
+            self.rows += added_rows
+            self.bytes += added_bytes
+            self._evict_locked(conn)
+
+    def _totals(self, conn: sqlite3.Connection):
+        rows, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(length(vector)), 0) FROM embeddings").fetchone()
+        return int(rows), int(size)
+
+    def _evict_locked(self, conn: sqlite3.Connection):
+        if self.rows <= self.max_rows and self.bytes <= self.max_bytes:
+            return
+        rows, size = self.rows, self.bytes
+        doomed = []
+        oldest = conn.execute("SELECT model, text_hash, length(vector) FROM embeddings ORDER BY last_access")
+        for model, h, length in oldest:
+            if rows <= self.max_rows and size <= self.max_bytes:
+                break
+            doomed.append((model, h))
+            rows -= 1
+            size -= length
+        oldest.close()
+        with conn:
+            conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", doomed)
+        self.rows, self.bytes = self._totals(conn)
+        with self._stats_lock:
+            self.evictions += len(doomed)
+
+    def stats(self) -> Dict[str, int]:
+        with self._size_lock, self._stats_lock:
+            return {
+                "rows": self.rows,
+                "bytes": self.bytes,
+                "max_rows": self.max_rows,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide cache, or None when EMBEDDING_CACHE_ENABLED is off."""
+    global _shared_cache
+    if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    with _lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = EmbeddingCache.from_env()
+            except Exception as e:
+                print(f"Warning: Embedding cache disabled: {e}")
+                return None
+        return _shared_cache
@@ -0,0 +1,170 @@
+"""
+Embedding Scheduler - Token-sized batches with several embedding requests in flight
+"""
+import asyncio
+import email.utils
+import random
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from utils.executors import run_blocking
+from utils.tokenizer import get_tokenizer
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _count_tokens(texts: List[str]) -> List[int]:
+    return get_tokenizer().count_many(texts)
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    # openai>=1.x exposes status_code, the legacy SDK http_status
+    return getattr(exc, "status_code", None) or getattr(exc, "http_status", None)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After(-Ms) headers."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or getattr(exc, "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000.0
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(value)
+            return max(0.0, parsed.timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Timeouts and dropped connections carry no status code
+    return type(exc).__name__ in ("APITimeoutError", "APIConnectionError", "Timeout", "TryAgain")
+
+
+class _AdaptiveLimiter:
+    """AIMD concurrency limit: halve on 429, grow by one after a window of successes."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self.paused_until = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        self.successes += 1
+        if self.limit < self.max_limit and self.successes >= self.limit:
+            self.limit += 1
+            self.successes = 0
+
+    def on_throttled(self, wait: float):
+        self.limit = max(1, self.limit // 2)
+        self.successes = 0
+        self.paused_until = max(self.paused_until, time.monotonic() + wait)
+
+
+class EmbeddingScheduler:
+    """Embeds texts in order-preserving batches sized by token count."""
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_tokens: int = 32000,
+        max_batch_size: int = 2048,
+        concurrency: int = 4,
+        max_retries: int = 6,
+        progress: Optional[Callable[[int, int], Any]] = None,
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_tokens = max(1, int(max_batch_tokens))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.concurrency = max(1, int(concurrency))
+        self.max_retries = max(0, int(max_retries))
+        self.progress = progress
+
+    def batches(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[int]]:
+        """Group text indexes so each batch stays within the token and size limits."""
+        if token_counts is None:
+            token_counts = get_tokenizer().count_many(texts)
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for index, tokens in enumerate(token_counts):
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def embed(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        limiter = _AdaptiveLimiter(self.concurrency)
+        done = 0
+
+        async def run(batch: List[int]):
+            nonlocal done
+            inputs = [texts[i] for i in batch]
+            for attempt in range(self.max_retries + 1):
+                await limiter.acquire()
+                try:
+                    result = await self.embed_batch(inputs)
+                except Exception as exc:
+                    if attempt >= self.max_retries or not _is_retryable(exc):
+                        raise
+                    wait = _retry_after(exc)
+                    if wait is None:
+                        wait = min(60.0, 2 ** attempt) * (0.5 + random.random())
+                    if _status_code(exc) == 429:
+                        limiter.on_throttled(wait)
+                    else:
+                        await asyncio.sleep(wait)
+                    continue
+                finally:
+                    await limiter.release()
+                limiter.on_success()
+                for i, vector in zip(batch, result):
+                    vectors[i] = vector
+                done += len(batch)
+                if self.progress is not None:
+                    self.progress(done, len(texts))
+                return
+
+        if token_counts is None:
+            # Tokenizing is CPU work (and may load the vocabulary); keep it off the event loop
+            token_counts = await run_blocking(_count_tokens, texts)
+        tasks = [asyncio.create_task(run(batch)) for batch in self.batches(texts, token_counts)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return vectors
@@ -0,0 +1,44 @@
+"""
+Events - In-process pub/sub for workflow progress, fanned out per workflow id
+"""
+import asyncio
+import os
+from typing import Dict, Any, Set
+
+
+class EventBus:
+    """Topic-keyed fan-out. Slow subscribers lose their oldest events, never block publishers."""
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = max(1, int(queue_size))
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    @classmethod
+    def from_env(cls) -> "EventBus":
+        return cls(queue_size=int(os.getenv("EVENT_QUEUE_SIZE", 256)))
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(topic)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[topic]
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._subscribers.get(topic, ()))
+
+    def publish(self, topic: str, event: Dict[str, Any]):
+        # Must be called on the event loop thread
+        for queue in list(self._subscribers.get(topic, ())):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(event)
@@ -0,0 +1,79 @@
+"""
+Executors - Bounded worker pools that keep blocking node work off the event loop
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+_lock = threading.Lock()
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _pool_size(env_name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(env_name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Pool for blocking I/O: OpenAI/search HTTP calls, FAISS builds, disk access."""
+    global _thread_pool
+    with _lock:
+        if _thread_pool is None:
+            size = _pool_size("NODE_THREAD_POOL_SIZE", min(32, (os.cpu_count() or 1) + 4))
+            _thread_pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="node-io")
+        return _thread_pool
+
+
+def process_pool_size() -> int:
+    return _pool_size("NODE_PROCESS_POOL_SIZE", os.cpu_count() or 1)
+
+
+def process_start_method() -> str:
+    available = multiprocessing.get_all_start_methods()
+    requested = os.getenv("NODE_PROCESS_START_METHOD")
+    if requested in available:
+        return requested
+    # fork would copy the server's threads, held locks, event loop and sockets into
+    # every worker; forkserver forks from a clean single-threaded process instead
+    return "forkserver" if "forkserver" in available else "spawn"
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Pool for CPU-bound work that would otherwise hold the GIL, e.g. PDF parsing."""
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=process_pool_size(),
+                mp_context=multiprocessing.get_context(process_start_method())
+            )
+        return _process_pool
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), functools.partial(func, *args, **kwargs))
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    # func and its arguments must be picklable (module-level functions only)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_pools(wait: bool = True):
+    global _thread_pool, _process_pool
+    with _lock:
+        if _thread_pool is not None:
+            _thread_pool.shutdown(wait=wait)
+            _thread_pool = None
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=wait)
+            _process_pool = None
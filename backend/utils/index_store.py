@@ -0,0 +1,263 @@
+"""
+Index Store - FAISS indexes persisted per workflow node and reopened after restarts
+"""
+import os
+import pathlib
+import pickle
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+import faiss
+from langchain_community.vectorstores import FAISS
+
+from utils.bm25 import ARRAY_FILES, LEXICAL_ATTR, VOCABULARY_FILE, BM25Index
+
+DEFAULT_INDEX_DIR = pathlib.Path(__file__).resolve().parent.parent / ".cache" / "indexes"
+# Same file names as FAISS.save_local so either loader can read the other's output
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+# Names the version directory holding the current copy; swapped atomically on save
+CURRENT_FILE = "CURRENT"
+# Ingestion cache key of the document a saved index was built from, if any
+INGESTION_KEY_FILE = "ingestion_key"
+VERSION_PREFIX = "v-"
+# Versions no pointer names, e.g. from a crashed or lost concurrent save, go after this long
+STALE_VERSION_AGE = 3600.0
+# Files of the flat layout used before versions existed
+_FLAT_FILES = (INDEX_FILE, DOCSTORE_FILE, INGESTION_KEY_FILE, VOCABULARY_FILE) + tuple(f"bm25_{name}.npy" for name in ARRAY_FILES)
+_SAFE_SEGMENT = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def _current_version(folder: pathlib.Path) -> Optional[str]:
+    try:
+        return (folder / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _version_dir(folder: pathlib.Path, version: Optional[str]) -> pathlib.Path:
+    # No pointer means a flat folder: an older save, or one written by FAISS.save_local
+    return folder / version if version else folder
+
+
+def saved_version(folder: str) -> Optional[str]:
+    """Token that changes with every save, or None when nothing is saved."""
+    target = pathlib.Path(folder)
+    version = _current_version(target)
+    if version is not None:
+        return version
+    try:
+        # Flat folders have no pointer; their files only change when rewritten
+        return f"flat-{(target / INDEX_FILE).stat().st_mtime_ns}" if has_saved_index(folder) else None
+    except FileNotFoundError:
+        return None
+
+
+def has_saved_index(folder: str) -> bool:
+    target = pathlib.Path(folder)
+    path = _version_dir(target, _current_version(target))
+    return (path / INDEX_FILE).exists() and (path / DOCSTORE_FILE).exists()
+
+
+def saved_ingestion_key(folder: str) -> Optional[str]:
+    target = pathlib.Path(folder)
+    path = _version_dir(target, _current_version(target))
+    try:
+        return (path / INGESTION_KEY_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _remove_replaced(folder: pathlib.Path, previous: Optional[str], current: str):
+    if previous is None:
+        for name in _FLAT_FILES:
+            (folder / name).unlink(missing_ok=True)
+    cutoff = time.time() - STALE_VERSION_AGE
+    for entry in folder.glob(f"{VERSION_PREFIX}*"):
+        if entry.name == current or not entry.is_dir():
+            continue
+        try:
+            if entry.name == previous or entry.stat().st_mtime < cutoff:
+                # Open mmaps of the old BM25 arrays stay valid after unlink
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def save_faiss(vector_store: Any, folder: str, ingestion_key: Optional[str] = None):
+    """
+    Write index, docstore, id mapping and any lexical index into a new version
+    directory, then point CURRENT at it. Readers see the old copy or the new one,
+    never neither; the old copy is removed after the swap.
+    """
+    target = pathlib.Path(folder)
+    target.mkdir(parents=True, exist_ok=True)
+    version = f"{VERSION_PREFIX}{uuid.uuid4().hex}"
+    staging = target / version
+    staging.mkdir()
+    try:
+        faiss.write_index(vector_store.index, str(staging / INDEX_FILE))
+        with open(staging / DOCSTORE_FILE, "wb") as f:
+            pickle.dump((vector_store.docstore, vector_store.index_to_docstore_id), f)
+        lexical = getattr(vector_store, LEXICAL_ATTR, None)
+        if lexical is not None:
+            lexical.save(str(staging))
+        if ingestion_key:
+            (staging / INGESTION_KEY_FILE).write_text(ingestion_key, encoding="utf-8")
+        pointer = target / f".{CURRENT_FILE}-{uuid.uuid4().hex}"
+        pointer.write_text(version, encoding="utf-8")
+        previous = _current_version(target)
+        os.replace(pointer, target / CURRENT_FILE)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _remove_replaced(target, previous, version)
+
+
+def load_faiss(folder: str, embeddings: Any, mmap: bool = True) -> FAISS:
+    """
+    Open a saved index. The flat FAISS index LangChain builds is read fully into
+    memory (faiss ignores IO_FLAG_MMAP for it); mmap only applies to the BM25 arrays.
+    ResidentIndexes bounds how many of these stay loaded at once.
+    """
+    target = pathlib.Path(folder)
+    attempts = 3
+    for attempt in range(attempts):
+        version = _current_version(target)
+        path = _version_dir(target, version)
+        try:
+            index = faiss.read_index(str(path / INDEX_FILE))
+            with open(path / DOCSTORE_FILE, "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)  # only ever files we wrote
+            lexical = BM25Index.load(str(path), mmap=mmap)
+            break
+        except (OSError, RuntimeError):
+            # A save swapped in a new version and removed this one while we read it
+            if attempt == attempts - 1 or _current_version(target) == version:
+                raise
+    vector_store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    # Folders saved before lexical search existed have none; it is rebuilt on first use
+    setattr(vector_store, LEXICAL_ATTR, lexical)
+    return vector_store
+
+
+def _resident_bytes(vector_store: Any) -> int:
+    index = getattr(vector_store, "index", None)
+    # Flat indexes hold every vector as float32
+    return int(getattr(index, "ntotal", 0)) * int(getattr(index, "d", 0)) * 4
+
+
+class ResidentIndexes:
+    """
+    Loaded indexes shared by every vector store node, keyed by folder. Least
+    recently used ones are dropped past max_indexes or max_bytes of vectors, so
+    a server with many saved workflows does not keep every index in memory;
+    a dropped index is read again from disk on its next use.
+    """
+
+    def __init__(self, max_indexes: int = 8, max_bytes: int = 1024 * 1024 * 1024):
+        self.max_indexes = max(1, int(max_indexes))
+        self.max_bytes = max(1, int(max_bytes))
+        self._entries: "OrderedDict[str, Tuple[str, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "ResidentIndexes":
+        return cls(
+            max_indexes=int(os.getenv("INDEX_RESIDENT_MAX", 8)),
+            max_bytes=int(float(os.getenv("INDEX_RESIDENT_MAX_MB", 1024)) * 1024 * 1024),
+        )
+
+    def peek(self, folder: str) -> Optional[Any]:
+        """The loaded index for folder, if any, without marking it used."""
+        with self._lock:
+            entry = self._entries.get(folder)
+            return entry[1] if entry is not None else None
+
+    def get(self, folder: str, version: str, load: Callable[[], Any]) -> Any:
+        """Return folder's index at version, calling load() outside the lock on a miss."""
+        with self._lock:
+            entry = self._entries.get(folder)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(folder)
+                return entry[1]
+        vector_store = load()
+        size = _resident_bytes(vector_store)
+        with self._lock:
+            self.loads += 1
+            self._pop_locked(folder)
+            self._entries[folder] = (version, vector_store, size)
+            self._bytes += size
+            # The index just loaded always stays, even if it alone is over the budget
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_indexes or self._bytes > self.max_bytes
+            ):
+                self._pop_locked(next(iter(self._entries)))
+                self.evictions += 1
+        return vector_store
+
+    def discard(self, folder: str):
+        """Forget folder and anything saved below it."""
+        prefix = folder.rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [k for k in self._entries if k == folder or k.startswith(prefix)]:
+                self._pop_locked(key)
+
+    def _pop_locked(self, folder: str):
+        entry = self._entries.pop(folder, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "indexes": len(self._entries),
+                "bytes": self._bytes,
+                "max_indexes": self.max_indexes,
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+resident_indexes = ResidentIndexes.from_env()
+
+
+class IndexStore:
+    """Directory layout: <root>/<workflow_id>/<node_id>/{CURRENT, v-<id>/{index.faiss,index.pkl}}"""
+
+    def __init__(self, root_dir: Optional[str] = None):
+        self.root = pathlib.Path(root_dir) if root_dir else DEFAULT_INDEX_DIR
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "IndexStore":
+        return cls(os.getenv("INDEX_STORE_DIR") or None)
+
+    def _dir(self, *segments: str) -> pathlib.Path:
+        # Ids come from request paths; never let them escape the root
+        for segment in segments:
+            if not _SAFE_SEGMENT.match(segment or ""):
+                raise ValueError(f"Invalid index id: {segment!r}")
+        return self.root.joinpath(*segments)
+
+    def path_for(self, workflow_id: str, node_id: str) -> str:
+        return str(self._dir(workflow_id, node_id))
+
+    def delete_node(self, workflow_id: str, node_id: str):
+        path = self._dir(workflow_id, node_id)
+        resident_indexes.discard(str(path))
+        shutil.rmtree(path, ignore_errors=True)
+
+    def delete_workflow(self, workflow_id: str):
+        path = self._dir(workflow_id)
+        resident_indexes.discard(str(path))
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,171 @@
+"""
+Ingestion Cache - Content-addressed store of split chunks and FAISS indexes
+"""
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional
+
+from utils.index_store import load_faiss, save_faiss
+
+DEFAULT_CACHE_DIR = pathlib.Path(__file__).resolve().parent.parent / ".cache" / "ingestion"
+META_FILE = "meta.json"
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def compute_ingestion_key(content_hash: str, chunk_size: int, chunk_overlap: int, embedding_model: str,
+                          length_unit: str = "characters") -> str:
+    """Key an ingestion by document content plus everything that changes its chunks or vectors."""
+    fields = {
+        "content": content_hash,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "embedding_model": embedding_model,
+    }
+    # Left out for character sizes so entries cached before token sizes existed still match
+    if length_unit != "characters":
+        fields["length_unit"] = length_unit
+    fingerprint = json.dumps(fields, sort_keys=True)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+def _dir_size(path: pathlib.Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class IngestionCache:
+    """Disk-backed LRU of ingested documents, bounded by entry count and total bytes."""
+
+    def __init__(self, root_dir: Optional[str] = None, max_entries: int = 64, max_bytes: int = 1024 ** 3):
+        self.root = pathlib.Path(root_dir) if root_dir else DEFAULT_CACHE_DIR
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._scan()
+
+    @classmethod
+    def from_env(cls) -> "IngestionCache":
+        return cls(
+            root_dir=os.getenv("INGESTION_CACHE_DIR") or None,
+            max_entries=int(os.getenv("INGESTION_CACHE_MAX_ENTRIES", 64)),
+            max_bytes=int(os.getenv("INGESTION_CACHE_MAX_BYTES", 1024 ** 3)),
+        )
+
+    def _scan(self):
+        # Rebuild the in-memory index from whatever survived the last run
+        for entry_dir in self.root.iterdir():
+            if not entry_dir.is_dir():
+                continue
+            meta_path = entry_dir / META_FILE
+            if not meta_path.exists():
+                # Half-written entry from a crash; drop it
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            self._entries[entry_dir.name] = meta
+        with self._lock:
+            self._evict_locked()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str, embeddings: Any) -> Optional[Dict[str, Any]]:
+        """Return {'vector_store', 'chunks', 'metadata'} for a cached ingestion, or None."""
+        with self._lock:
+            meta = self._entries.get(key)
+            if meta is None:
+                self.misses += 1
+                return None
+            meta["last_access"] = time.time()
+            meta["hits"] = meta.get("hits", 0) + 1
+        entry_dir = self.root / key
+        try:
+            vector_store = load_faiss(str(entry_dir), embeddings)
+            (entry_dir / META_FILE).write_text(json.dumps(meta))
+        except Exception as e:
+            print(f"Warning: Dropping unreadable ingestion cache entry {key}: {e}")
+            with self._lock:
+                self._entries.pop(key, None)
+                self.misses += 1
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        with self._lock:
+            self.hits += 1
+        chunks = [
+            vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+            for i in range(len(vector_store.index_to_docstore_id))
+        ]
+        return {
+            "vector_store": vector_store,
+            "chunks": chunks,
+            "metadata": meta.get("metadata", {}),
+        }
+
+    def put(self, key: str, vector_store: Any, metadata: Optional[Dict[str, Any]] = None):
+        # Write into a private directory first so readers never see a partial entry
+        staging_dir = self.root / f".tmp-{uuid.uuid4().hex}"
+        try:
+            save_faiss(vector_store, str(staging_dir))
+            now = time.time()
+            meta = {
+                "created_at": now,
+                "last_access": now,
+                "hits": 0,
+                "metadata": metadata or {},
+            }
+            meta["size"] = _dir_size(staging_dir)
+            (staging_dir / META_FILE).write_text(json.dumps(meta))
+            meta["size"] = _dir_size(staging_dir)
+            with self._lock:
+                entry_dir = self.root / key
+                if entry_dir.exists():
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(staging_dir, entry_dir)
+                self._entries[key] = meta
+                self._evict_locked()
+        except Exception as e:
+            print(f"Warning: Failed to write ingestion cache entry {key}: {e}")
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _evict_locked(self):
+        total = sum(m.get("size", 0) for m in self._entries.values())
+        by_age = sorted(self._entries.items(), key=lambda item: item[1].get("last_access", 0))
+        for key, meta in by_age:
+            if len(self._entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            shutil.rmtree(self.root / key, ignore_errors=True)
+            del self._entries[key]
+            total -= meta.get("size", 0)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(m.get("size", 0) for m in self._entries.values()),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
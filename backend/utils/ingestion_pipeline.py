@@ -0,0 +1,49 @@
+"""
+Ingestion Pipeline - Bounded queues that let loader, splitter and embedder stages overlap
+"""
+import asyncio
+from typing import AsyncIterator, TypeVar
+
+T = TypeVar("T")
+
+_END = object()
+
+
+class PipelineStageError(Exception):
+    """An exception raised inside a stage, tagged with the node type of that stage."""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(str(error))
+        self.stage = stage
+        self.error = error
+
+
+async def buffered(source: AsyncIterator[T], maxsize: int, stage: str) -> AsyncIterator[T]:
+    """Run source in its own task at most maxsize items ahead of the consumer.
+
+    The queue is the backpressure: a slow consumer stalls the producer instead of
+    letting its output pile up. Errors reach the consumer as PipelineStageError.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, int(maxsize)))
+
+    async def pump():
+        try:
+            async for item in source:
+                await queue.put((item, None))
+        except Exception as e:
+            # Errors from further upstream keep their original stage
+            await queue.put((None, e if isinstance(e, PipelineStageError) else PipelineStageError(stage, e)))
+            return
+        await queue.put((_END, None))
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        task.cancel()
@@ -0,0 +1,112 @@
+"""
+OpenAI Client - Process-wide pooled clients shared by every node
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import weakref
+from typing import Any, Dict
+
+import httpx
+# Support both new (>=1.x) and legacy (0.27.x) OpenAI SDKs
+try:
+    from openai import AsyncOpenAI, OpenAI  # new SDK
+    _OPENAI_SDK = "new"
+except Exception:  # pragma: no cover
+    AsyncOpenAI = None
+    OpenAI = None
+    _OPENAI_SDK = "legacy"
+
+_lock = threading.Lock()
+# api_key -> {event loop: client}; an entry goes away with its loop
+_async_clients: Dict[str, "weakref.WeakKeyDictionary"] = {}
+_sync_clients: Dict[str, Any] = {}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(_env_float("OPENAI_TIMEOUT", 60.0), connect=_env_float("OPENAI_CONNECT_TIMEOUT", 10.0))
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_env_int("OPENAI_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("OPENAI_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_env_float("OPENAI_KEEPALIVE_EXPIRY", 30.0),
+    )
+
+
+def _http2_enabled() -> bool:
+    # httpx only speaks HTTP/2 when the optional h2 package is installed
+    if os.getenv("OPENAI_HTTP2", "true").lower() in ("0", "false", "no"):
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+def _max_retries() -> int:
+    return _env_int("OPENAI_MAX_RETRIES", 2)
+
+
+def get_async_client(api_key: str):
+    """Shared AsyncOpenAI client for the running event loop."""
+    if _OPENAI_SDK != "new":
+        raise RuntimeError("The async OpenAI client requires openai>=1.0")
+    loop = asyncio.get_running_loop()
+    with _lock:
+        # httpx connections are bound to the loop that opened them, so each loop
+        # gets its own client and other loops keep theirs
+        by_loop = _async_clients.setdefault(api_key, weakref.WeakKeyDictionary())
+        client = by_loop.get(loop)
+        if client is not None:
+            return client
+        for other in [other for other in by_loop if other.is_closed()]:
+            # Its connections died with the loop; nothing is left to close
+            del by_loop[other]
+        http_client = httpx.AsyncClient(timeout=_timeout(), limits=_limits(), http2=_http2_enabled())
+        client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=_max_retries())
+        by_loop[loop] = client
+        return client
+
+
+def get_sync_client(api_key: str):
+    """Shared blocking client for code paths that cannot await (e.g. LangChain sync APIs)."""
+    if _OPENAI_SDK != "new":
+        raise RuntimeError("The pooled OpenAI client requires openai>=1.0")
+    with _lock:
+        client = _sync_clients.get(api_key)
+        if client is None:
+            http_client = httpx.Client(timeout=_timeout(), limits=_limits(), http2=_http2_enabled())
+            client = OpenAI(api_key=api_key, http_client=http_client, max_retries=_max_retries())
+            _sync_clients[api_key] = client
+        return client
+
+
+async def close_clients():
+    with _lock:
+        async_clients = [entry for by_loop in _async_clients.values() for entry in by_loop.items()]
+        sync_clients = list(_sync_clients.values())
+        _async_clients.clear()
+        _sync_clients.clear()
+    current = asyncio.get_running_loop()
+    for loop, client in async_clients:
+        if loop is current:
+            await client.close()
+        elif loop.is_running():
+            # Owned by another thread's loop; close it there
+            asyncio.run_coroutine_threadsafe(client.close(), loop)
+    for client in sync_clients:
+        client.close()
@@ -0,0 +1,152 @@
+"""
+Position Writes - Write-behind buffer that coalesces node position updates from canvas drags
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+PositionRow = Dict[str, object]
+PositionWriter = Callable[[List[PositionRow]], Awaitable[None]]
+
+
+class PositionWriteBuffer:
+    """Keeps only the latest position per node until the next flush.
+
+    record() is called on every drag event and never touches the database; a
+    background task flushes whatever accumulated over one window as a single
+    batch, so writes scale with nodes moved, not events received. Failed batches
+    are retried with capped exponential backoff; a position that fails
+    max_attempts writes in a row is dropped.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, max_attempts: int = 5, max_backoff: float = 30.0):
+        self.flush_interval = max(0.0, float(flush_interval))
+        self.max_attempts = max(1, int(max_attempts))
+        self.max_backoff = max(0.0, float(max_backoff))
+        self.events = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.dropped = 0
+        # (workflow_id, node_id) -> (x, y)
+        self._pending: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        # Failed writes so far of each pending position
+        self._attempts: Dict[Tuple[str, str], int] = {}
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_env(cls) -> "PositionWriteBuffer":
+        return cls(
+            flush_interval=float(os.getenv("POSITION_FLUSH_INTERVAL", 0.5)),
+            max_attempts=int(os.getenv("POSITION_FLUSH_MAX_ATTEMPTS", 5)),
+            max_backoff=float(os.getenv("POSITION_FLUSH_MAX_BACKOFF", 30.0)),
+        )
+
+    def _event(self) -> asyncio.Event:
+        # Created lazily so it binds to the running loop, not the import-time one
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    def record(self, workflow_id: str, node_id: str, x: float, y: float):
+        self.events += 1
+        self._pending[(workflow_id, node_id)] = (float(x), float(y))
+        # A new position gets its own attempts
+        self._attempts.pop((workflow_id, node_id), None)
+        self._event().set()
+
+    def pending_for(self, workflow_id: str) -> Dict[str, Tuple[float, float]]:
+        """Positions not yet written, so a reload from the database can overlay them."""
+        return {
+            node_id: position
+            for (pending_workflow, node_id), position in self._pending.items()
+            if pending_workflow == workflow_id
+        }
+
+    def discard(self, workflow_id: str, node_id: Optional[str] = None):
+        # A later direct write or a delete must not be overwritten by an older drag
+        for key in list(self._pending):
+            if key[0] == workflow_id and (node_id is None or key[1] == node_id):
+                del self._pending[key]
+                self._attempts.pop(key, None)
+
+    def _requeue(self, batch: Dict[Tuple[str, str], Tuple[float, float]]):
+        # Keep any newer position that arrived while the batch was being written
+        for key, position in batch.items():
+            self._pending.setdefault(key, position)
+
+    def _retry_later(self, batch: Dict[Tuple[str, str], Tuple[float, float]]):
+        given_up = 0
+        for key, position in batch.items():
+            if key in self._pending:
+                # Moved again meanwhile; the newer position is written next
+                continue
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts >= self.max_attempts:
+                self._attempts.pop(key, None)
+                given_up += 1
+                continue
+            self._attempts[key] = attempts
+            self._pending[key] = position
+        if given_up:
+            self.dropped += given_up
+            print(f"Warning: Dropped {given_up} node positions after {self.max_attempts} failed writes")
+        self._consecutive_failures += 1
+        delay = max(self.flush_interval, 0.1) * 2 ** (self._consecutive_failures - 1)
+        self._retry_at = time.monotonic() + min(self.max_backoff, delay)
+
+    def retry_delay(self) -> float:
+        """Seconds until a failed write may be retried; 0 when nothing has failed."""
+        return max(0.0, self._retry_at - time.monotonic())
+
+    async def flush(self, write: PositionWriter):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        rows = [
+            {"workflow_id": workflow_id, "node_id": node_id, "x": x, "y": y}
+            for (workflow_id, node_id), (x, y) in batch.items()
+        ]
+        try:
+            await write(rows)
+        except asyncio.CancelledError:
+            # Shutdown interrupted the write; the final flush picks these up
+            self._requeue(batch)
+            raise
+        except Exception as e:
+            self.failures += 1
+            print(f"Warning: Failed to flush {len(rows)} node positions: {e}")
+            self._retry_later(batch)
+            if self._pending:
+                self._event().set()
+            return
+        self.flushes += 1
+        self.rows_written += len(rows)
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+        for key in batch:
+            self._attempts.pop(key, None)
+
+    async def run(self, write: PositionWriter):
+        """Background loop: wait for the first event, let the window fill (or back off), flush."""
+        wakeup = self._event()
+        while True:
+            await wakeup.wait()
+            await asyncio.sleep(max(self.flush_interval, self.retry_delay()))
+            wakeup.clear()
+            await self.flush(write)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "pending": len(self._pending),
+            "flush_interval": self.flush_interval,
+            "events": self.events,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "retry_in": self.retry_delay(),
+        }
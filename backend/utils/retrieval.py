@@ -0,0 +1,176 @@
+"""
+Retrieval - Scored FAISS search, BM25 fusion and vectorized maximal marginal relevance
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.bm25 import lexical_index
+from utils.executors import run_blocking
+
+SEARCH_TYPES = ("similarity", "mmr")
+
+
+def relevance_scores(distances: np.ndarray, metric_type: int) -> np.ndarray:
+    """FAISS distances as cosine similarities, higher is more relevant."""
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        return distances
+    # IndexFlatL2 returns squared distances; for unit vectors (OpenAI embeddings are) d^2 = 2 - 2cos
+    return 1.0 - distances / 2.0
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Ids from all rankings ordered by the sum of 1 / (k + rank) over the rankings they appear in."""
+    rankings = [ranking for ranking in rankings if len(ranking)]
+    if not rankings:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    ids = np.concatenate(rankings).astype(np.int64)
+    contributions = np.concatenate([1.0 / (k + np.arange(1, len(ranking) + 1)) for ranking in rankings])
+    unique, inverse = np.unique(ids, return_inverse=True)
+    fused = np.bincount(inverse, weights=contributions)
+    order = np.argsort(-fused, kind="stable")
+    return unique[order], fused[order]
+
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float = 0.5,
+               relevance: Optional[np.ndarray] = None) -> List[int]:
+    """
+    Rows of candidates picked by maximal marginal relevance: each pick maximizes
+    lambda_mult * sim(query) - (1 - lambda_mult) * max sim(already picked).
+
+    Rows are normalized once and the redundancy of every candidate is kept as a
+    running maximum, so each pick costs one matrix-vector product over all of them.
+    relevance replaces sim(query) when the ranking comes from somewhere else.
+    """
+    k = min(k, len(candidates))
+    if k <= 0:
+        return []
+    vectors = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    if relevance is None:
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        relevance = vectors @ query
+    # The first pick is simply the most similar; nothing has been picked to be redundant with
+    pick = int(np.argmax(relevance))
+    picked = [pick]
+    redundancy = vectors @ vectors[pick]
+    available = np.ones(len(candidates), dtype=bool)
+    available[pick] = False
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        picked.append(pick)
+        available[pick] = False
+        np.maximum(redundancy, vectors @ vectors[pick], out=redundancy)
+    return picked
+
+
+class ScoredRetriever:
+    """Retriever over a LangChain FAISS store whose results can come with relevance scores."""
+
+    def __init__(self, vector_store: Any, search_type: str = "similarity", k: int = 4, fetch_k: int = 20,
+                 lambda_mult: float = 0.5, score_threshold: Optional[float] = None,
+                 hybrid: bool = False, rrf_k: int = 60):
+        if search_type not in SEARCH_TYPES:
+            raise ValueError(f"Unknown search_type {search_type!r}; expected one of {SEARCH_TYPES}")
+        self.vector_store = vector_store
+        self.search_type = search_type
+        self.k = max(1, int(k))
+        self.fetch_k = max(self.k, int(fetch_k))
+        self.lambda_mult = float(lambda_mult)
+        self.score_threshold = score_threshold
+        self.hybrid = bool(hybrid)
+        self.rrf_k = max(1, int(rrf_k))
+
+    def lexical_search(self, query: str) -> np.ndarray:
+        """FAISS positions of the best BM25 matches for query, best first."""
+        positions, _ = lexical_index(self.vector_store).search(query, self.fetch_k)
+        return positions
+
+    def search_by_vector(self, embedding: List[float], lexical: Optional[np.ndarray] = None) -> List[Tuple[Document, float]]:
+        """Matches for embedding, fused with the lexical ranking when one is given; scores are cosine."""
+        store = self.vector_store
+        index = store.index
+        wide = self.search_type == "mmr" or lexical is not None
+        fetch = min(self.fetch_k if wide else self.k, index.ntotal)
+        if fetch <= 0:
+            return []
+        query = np.asarray([embedding], dtype=np.float32)
+        if getattr(store, "_normalize_L2", False):
+            faiss.normalize_L2(query)
+        distances, ids = index.search(query, fetch)
+        found = ids[0] != -1
+        ids = ids[0][found].astype(np.int64)
+        scores = relevance_scores(distances[0][found], index.metric_type)
+        relevance = None
+        if lexical is not None:
+            by_id = dict(zip(ids.tolist(), scores.tolist()))
+            ids, fused = reciprocal_rank_fusion([ids, lexical], self.rrf_k)
+            scores = self._cosine(query[0], ids, by_id)
+            relevance = fused / fused[0] if len(fused) else fused
+        if self.score_threshold is not None:
+            # Filtered before MMR, so diversity is only traded among relevant candidates
+            relevant = scores >= self.score_threshold
+            ids, scores = ids[relevant], scores[relevant]
+            if relevance is not None:
+                relevance = relevance[relevant]
+        if self.search_type == "mmr" and len(ids) > 0:
+            order = mmr_select(query[0], index.reconstruct_batch(ids), self.k, self.lambda_mult, relevance)
+        else:
+            order = range(min(self.k, len(ids)))
+        results = []
+        for i in order:
+            doc = store.docstore.search(store.index_to_docstore_id[int(ids[i])])
+            # The docstore answers a missing id with a message string
+            if isinstance(doc, Document):
+                results.append((doc, float(scores[i])))
+        return results
+
+    def _cosine(self, query: np.ndarray, ids: np.ndarray, known: Dict[int, float]) -> np.ndarray:
+        # BM25-only hits were never scored by FAISS; compare their stored vectors directly
+        missing = np.asarray([i for i in ids.tolist() if i not in known], dtype=np.int64)
+        if len(missing):
+            vectors = self.vector_store.index.reconstruct_batch(missing)
+            if self.vector_store.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                distances = vectors @ query
+            else:
+                distances = ((vectors - query) ** 2).sum(axis=1)
+            known.update(zip(missing.tolist(), relevance_scores(distances, self.vector_store.index.metric_type).tolist()))
+        return np.asarray([known[i] for i in ids.tolist()], dtype=np.float32)
+
+    def scored_search(self, query: str) -> List[Tuple[Document, float]]:
+        embeddings = self.vector_store.embeddings
+        if embeddings is not None:
+            embedding = embeddings.embed_query(query)
+        else:
+            embedding = self.vector_store.embedding_function(query)
+        return self.search_by_vector(embedding, self.lexical_search(query) if self.hybrid else None)
+
+    async def _aembed_query(self, query: str) -> List[float]:
+        embeddings = self.vector_store.embeddings
+        if embeddings is not None:
+            return await embeddings.aembed_query(query)
+        return await run_blocking(self.vector_store.embedding_function, query)
+
+    async def ascored_search(self, query: str) -> List[Tuple[Document, float]]:
+        if not self.hybrid:
+            return await run_blocking(self.search_by_vector, await self._aembed_query(query))
+        # The BM25 lookup runs on a worker thread while the query embedding is in flight
+        embedding, lexical = await asyncio.gather(
+            self._aembed_query(query),
+            run_blocking(self.lexical_search, query)
+        )
+        return await run_blocking(self.search_by_vector, embedding, lexical)
+
+    # Same entry points as a LangChain retriever, for callers that only want documents
+    def invoke(self, query: str) -> List[Document]:
+        return [doc for doc, _ in self.scored_search(query)]
+
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        return self.invoke(query)
+
+    async def ainvoke(self, query: str) -> List[Document]:
+        return [doc for doc, _ in await self.ascored_search(query)]
@@ -0,0 +1,143 @@
+"""
+Text Splitting - Offset-based splitter producing the same chunks as RecursiveCharacterTextSplitter
+"""
+import copy
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+from operator import add, sub
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
+from utils.tokenizer import Tokenizer
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", " ", "")
+_IMMUTABLE = (str, int, float, bool, type(None))
+
+
+def _copy_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    # Page metadata is nearly always flat; only nested values need the deep copy
+    if all(isinstance(value, _IMMUTABLE) for value in metadata.values()):
+        return dict(metadata)
+    return copy.deepcopy(metadata)
+
+
+class NativeTextSplitter:
+    """Drop-in for RecursiveCharacterTextSplitter(chunk_size, chunk_overlap, length_function=len).
+
+    Matches its defaults: separators "\\n\\n", "\\n", " ", "", kept at the start of
+    each piece, and whitespace stripped from every chunk. Because kept separators
+    make every piece a contiguous span of the input, pieces are tracked as offsets
+    and merged by bisecting them; the only strings built are the chunks themselves.
+
+    With a tokenizer, sizes are in tokens: the text is encoded once and a piece
+    weighs as many tokens as start inside it, so weights add up exactly and the
+    finest split falls on token boundaries instead of characters.
+    """
+
+    def __init__(self, chunk_size: int = 4000, chunk_overlap: int = 200, tokenizer: Optional[Tokenizer] = None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size "
+                f"({chunk_size}), should be smaller."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = DEFAULT_SEPARATORS
+        self.tokenizer = tokenizer
+
+    def split_text(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        starts = self.tokenizer.offsets(text) if self.tokenizer is not None else None
+        self._split(text, 0, len(text), 0, starts, chunks)
+        return chunks
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        chunks: List[Document] = []
+        for doc in documents:
+            for chunk in self.split_text(doc.page_content):
+                # Fields are already a str and a dict; validating them again costs
+                # more than the split itself
+                chunks.append(Document.construct(page_content=chunk, metadata=_copy_metadata(doc.metadata)))
+        return chunks
+
+    def _boundaries(self, text: str, start: int, end: int, level: int, starts: Optional[List[int]]) -> Optional[List[int]]:
+        """Piece boundaries of text[start:end] at the first separator from level on that occurs in it."""
+        separator = self.separators[level]
+        if separator == "":
+            if starts is None:
+                return list(range(start, end + 1))
+            # One piece per token; tokens sharing a character become one piece
+            bounds = sorted(set(starts[bisect_left(starts, start):bisect_left(starts, end)]) | {start})
+            bounds.append(end)
+            return bounds
+        if text.find(separator, start, end) == -1:
+            return None
+        # Offsets come from C-level split + running sums, not a Python loop over matches;
+        # each piece runs from one separator occurrence up to the next
+        parts = text[start:end].split(separator)
+        step = len(separator)
+        ends = list(accumulate(map(len, parts[:-1])))
+        occurrences = list(map(add, ends, range(start, start + step * len(ends), step)))
+        bounds = [start] if parts[0] else []
+        bounds.extend(occurrences)
+        bounds.append(end)
+        return bounds
+
+    def _split(self, text: str, start: int, end: int, level: int, starts: Optional[List[int]], out: List[str]):
+        if start >= end:
+            return
+        bounds = None
+        while bounds is None:
+            bounds = self._boundaries(text, start, end, level, starts)
+            level += 1
+        # level now points at the separators left for pieces that are still too long
+        has_finer = level < len(self.separators)
+        chunk_size = self.chunk_size
+        pieces = len(bounds) - 1
+        # Running size at each boundary: the offset itself, or the tokens started before it
+        weights = bounds if starts is None else [bisect_left(starts, bound) for bound in bounds]
+        lengths = list(map(sub, islice(weights, 1, None), weights))
+        if max(lengths) < chunk_size:
+            self._merge(text, bounds, weights, 0, pieces, out)
+            return
+        run_start = 0
+        for i in [i for i, length in enumerate(lengths) if length >= chunk_size]:
+            if i > run_start:
+                self._merge(text, bounds, weights, run_start, i, out)
+            a, b = bounds[i], bounds[i + 1]
+            if has_finer:
+                self._split(text, a, b, level, starts, out)
+            else:
+                out.append(text[a:b])
+            run_start = i + 1
+        if pieces > run_start:
+            self._merge(text, bounds, weights, run_start, pieces, out)
+
+    def _merge(self, text: str, bounds: List[int], weights: List[int], lo: int, hi: int, out: List[str]):
+        """
+        Greedily pack pieces lo..hi-1 (all shorter than chunk_size) into chunks,
+        carrying up to chunk_overlap into the next. Pieces are contiguous, so a
+        chunk's end and the next chunk's start are found by bisecting the running
+        sizes in weights; bounds maps them back to text offsets.
+        """
+        chunk_size, chunk_overlap = self.chunk_size, self.chunk_overlap
+        head = lo
+        first_open = lo + 1
+        while True:
+            # First piece that no longer fits after head
+            cut = bisect_right(weights, weights[head] + chunk_size, first_open + 1, hi + 1) - 1
+            if cut >= hi:
+                break
+            chunk = text[bounds[head]:bounds[cut]].strip()
+            if chunk:
+                out.append(chunk)
+            # Drop leading pieces until what is left fits the overlap and leaves room for `cut`
+            head = max(
+                bisect_left(weights, weights[cut] - chunk_overlap, head, cut),
+                bisect_left(weights, weights[cut + 1] - chunk_size, head, cut)
+            )
+            first_open = cut + 1
+        chunk = text[bounds[head]:bounds[hi]].strip()
+        if chunk:
+            out.append(chunk)
@@ -0,0 +1,189 @@
+"""
+Tokenizer - Local BPE token counting with a cached vocabulary and a heuristic fallback
+"""
+import argparse
+import base64
+import hashlib
+import os
+import pathlib
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+# cl100k_base is the vocabulary of the OpenAI embedding and chat models this backend calls
+DEFAULT_ENCODING = "cl100k_base"
+DEFAULT_VOCAB_DIR = pathlib.Path(__file__).resolve().parent.parent / ".cache" / "tiktoken"
+# A missing or broken vocabulary is looked for again this often, so one added later is picked up
+RETRY_INTERVAL = 60.0
+
+# What tiktoken's registry would build, minus the download: loading only ever reads a local file
+_ENCODINGS = {
+    "cl100k_base": {
+        "url": "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+        "sha256": "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7",
+        "pat_str": r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+""",
+        "special_tokens": {
+            "<|endoftext|>": 100257,
+            "<|fim_prefix|>": 100258,
+            "<|fim_middle|>": 100259,
+            "<|fim_suffix|>": 100260,
+            "<|endofprompt|>": 100276,
+        },
+    },
+}
+# Rough chars-per-token ratio for English text with OpenAI BPE vocabularies
+CHARS_PER_TOKEN = 4
+
+# Leading whitespace plus up to CHARS_PER_TOKEN characters, or a trailing run of whitespace
+_HEURISTIC_TOKEN = re.compile(r"\s*\S{1,%d}|\s+" % CHARS_PER_TOKEN)
+
+_lock = threading.Lock()
+_shared_tokenizer: Optional["Tokenizer"] = None
+_retry_at = 0.0
+
+
+class Tokenizer:
+    """Counts tokens and reports where each token starts, so text can be cut on token boundaries."""
+
+    name = "heuristic"
+    # False when counts are estimated rather than taken from the model's vocabulary
+    exact = False
+
+    def count(self, text: str) -> int:
+        return len(_HEURISTIC_TOKEN.findall(text))
+
+    def count_many(self, texts: Iterable[str]) -> List[int]:
+        return [self.count(text) for text in texts]
+
+    def offsets(self, text: str) -> List[int]:
+        """Character offset of the start of every token in text, in order; one entry per token."""
+        return [match.start() for match in _HEURISTIC_TOKEN.finditer(text)]
+
+
+class TiktokenTokenizer(Tokenizer):
+    exact = True
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = encoding.name
+
+    def count(self, text: str) -> int:
+        # Ordinary encoding: special-token text in a PDF is counted as plain text, not rejected
+        return len(self.encoding.encode_ordinary(text))
+
+    def count_many(self, texts: Iterable[str]) -> List[int]:
+        encode = self.encoding.encode_ordinary
+        return [len(encode(text)) for text in texts]
+
+    def offsets(self, text: str) -> List[int]:
+        # A multi-byte character split over several tokens repeats its offset once per token
+        _, starts = self.encoding.decode_with_offsets(self.encoding.encode_ordinary(text))
+        return starts
+
+
+def vocabulary_path(encoding_name: str = DEFAULT_ENCODING, vocab_dir: Optional[str] = None) -> pathlib.Path:
+    return pathlib.Path(vocab_dir or os.getenv("TOKENIZER_VOCAB_DIR") or DEFAULT_VOCAB_DIR) / f"{encoding_name}.tiktoken"
+
+
+def _read_ranks(path: pathlib.Path) -> Dict[bytes, int]:
+    # Same format tiktoken downloads: one "<base64 token> <rank>" line per token
+    ranks: Dict[bytes, int] = {}
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+def load_tokenizer(encoding_name: str = DEFAULT_ENCODING, vocab_dir: Optional[str] = None) -> Tokenizer:
+    """BPE tokenizer for encoding_name, or the heuristic one if its vocabulary cannot be loaded.
+
+    The vocabulary is read from <vocab_dir>/<encoding_name>.tiktoken and never
+    fetched here; download_vocabulary() (python -m utils.tokenizer) puts it there
+    ahead of time, so a host without network access never stalls on it.
+    """
+    if encoding_name == "heuristic":
+        return Tokenizer()
+    spec = _ENCODINGS.get(encoding_name)
+    if spec is None:
+        print(f"Warning: Unknown tokenizer encoding {encoding_name!r}; token counts are estimated")
+        return Tokenizer()
+    try:
+        import tiktoken
+    except ImportError:
+        print("Warning: tiktoken is not installed; token counts are estimated")
+        return Tokenizer()
+    path = vocabulary_path(encoding_name, vocab_dir)
+    if not path.exists():
+        print(f"Warning: No {encoding_name} vocabulary at {path}; token counts are estimated "
+              f"(run `python -m utils.tokenizer` to download it)")
+        return Tokenizer()
+    try:
+        encoding = tiktoken.Encoding(
+            encoding_name,
+            pat_str=spec["pat_str"],
+            mergeable_ranks=_read_ranks(path),
+            special_tokens=spec["special_tokens"]
+        )
+    except Exception as e:
+        print(f"Warning: Could not load the {encoding_name} vocabulary ({type(e).__name__}); token counts are estimated")
+        return Tokenizer()
+    return TiktokenTokenizer(encoding)
+
+
+def download_vocabulary(encoding_name: str = DEFAULT_ENCODING, vocab_dir: Optional[str] = None,
+                        timeout: float = 30.0) -> pathlib.Path:
+    """Fetch and verify a vocabulary into the directory load_tokenizer reads; for deploy time."""
+    spec = _ENCODINGS.get(encoding_name)
+    if spec is None:
+        raise ValueError(f"Unknown encoding {encoding_name!r}; expected one of {sorted(_ENCODINGS)}")
+    path = vocabulary_path(encoding_name, vocab_dir)
+    with urllib.request.urlopen(spec["url"], timeout=timeout) as response:
+        content = response.read()
+    if hashlib.sha256(content).hexdigest() != spec["sha256"]:
+        raise ValueError(f"Downloaded {encoding_name} vocabulary does not match its expected hash")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_name(f".{path.name}-{uuid.uuid4().hex}")
+    staging.write_bytes(content)
+    os.replace(staging, path)
+    return path
+
+
+def get_tokenizer() -> Tokenizer:
+    """Process-wide tokenizer for TOKENIZER_ENCODING, loaded on first use.
+
+    Loading reads and parses the vocabulary file, so call this off the event loop.
+    A fallback to the heuristic is not kept for good: once the vocabulary file
+    exists, it is loaded on the first call after RETRY_INTERVAL.
+    """
+    global _shared_tokenizer, _retry_at
+    encoding_name = os.getenv("TOKENIZER_ENCODING", DEFAULT_ENCODING)
+    with _lock:
+        tokenizer = _shared_tokenizer
+        if tokenizer is None or (
+            not tokenizer.exact
+            and encoding_name in _ENCODINGS
+            and time.monotonic() >= _retry_at
+            and vocabulary_path(encoding_name).exists()
+        ):
+            tokenizer = load_tokenizer(encoding_name)
+            if not tokenizer.exact:
+                _retry_at = time.monotonic() + RETRY_INTERVAL
+            _shared_tokenizer = tokenizer
+        return tokenizer
+
+
+def count_tokens(text: str) -> int:
+    return get_tokenizer().count(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download a tokenizer vocabulary for offline use")
+    parser.add_argument("encoding", nargs="?", default=os.getenv("TOKENIZER_ENCODING", DEFAULT_ENCODING))
+    parser.add_argument("--vocab-dir", default=None)
+    args = parser.parse_args()
+    print(download_vocabulary(args.encoding, args.vocab_dir))
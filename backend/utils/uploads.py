@@ -0,0 +1,241 @@
+"""
+Uploads - Streams request files to a managed spool directory, hashing as they arrive
+"""
+import hashlib
+import os
+import pathlib
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Mapping, Optional, Tuple
+
+import aiofiles
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+DEFAULT_SPOOL_DIR = pathlib.Path(__file__).resolve().parent.parent / ".cache" / "uploads"
+# Text fields of an upload form are ids and questions, never documents
+MAX_FORM_FIELD_BYTES = 64 * 1024
+# Room in a form body for boundaries, part headers and the text fields around the file
+FORM_OVERHEAD_BYTES = 256 * 1024
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the {max_bytes} byte limit")
+        self.max_bytes = max_bytes
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+class SpooledUpload:
+    """A fully received upload on disk; the path is valid until cleanup()."""
+
+    def __init__(self, path: pathlib.Path, size: int, content_hash: str, filename: Optional[str] = None):
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+        self.filename = filename
+
+    def cleanup(self):
+        # Safe to call more than once
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class _SpoolTarget:
+    """One upload being written into the spool, hashed and size-checked chunk by chunk."""
+
+    def __init__(self, path: pathlib.Path, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._out = None
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self.digest.update(chunk)
+        if self._out is None:
+            self._out = await aiofiles.open(self.path, "wb")
+        await self._out.write(chunk)
+
+    async def close(self):
+        if self._out is None:
+            # Empty uploads still get a file
+            self._out = await aiofiles.open(self.path, "wb")
+        await self._out.close()
+
+    async def discard(self):
+        if self._out is not None:
+            await self._out.close()
+        self.path.unlink(missing_ok=True)
+
+    def result(self, filename: Optional[str]) -> SpooledUpload:
+        return SpooledUpload(self.path, self.size, self.digest.hexdigest(), filename)
+
+
+class UploadSpool:
+    """Copies uploads chunk by chunk, so memory per upload is one chunk however large the file."""
+
+    def __init__(self, root_dir: Optional[str] = None, max_bytes: int = 100 * 1024 ** 2, chunk_size: int = 1024 ** 2):
+        self.root = pathlib.Path(root_dir) if root_dir else DEFAULT_SPOOL_DIR
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max(1, int(max_bytes))
+        self.chunk_size = max(1, int(chunk_size))
+        self._remove_stale()
+
+    def _remove_stale(self, max_age: float = 3600.0):
+        # Left behind by a process that died mid-request; other workers may share the
+        # directory, so only files no live request could still be using
+        cutoff = time.time() - max_age
+        for entry in self.root.glob("*.upload"):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    entry.unlink()
+            except OSError:
+                pass
+
+    @classmethod
+    def from_env(cls) -> "UploadSpool":
+        return cls(
+            root_dir=os.getenv("UPLOAD_SPOOL_DIR") or None,
+            max_bytes=int(os.getenv("UPLOAD_MAX_BYTES", 100 * 1024 ** 2)),
+            chunk_size=int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 ** 2)),
+        )
+
+    def _target(self) -> _SpoolTarget:
+        return _SpoolTarget(self.root / f"{uuid.uuid4().hex}.upload", self.max_bytes)
+
+    async def spool(self, upload: Any) -> SpooledUpload:
+        """Write an UploadFile into the spool; raises UploadTooLarge past max_bytes."""
+        target = self._target()
+        try:
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                await target.write(chunk)
+            await target.close()
+        except BaseException:
+            await target.discard()
+            raise
+        return target.result(getattr(upload, "filename", None))
+
+    async def spool_form(self, headers: Mapping[str, str], stream: AsyncIterator[bytes],
+                         file_field: str = "file") -> Tuple[Dict[str, str], SpooledUpload]:
+        """
+        Parse a multipart/form-data request body as it arrives. The file_field part
+        goes straight into the spool while it is hashed, so the body is never
+        buffered first; the other parts come back as text fields. Raises
+        UploadTooLarge as soon as Content-Length or the bytes received say the
+        file is over max_bytes, and InvalidUpload for anything but one such form.
+        """
+        limit = self.max_bytes + FORM_OVERHEAD_BYTES
+        declared = headers.get("content-length")
+        if declared is not None:
+            try:
+                declared_bytes = int(declared)
+            except ValueError:
+                raise InvalidUpload("Invalid Content-Length header")
+            # Refused before a single byte of the body is read
+            if declared_bytes > limit:
+                raise UploadTooLarge(self.max_bytes)
+        content_type, params = parse_options_header(headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise InvalidUpload("Expected a multipart/form-data body")
+
+        # The parser calls back synchronously; events are handled after each write
+        events = []
+        header = {"name": b"", "value": b""}
+
+        def on_header_end():
+            events.append(("header", header["name"].lower(), header["value"]))
+            header["name"], header["value"] = b"", b""
+
+        def on_header_field(data, start, end):
+            header["name"] += data[start:end]
+
+        def on_header_value(data, start, end):
+            header["value"] += data[start:end]
+
+        parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": lambda: events.append(("begin", None, None)),
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end], None)),
+            "on_part_end": lambda: events.append(("end", None, None)),
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: events.append(("headers", None, None)),
+            "on_end": lambda: events.append(("done", None, None)),
+        })
+
+        fields: Dict[str, str] = {}
+        target: Optional[_SpoolTarget] = None
+        filename: Optional[str] = None
+        received = 0
+        complete = False
+        disposition, name, part = b"", "", None
+        try:
+            async for chunk in stream:
+                received += len(chunk)
+                if received > limit:
+                    raise UploadTooLarge(self.max_bytes)
+                try:
+                    parser.write(chunk)
+                except MultipartParseError as e:
+                    raise InvalidUpload(f"Malformed form body: {e}")
+                for kind, value, extra in events:
+                    if kind == "begin":
+                        disposition, name, part = b"", "", None
+                    elif kind == "header" and value == b"content-disposition":
+                        disposition = extra
+                    elif kind == "headers":
+                        _, options = parse_options_header(disposition)
+                        name = options.get(b"name", b"").decode("utf-8", "replace")
+                        if name == file_field and b"filename" in options:
+                            if target is not None:
+                                raise InvalidUpload(f"More than one {file_field!r} file")
+                            target = self._target()
+                            filename = options[b"filename"].decode("utf-8", "replace")
+                            part = target
+                        else:
+                            part = bytearray()
+                    elif kind == "data":
+                        if isinstance(part, _SpoolTarget):
+                            await part.write(value)
+                        elif part is not None:
+                            part += value
+                            if len(part) > MAX_FORM_FIELD_BYTES:
+                                raise InvalidUpload(f"Form field {name!r} is too large")
+                    elif kind == "end" and isinstance(part, bytearray) and name:
+                        fields[name] = part.decode("utf-8", "replace")
+                    elif kind == "done":
+                        complete = True
+                events.clear()
+            parser.finalize()
+            if not complete:
+                raise InvalidUpload("Form body ended early")
+            if target is None:
+                raise InvalidUpload(f"Missing {file_field!r} file")
+            await target.close()
+        except BaseException:
+            if target is not None:
+                await target.discard()
+            raise
+        return fields, target.result(filename)
+
+    @asynccontextmanager
+    async def open(self, upload: Any) -> AsyncIterator[SpooledUpload]:
+        """Spool an upload for the duration of the block, then delete it."""
+        spooled = await self.spool(upload)
+        try:
+            yield spooled
+        finally:
+            spooled.cleanup()
@@ -0,0 +1,181 @@
+"""
+Workflow Cache - Bounded in-memory map of loaded workflows with LRU and idle-TTL eviction
+"""
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+# Rough per-object overhead used for things we don't walk (node instances, metadata)
+_OBJECT_OVERHEAD = 256
+
+
+def _vector_store_bytes(vector_store: Any) -> int:
+    size = 0
+    index = getattr(vector_store, "index", None)
+    if index is not None:
+        size += int(getattr(index, "ntotal", 0)) * int(getattr(index, "d", 0)) * 4
+    docs = getattr(getattr(vector_store, "docstore", None), "_dict", None) or {}
+    for doc in docs.values():
+        size += len(getattr(doc, "page_content", "") or "") + _OBJECT_OVERHEAD
+    size += len(getattr(vector_store, "index_to_docstore_id", None) or {}) * 64
+    lexical = getattr(vector_store, "lexical_index", None)
+    if lexical is not None:
+        size += lexical.nbytes
+    return size
+
+
+def _estimate(obj: Any, seen: Set[int]) -> int:
+    # Shared objects (the same index in a node, its result and last_run) count once
+    if obj is None or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if hasattr(obj, "index") and hasattr(obj, "docstore"):
+        return _vector_store_bytes(obj)
+    if hasattr(obj, "page_content"):
+        return len(obj.page_content or "") + _OBJECT_OVERHEAD
+    if isinstance(obj, dict):
+        return sum(_estimate(v, seen) for v in obj.values()) + _OBJECT_OVERHEAD
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sum(_estimate(v, seen) for v in obj) + 8 * len(obj)
+    return sys.getsizeof(obj, _OBJECT_OVERHEAD)
+
+
+def estimate_workflow_bytes(workflow: Any) -> int:
+    """Approximate resident size: indexes, docstores and the documents of the last runs."""
+    seen: Set[int] = set()
+    size = 0
+    for node_data in list(getattr(workflow, "nodes", {}).values()):
+        instance = node_data.get("instance")
+        size += _OBJECT_OVERHEAD
+        size += _estimate(getattr(instance, "loaded_vector_store", None), seen)
+        size += _estimate(node_data.get("data"), seen)
+    for attr in ("last_run", "last_ingestion"):
+        run = getattr(workflow, attr, None)
+        if run is not None:
+            size += _estimate(run.results, seen)
+            size += _estimate(run.outputs, seen)
+    return size
+
+
+class WorkflowCache:
+    """Dict-like cache of Workflow objects bounded by entry count, total bytes and idle time.
+
+    Inserts measure only the new entry and evict least-recently-used ones against
+    a running byte total. Reads mark an entry as recently used and possibly grown;
+    it is re-measured, and idle entries expire, in the periodic sweep(). With
+    evict=False (no database to reload from) entries are only ever removed explicitly.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 2 * 1024 ** 3,
+                 idle_ttl: float = 3600.0, evict: bool = True):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.idle_ttl = float(idle_ttl)
+        self.evict = evict
+        self.evictions = 0
+        self.expirations = 0
+        # workflow_id -> [workflow, last_used, size, dirty]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        # Sum of the entries' last measured sizes
+        self._bytes = 0
+
+    @classmethod
+    def from_env(cls, evict: bool = True) -> "WorkflowCache":
+        return cls(
+            max_entries=int(os.getenv("WORKFLOW_CACHE_MAX_ENTRIES", 128)),
+            max_bytes=int(os.getenv("WORKFLOW_CACHE_MAX_BYTES", 2 * 1024 ** 3)),
+            idle_ttl=float(os.getenv("WORKFLOW_CACHE_TTL", 3600)),
+            evict=evict,
+        )
+
+    def __contains__(self, workflow_id: object) -> bool:
+        return workflow_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def __getitem__(self, workflow_id: str) -> Any:
+        entry = self._entries[workflow_id]
+        entry[1] = time.monotonic()
+        # Callers usually go on to run or edit the workflow; re-measure it later
+        entry[3] = True
+        self._entries.move_to_end(workflow_id)
+        return entry[0]
+
+    def get(self, workflow_id: str, default: Any = None) -> Any:
+        if workflow_id not in self._entries:
+            return default
+        return self[workflow_id]
+
+    def __setitem__(self, workflow_id: str, workflow: Any):
+        self._discard(workflow_id)
+        size = estimate_workflow_bytes(workflow)
+        self._entries[workflow_id] = [workflow, time.monotonic(), size, False]
+        self._bytes += size
+        if self.evict:
+            self._evict(keep=workflow_id)
+
+    def __delitem__(self, workflow_id: str):
+        if self._discard(workflow_id) is None:
+            raise KeyError(workflow_id)
+
+    def pop(self, workflow_id: str, default: Any = None) -> Any:
+        entry = self._discard(workflow_id)
+        return entry[0] if entry is not None else default
+
+    def _discard(self, workflow_id: str) -> Optional[list]:
+        entry = self._entries.pop(workflow_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+        return entry
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drop least recently used entries until within budget; O(evicted), nothing is re-measured."""
+        for workflow_id in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            if workflow_id == keep:
+                continue
+            self._discard(workflow_id)
+            self.evictions += 1
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        # Listing must not count as use
+        return iter([(workflow_id, entry[0]) for workflow_id, entry in self._entries.items()])
+
+    def sweep(self, keep: Optional[str] = None):
+        """Re-measure touched entries, drop idle ones, then evict LRU until within budget."""
+        for entry in self._entries.values():
+            if entry[3]:
+                size = estimate_workflow_bytes(entry[0])
+                self._bytes += size - entry[2]
+                entry[2] = size
+                entry[3] = False
+        if not self.evict:
+            return
+        now = time.monotonic()
+        if self.idle_ttl > 0:
+            for workflow_id, entry in list(self._entries.items()):
+                if workflow_id != keep and now - entry[1] > self.idle_ttl:
+                    self._discard(workflow_id)
+                    self.expirations += 1
+        self._evict(keep)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl,
+            "evict": self.evict,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
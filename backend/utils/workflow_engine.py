@@ -1,7 +1,51 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Callable, Awaitable, FrozenSet, Mapping, Tuple
+from types import MappingProxyType
+from collections import deque
 from pydantic import BaseModel
+import asyncio
+import heapq
+import inspect
+import os
+import time
 import uuid
 
+from utils.ingestion_cache import IngestionCache, compute_ingestion_key, hash_bytes
+from utils.executors import run_blocking
+from utils.ingestion_pipeline import buffered
+from utils.retrieval import ScoredRetriever
+
+# Node types whose combined output can be served from the ingestion cache
+INGESTION_NODE_TYPES = ("pdf_loader", "text_splitter", "vector_store")
+
+# Result keys a node reads when the matching input is not wired explicitly
+RESULT_FALLBACK_INPUTS = {
+    "text_splitter": {"documents"},
+    "vector_store": {"documents", "chunks"},
+    "qa_chain": {"vector_store"},
+}
+
+async def _call_process(node: Any, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+    # Async nodes manage their own I/O; sync ones go to the worker pool
+    if inspect.iscoroutinefunction(node.process):
+        return await node.process(*args, **kwargs)
+    return await run_blocking(node.process, *args, **kwargs)
+
+def _emit(on_event: Optional[Callable[[Dict[str, Any]], Any]], event_type: str, **data: Any):
+    if on_event is None:
+        return
+    try:
+        on_event({'type': event_type, 'timestamp': time.time(), **data})
+    except Exception as e:
+        # A broken subscriber must never fail the run
+        print(f"Warning: Failed to publish {event_type} event: {e}")
+
+def _event_metadata(result: Dict[str, Any]) -> Dict[str, Any]:
+    metadata = result.get('metadata') or {}
+    return {
+        k: v for k, v in metadata.items()
+        if v is None or isinstance(v, (str, int, float, bool))
+    }
+
 class NodeConnection(BaseModel):
     id: Optional[str] = None
     source_node: str
@@ -9,12 +53,610 @@ class NodeConnection(BaseModel):
     target_node: str
     target_input: str
 
+def creates_cycle(connections: List[NodeConnection], source_node: str, target_node: str) -> bool:
+    """Whether adding source -> target to these connections would close a loop."""
+    outbound: Dict[str, List[str]] = {}
+    for conn in connections:
+        outbound.setdefault(conn.source_node, []).append(conn.target_node)
+    stack, seen = [target_node], set()
+    while stack:
+        node_id = stack.pop()
+        if node_id == source_node:
+            return True
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+        stack.extend(outbound.get(node_id, ()))
+    return False
+
+class RunContext:
+    """Inputs, outputs, statuses and timings of a single execution; never shared between runs."""
+    
+    def __init__(self, compiled: "CompiledWorkflow", inputs: Optional[Dict[str, Any]] = None):
+        self.run_id = str(uuid.uuid4())
+        self.workflow = compiled
+        self.inputs: Dict[str, Any] = dict(inputs or {})
+        # Port values produced so far, keyed by output name
+        self.results: Dict[str, Any] = dict(self.inputs)
+        self.statuses: Dict[str, str] = {}
+        self.outputs: Dict[str, Dict[str, Any]] = {}
+        self.timings: Dict[str, float] = {}
+        self.skipped: Set[str] = set()
+        self.cached_nodes: List[str] = []
+        # Ingestion cache key of this run's document, when the chain is cacheable
+        self.ingestion_key: Optional[str] = None
+        # Set when the ingestion chain runs as one streaming pipeline this run
+        self.streaming = False
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+    
+    @property
+    def execution_order(self) -> List[str]:
+        return list(self.workflow.execution_order)
+    
+    def record(self, node_id: str, data: Dict[str, Any], duration_ms: float) -> str:
+        # Cancelled nodes were stopped by something else failing; they are not errors themselves
+        status = 'success' if data.get('success') else ('cancelled' if data.get('cancelled') else 'error')
+        self.statuses[node_id] = status
+        self.outputs[node_id] = data
+        self.timings[node_id] = duration_ms
+        return status
+    
+    def failed_nodes(self) -> List[str]:
+        return [node_id for node_id in self.workflow.execution_order
+                if self.statuses.get(node_id) == 'error']
+    
+    def errors(self) -> List[str]:
+        """'<node name>: <error>' for every node that failed in this run."""
+        messages = []
+        for node_id in self.failed_nodes():
+            node = self.workflow.nodes[node_id]
+            error_msg = self.outputs.get(node_id, {}).get('error', 'Unknown error')
+            messages.append(f"{getattr(node, 'name', None) or node_id}: {error_msg}")
+        return messages
+
+class CompiledWorkflow:
+    """Read-only snapshot of a workflow graph that any number of runs can share."""
+    
+    def __init__(
+        self,
+        nodes: Dict[str, Any],
+        connections: List[NodeConnection],
+        custom_prompt: str = "",
+        max_concurrency: int = 4,
+        streaming_ingestion: bool = False,
+        stream_queue_size: int = 4
+    ):
+        self.nodes: Mapping[str, Any] = MappingProxyType(dict(nodes))
+        self.connections: Tuple[NodeConnection, ...] = tuple(connections)
+        self.custom_prompt = custom_prompt
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.streaming_ingestion = bool(streaming_ingestion)
+        self.stream_queue_size = max(1, int(stream_queue_size))
+        
+        # Port wiring: every connection feeding a node, in the order they were made
+        inbound: Dict[str, List[NodeConnection]] = {node_id: [] for node_id in self.nodes}
+        outbound: Dict[str, List[NodeConnection]] = {node_id: [] for node_id in self.nodes}
+        for conn in self.connections:
+            if conn.target_node in inbound:
+                inbound[conn.target_node].append(conn)
+            if conn.source_node in outbound:
+                outbound[conn.source_node].append(conn)
+        self.inbound: Mapping[str, Tuple[NodeConnection, ...]] = MappingProxyType(
+            {node_id: tuple(conns) for node_id, conns in inbound.items()}
+        )
+        self.outbound: Mapping[str, Tuple[NodeConnection, ...]] = MappingProxyType(
+            {node_id: tuple(conns) for node_id, conns in outbound.items()}
+        )
+        
+        self.execution_order: Tuple[str, ...] = self._topological_order()
+        self.position: Mapping[str, int] = MappingProxyType(
+            {node_id: index for index, node_id in enumerate(self.execution_order)}
+        )
+        self.dependencies: Mapping[str, FrozenSet[str]] = MappingProxyType(self._dependencies())
+        dependents: Dict[str, List[str]] = {node_id: [] for node_id in self.execution_order}
+        for node_id in self.execution_order:
+            for upstream_id in self.dependencies[node_id]:
+                dependents[upstream_id].append(node_id)
+        self.dependents: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+            {node_id: tuple(downstream) for node_id, downstream in dependents.items()}
+        )
+        self.ingestion_chain: Optional[Mapping[str, str]] = self._ingestion_chain()
+        self.streaming_chain: Optional[Mapping[str, str]] = self._streaming_chain()
+    
+    def _topological_order(self) -> Tuple[str, ...]:
+        """Kahn's algorithm in O(N+E); ties keep node insertion order."""
+        # Connections to ids that are not nodes (left behind by deletes) are ignored
+        in_degree = {node_id: 0 for node_id in self.nodes}
+        for node_id in self.nodes:
+            for conn in self.inbound[node_id]:
+                if conn.source_node in self.nodes:
+                    in_degree[node_id] += 1
+        ready = deque(node_id for node_id, degree in in_degree.items() if degree == 0)
+        order = []
+        while ready:
+            node_id = ready.popleft()
+            order.append(node_id)
+            for conn in self.outbound[node_id]:
+                if conn.target_node in in_degree:
+                    in_degree[conn.target_node] -= 1
+                    if in_degree[conn.target_node] == 0:
+                        ready.append(conn.target_node)
+        if len(order) != len(self.nodes):
+            cyclic = [node_id for node_id, degree in in_degree.items() if degree > 0]
+            raise ValueError(f"Workflow contains a cycle through nodes: {', '.join(cyclic)}")
+        return tuple(order)
+    
+    def _ingestion_chain(self) -> Optional[Mapping[str, str]]:
+        # Only a single loader -> splitter -> vector store chain is cacheable
+        chain: Dict[str, str] = {}
+        for node_id, node in self.nodes.items():
+            node_type = getattr(node, 'type', None)
+            if node_type in INGESTION_NODE_TYPES:
+                if node_type in chain:
+                    return None
+                chain[node_type] = node_id
+        if len(chain) != len(INGESTION_NODE_TYPES):
+            return None
+        return MappingProxyType(chain)
+    
+    def _streaming_chain(self) -> Optional[Mapping[str, str]]:
+        # Pages and chunks are never held as full lists when streaming, so nothing
+        # outside the chain may read them and the chain must be wired straight through
+        chain = self.ingestion_chain
+        if chain is None:
+            return None
+        loader, splitter, vector_store = chain['pdf_loader'], chain['text_splitter'], chain['vector_store']
+        if any(conn.target_node != splitter for conn in self.outbound[loader]):
+            return None
+        if any(conn.target_node != vector_store for conn in self.outbound[splitter]):
+            return None
+        if self.dependencies[splitter] != {loader} or self.dependencies[vector_store] != {splitter}:
+            return None
+        return chain
+    
+    def _dependencies(self) -> Dict[str, FrozenSet[str]]:
+        deps: Dict[str, Set[str]] = {node_id: set() for node_id in self.execution_order}
+        # Nodes seen so far that produce each result key
+        producers: Dict[str, List[str]] = {}
+        for node_id in self.execution_order:
+            node = self.nodes[node_id]
+            for conn in self.inbound[node_id]:
+                if conn.source_node in self.nodes:
+                    deps[node_id].add(conn.source_node)
+            # Unwired nodes fall back to reading shared results in _run_node, so they
+            # must wait for any earlier node that produces one of those keys
+            fallback_keys = RESULT_FALLBACK_INPUTS.get(node.type)
+            if not deps[node_id] and fallback_keys:
+                for key in fallback_keys:
+                    deps[node_id].update(producers.get(key, ()))
+            for output in node.outputs:
+                producers.setdefault(output, []).append(node_id)
+        return {node_id: frozenset(upstream) for node_id, upstream in deps.items()}
+    
+    def ingestion_key(self, content_hash: str) -> Optional[str]:
+        if self.ingestion_chain is None:
+            return None
+        splitter = self.nodes[self.ingestion_chain['text_splitter']]
+        vector_store = self.nodes[self.ingestion_chain['vector_store']]
+        return compute_ingestion_key(
+            content_hash,
+            splitter.config.chunk_size,
+            splitter.config.chunk_overlap,
+            vector_store.model,
+            splitter.length_unit
+        )
+    
+    def retriever_for(self, vector_store: Any) -> ScoredRetriever:
+        """Retriever over vector_store with the search settings of this workflow's vector store node."""
+        for node in self.nodes.values():
+            if node.type == "vector_store" and hasattr(node, 'as_retriever'):
+                return node.as_retriever(vector_store)
+        return ScoredRetriever(vector_store)
+    
+    def load_ingestion(self, cache: IngestionCache, key: str) -> Optional[Dict[str, Any]]:
+        """Open a cached ingestion; nothing on the nodes changes."""
+        if self.ingestion_chain is None:
+            return None
+        vector_store_node = self.nodes[self.ingestion_chain['vector_store']]
+        return cache.get(key, vector_store_node.ensure_embeddings())
+    
+    async def _restore_ingestion(self, cache: IngestionCache, key: str, context: RunContext) -> List[str]:
+        cached = await run_blocking(self.load_ingestion, cache, key)
+        if cached is None:
+            return []
+        # Keep the workflow's own saved index in step with what it last served, but
+        # only rewrite it when it holds some other document
+        vector_store = cached['vector_store']
+        # The entry was saved from whichever upload first had this content; cite this one.
+        # get() reads a fresh copy, so the chunks are the docstore's documents and ours to edit
+        source = context.results.get('file_name') or context.results.get('file_path')
+        if source:
+            for chunk in cached['chunks']:
+                chunk.metadata['source'] = source
+        vector_store_node = self.nodes[self.ingestion_chain['vector_store']]
+        if await run_blocking(vector_store_node.saved_ingestion_key) != key:
+            await vector_store_node.persist(vector_store, key)
+        context.results['chunks'] = cached['chunks']
+        context.results['vector_store'] = vector_store
+        context.results['retriever'] = self.retriever_for(vector_store)
+        for node_id in self.ingestion_chain.values():
+            context.record(node_id, {
+                'success': True,
+                'cached': True,
+                'metadata': cached['metadata']
+            }, 0.0)
+        print(f"Ingestion cache hit: {key[:12]}")
+        return list(self.ingestion_chain.values())
+    
+    async def _store_ingestion(self, cache: IngestionCache, key: str, context: RunContext):
+        if any(context.statuses.get(node_id) != 'success' for node_id in self.ingestion_chain.values()):
+            return
+        vector_store = context.results.get('vector_store')
+        if vector_store is None:
+            return
+        await run_blocking(cache.put, key, vector_store, {
+            'total_chunks': len(context.results.get('chunks') or []),
+            'index_size': vector_store.index.ntotal
+        })
+    
+    async def _run_scheduled(self, context: RunContext, max_concurrency: int,
+                             on_token: Optional[Callable[[str], Awaitable[Any]]] = None,
+                             on_event: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        """Start each node as soon as everything upstream of it has finished."""
+        remaining = {node_id: len(upstream) for node_id, upstream in self.dependencies.items()}
+        ready: List[Tuple[int, str]] = []
+        running: Dict[asyncio.Task, str] = {}
+        limit = max(1, int(max_concurrency))
+        
+        def finish(node_id: str):
+            for downstream_id in self.dependents[node_id]:
+                remaining[downstream_id] -= 1
+                if remaining[downstream_id] == 0 and downstream_id not in context.skipped:
+                    heapq.heappush(ready, (self.position[downstream_id], downstream_id))
+        
+        for node_id in self.execution_order:
+            if remaining[node_id] == 0 and node_id not in context.skipped:
+                heapq.heappush(ready, (self.position[node_id], node_id))
+        for node_id in self.execution_order:
+            if node_id in context.skipped:
+                finish(node_id)
+        
+        try:
+            while ready or running:
+                # Pop in topological order among ready nodes for predictable logs
+                while ready and len(running) < limit:
+                    _, node_id = heapq.heappop(ready)
+                    running[asyncio.create_task(self._run_node(node_id, context, on_token, on_event))] = node_id
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    finish(running.pop(task))
+        finally:
+            # A cancelled run must not leave its nodes working in the background
+            for task in running:
+                task.cancel()
+    
+    async def _run_streaming_ingestion(self, context: RunContext,
+                                       on_event: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        """Run loader -> splitter -> vector store with pages and chunks flowing between them."""
+        chain = self.streaming_chain
+        loader_id, splitter_id, vector_store_id = chain['pdf_loader'], chain['text_splitter'], chain['vector_store']
+        loader, splitter, vector_store = self.nodes[loader_id], self.nodes[splitter_id], self.nodes[vector_store_id]
+        results = context.results
+        started = time.perf_counter()
+        chunks: List[Any] = []
+        pages = 0
+        
+        def finish(node_id: str, data: Dict[str, Any]):
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            status = context.record(node_id, data, duration_ms)
+            _emit(on_event, 'node_finished', node_id=node_id, node_type=self.nodes[node_id].type,
+                  status=status, duration_ms=duration_ms, metadata=_event_metadata(data), error=data.get('error'))
+        
+        async def page_stream():
+            nonlocal pages
+            async for batch in loader.stream_pages(file_content=results.get('file_content'),
+                                                   file_path=results.get('file_path'),
+                                                   file_name=results.get('file_name')):
+                pages += len(batch)
+                yield batch
+            finish(loader_id, {'success': True, 'metadata': {'total_pages': pages, 'streamed': True}})
+        
+        async def chunk_stream():
+            async for batch in buffered(page_stream(), self.stream_queue_size, loader.type):
+                split = await run_blocking(splitter.split, batch)
+                chunks.extend(split)
+                yield split
+            finish(splitter_id, {'success': True, 'metadata': {
+                'total_chunks': len(chunks),
+                'chunk_size': splitter.config.chunk_size,
+                'chunk_overlap': splitter.config.chunk_overlap,
+                'length_unit': splitter.length_unit,
+                'total_tokens': sum(chunk.metadata.get('token_count', 0) for chunk in chunks),
+                'streamed': True
+            }})
+        
+        print(f"\nStreaming ingestion: {loader_id} -> {splitter_id} -> {vector_store_id}")
+        for node_id in (loader_id, splitter_id, vector_store_id):
+            _emit(on_event, 'node_started', node_id=node_id, node_type=self.nodes[node_id].type,
+                  name=self.nodes[node_id].name)
+        on_progress = None
+        if on_event is not None:
+            on_progress = lambda done, total: _emit(
+                on_event, 'embedding_progress', node_id=vector_store_id, done=done, total=total
+            )
+        try:
+            result = await vector_store.process_stream(
+                buffered(chunk_stream(), self.stream_queue_size, splitter.type),
+                on_progress=on_progress,
+                ingestion_key=context.ingestion_key
+            )
+        except BaseException as e:
+            stages = [loader_id, splitter_id, vector_store_id]
+            if isinstance(e, Exception):
+                print(f"ERROR in streaming ingestion ({getattr(e, 'stage', vector_store.type)}): {e}")
+                failed = {loader.type: loader_id, splitter.type: splitter_id}.get(getattr(e, 'stage', None), vector_store_id)
+                finish(failed, {'success': False, 'error': str(e)})
+                reason = f"{self.nodes[failed].name} failed"
+                upstream = stages[:stages.index(failed)]
+            else:
+                # The run itself was cancelled mid-stream
+                reason, upstream = "run cancelled", stages
+            for node_id in stages:
+                if node_id in context.statuses:
+                    continue
+                if node_id in upstream:
+                    # Still producing when the stage after it gave up; its output went nowhere
+                    finish(node_id, {'success': False, 'cancelled': True, 'error': f"Stopped: {reason}"})
+                else:
+                    finish(node_id, {'success': False, 'error': f"Upstream {reason}"})
+            if not isinstance(e, Exception):
+                raise
+            return
+        
+        results['chunks'] = chunks
+        for output in vector_store.outputs:
+            if output in result:
+                results[output] = result[output]
+        if not result.get('success'):
+            print(f"  Result error: {result.get('error', 'Unknown error')}")
+        finish(vector_store_id, result)
+    
+    async def _run_node(self, node_id: str, context: RunContext,
+                        on_token: Optional[Callable[[str], Awaitable[Any]]] = None,
+                        on_event: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        node = self.nodes[node_id]
+        if context.streaming and node_id in self.streaming_chain.values():
+            # The loader's turn runs the whole chain; the other two are already recorded
+            if node_id == self.streaming_chain['pdf_loader']:
+                await self._run_streaming_ingestion(context, on_event)
+            return
+        results = context.results
+        started = time.perf_counter()
+        _emit(on_event, 'node_started', node_id=node_id, node_type=node.type, name=node.name)
+        
+        try:
+            print(f"\nExecuting node: {node_id} ({node.type})")
+            
+            # Prepare input data for this node
+            input_data = {}
+            
+            # Add initial data (file_path/file_content, question) if node needs it
+            if node.type == "pdf_loader":
+                for key in ('file_path', 'file_content', 'file_name'):
+                    if key in results:
+                        input_data[key] = results[key]
+            elif node.type == "qa_chain" and 'question' in results:
+                input_data['question'] = results['question']
+                if 'custom_prompt' in results:
+                    input_data['custom_prompt'] = results['custom_prompt']
+            
+            # Add data from connections
+            for conn in self.inbound[node_id]:
+                if conn.source_output in results:
+                    input_data[conn.target_input] = results[conn.source_output]
+                    print(f"  Connected input: {conn.target_input} = {conn.source_output} from {conn.source_node}")
+                else:
+                    print(f"  WARNING: Source output '{conn.source_output}' not found in results")
+            
+            print(f"  Input data keys: {list(input_data.keys())}")
+            print(f"  Node expects inputs: {node.inputs}")
+            
+            # Execute node
+            if hasattr(node, 'process'):
+                if node.type == "pdf_loader":
+                    result = await _call_process(
+                        node,
+                        file_content=input_data.get('file_content'),
+                        file_path=input_data.get('file_path'),
+                        file_name=input_data.get('file_name')
+                    )
+                elif node.type == "qa_chain":
+                    # The retriever travels with the call; the shared node instance never holds it
+                    retriever = input_data.get('retriever')
+                    if not retriever and 'vector_store' in results:
+                        try:
+                            print("  Deriving retriever from vector_store...")
+                            retriever = self.retriever_for(results['vector_store'])
+                        except Exception:
+                            retriever = None
+                    qa_kwargs = {
+                        'custom_prompt': input_data.get('custom_prompt', results.get('custom_prompt')),
+                        'retriever': retriever
+                    }
+                    if on_token is not None:
+                        qa_kwargs['on_token'] = on_token
+                    result = await _call_process(
+                        node,
+                        input_data.get('question', results.get('question', '')),
+                        **qa_kwargs
+                    )
+                elif node.type == "vector_store":
+                    # Vector store needs documents (can be chunks from text splitter)
+                    # It creates embeddings internally, so we don't need embeddings input
+                    # Check both 'documents' and 'chunks' from input_data and results
+                    documents = (input_data.get('documents') or 
+                                input_data.get('chunks') or
+                                results.get('documents') or
+                                results.get('chunks'))
+                    if documents:
+                        vector_kwargs = {}
+                        if context.ingestion_key:
+                            vector_kwargs['ingestion_key'] = context.ingestion_key
+                        if on_event is not None:
+                            vector_kwargs['on_progress'] = lambda done, total: _emit(
+                                on_event, 'embedding_progress', node_id=node_id, done=done, total=total
+                            )
+                        result = await _call_process(node, documents, **vector_kwargs)
+                    else:
+                        raise ValueError(f"Vector Store needs 'documents' or 'chunks' input. Available: input_data={list(input_data.keys())}, results={list(results.keys())}")
+                elif node.type == "text_splitter":
+                    # Text splitter expects 'documents' as a positional argument
+                    documents = input_data.get('documents') or results.get('documents')
+                    if documents:
+                        result = await _call_process(node, documents)
+                    else:
+                        raise ValueError(f"Text Splitter needs 'documents' input. Available: input_data={list(input_data.keys())}, results={list(results.keys())}")
+                else:
+                    # For other nodes, pass input_data as keyword arguments
+                    # But only pass the keys that the node expects
+                    filtered_input = {k: v for k, v in input_data.items() if k in node.inputs}
+                    if filtered_input:
+                        result = await _call_process(node, **filtered_input)
+                    else:
+                        raise ValueError(f"Node {node.type} needs inputs {node.inputs}, got: {list(input_data.keys())}")
+                
+                print(f"  Result success: {result.get('success', False)}")
+                if not result.get('success'):
+                    print(f"  Result error: {result.get('error', 'Unknown error')}")
+                    
+                # Store results
+                for output in node.outputs:
+                    if output in result:
+                        results[output] = result[output]
+                        print(f"  Stored output: {output}")
+                
+                duration_ms = round((time.perf_counter() - started) * 1000, 1)
+                status = context.record(node_id, result, duration_ms)
+                _emit(
+                    on_event, 'node_finished',
+                    node_id=node_id,
+                    node_type=node.type,
+                    status=status,
+                    duration_ms=duration_ms,
+                    metadata=_event_metadata(result),
+                    error=result.get('error')
+                )
+            else:
+                raise AttributeError(f"Node {node.type} does not have a 'process' method")
+                
+        except Exception as e:
+            import traceback
+            error_trace = traceback.format_exc()
+            print(f"ERROR in node {node_id} ({node.type}): {str(e)}")
+            print(f"Traceback: {error_trace}")
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            context.record(node_id, {'error': str(e), 'traceback': error_trace}, duration_ms)
+            _emit(
+                on_event, 'node_finished',
+                node_id=node_id,
+                node_type=node.type,
+                status='error',
+                duration_ms=duration_ms,
+                metadata={},
+                error=str(e)
+            )
+            # Don't stop execution, continue with other nodes
+    
+    async def run(
+        self,
+        initial_data: Optional[Dict[str, Any]] = None,
+        ingestion_cache: Optional[IngestionCache] = None,
+        node_types: Optional[Set[str]] = None,
+        max_concurrency: Optional[int] = None,
+        on_token: Optional[Callable[[str], Awaitable[Any]]] = None,
+        on_event: Optional[Callable[[Dict[str, Any]], Any]] = None
+    ) -> RunContext:
+        # node_types restricts the run to a sub-graph, e.g. only the qa_chain
+        # against a vector store supplied in initial_data; on_token receives
+        # streamed answer tokens from the qa_chain node and on_event structured
+        # progress events (run/node started and finished, embedding progress)
+        run_started = time.perf_counter()
+        context = RunContext(self, initial_data)
+        results = context.results
+        if self.custom_prompt:
+            results.setdefault('custom_prompt', self.custom_prompt)
+        
+        print(f"Execution order: {list(self.execution_order)}")
+        print(f"Initial data keys: {list(results.keys())}")
+        
+        cache_key = None
+        if ingestion_cache is not None and (results.get('content_hash') or results.get('file_content')):
+            # Spooled uploads arrive already hashed
+            content_hash = results.get('content_hash') or await run_blocking(hash_bytes, results['file_content'])
+            # Token-sized splitters name their vocabulary in the key, which may load it
+            cache_key = await run_blocking(self.ingestion_key, content_hash)
+            context.ingestion_key = cache_key
+            if cache_key:
+                context.cached_nodes = await self._restore_ingestion(ingestion_cache, cache_key, context)
+        
+        context.skipped.update(context.cached_nodes)
+        if node_types is not None:
+            context.skipped.update(
+                node_id for node_id, node in self.nodes.items()
+                if node.type not in node_types
+            )
+        context.streaming = (
+            self.streaming_ingestion
+            and self.streaming_chain is not None
+            and bool(results.get('file_path') or results.get('file_content'))
+            and not context.skipped.intersection(self.streaming_chain.values())
+        )
+        
+        _emit(on_event, 'run_started', run_id=context.run_id,
+              execution_order=list(self.execution_order), cached_nodes=list(context.cached_nodes))
+        for node_id in context.cached_nodes:
+            _emit(on_event, 'node_finished', node_id=node_id, node_type=self.nodes[node_id].type,
+                  status='success', duration_ms=0.0, metadata={'cached': True}, error=None)
+        
+        await self._run_scheduled(context, max_concurrency or self.max_concurrency, on_token, on_event)
+        
+        if cache_key and not context.cached_nodes:
+            await self._store_ingestion(ingestion_cache, cache_key, context)
+        
+        context.finished_at = time.time()
+        failed = context.failed_nodes()
+        _emit(
+            on_event, 'run_finished',
+            run_id=context.run_id,
+            success=not failed,
+            failed_nodes=failed,
+            duration_ms=round((time.perf_counter() - run_started) * 1000, 1)
+        )
+        print(f"\nFinal results keys: {list(results.keys())}")
+        return context
+
 class Workflow:
     def __init__(self, custom_prompt: Optional[str] = None):
         self.nodes: Dict[str, Any] = {}
         self.connections: List[NodeConnection] = []
         self.execution_order: List[str] = []
         self.custom_prompt: str = (custom_prompt or "").strip()
+        # Upper bound on nodes running at once within a single execution
+        self.max_concurrency: int = int(os.getenv("WORKFLOW_MAX_CONCURRENCY", 4))
+        # Overlap PDF extraction, splitting and embedding instead of running them stage by stage
+        self.streaming_ingestion: bool = os.getenv("STREAMING_INGESTION", "false").lower() in ("1", "true", "yes")
+        # Page/chunk batches buffered between streaming stages
+        self.stream_queue_size: int = int(os.getenv("STREAMING_QUEUE_SIZE", 4))
+        # Most recently finished run; node 'status'/'data' mirror it for the editor
+        self.last_run: Optional[RunContext] = None
+        # Most recently finished run that built or restored an index
+        self.last_ingestion: Optional[RunContext] = None
+        # Compiled plan, reused by every run until the graph is edited
+        self._compiled: Optional[CompiledWorkflow] = None
+    
+    def invalidate(self):
+        self._compiled = None
     
     def set_node_position(self, node_id: str, x: float, y: float):
         if node_id in self.nodes:
@@ -31,9 +673,25 @@ class Workflow:
         }
         # Initialize position placeholder to avoid key errors
         self.set_node_position(node_id, 0.0, 0.0)
+        self.invalidate()
         
     def connect_nodes(self, connection: NodeConnection):
         self.connections.append(connection)
+        self.invalidate()
+    
+    def creates_cycle(self, source_node: str, target_node: str) -> bool:
+        """Whether a source -> target connection would close a loop in the graph."""
+        return creates_cycle(self.connections, source_node, target_node)
+    
+    def update_node_config(self, node_id: str, config: Dict[str, Any], node_instance: Any = None) -> bool:
+        """Store a node's new config, swapping in the instance rebuilt from it if given."""
+        if node_id not in self.nodes:
+            return False
+        self.nodes[node_id]['config'] = config
+        if node_instance is not None:
+            self.nodes[node_id]['instance'] = node_instance
+        self.invalidate()
+        return True
     
     def remove_node(self, node_id: str) -> bool:
         if node_id not in self.nodes:
@@ -45,143 +703,68 @@ class Workflow:
         ]
         if node_id in self.execution_order:
             self.execution_order = [nid for nid in self.execution_order if nid != node_id]
+        self.invalidate()
         return True
         
     def calculate_execution_order(self) -> List[str]:
-        # Simple topological sort for execution order
-        # This ensures nodes are executed after their dependencies
-        visited = set()
-        order = []
-        
-        def visit(node_id: str):
-            if node_id in visited:
-                return
-            visited.add(node_id)
-            
-            # Find nodes that this node depends on
-            for conn in self.connections:
-                if conn.target_node == node_id:
-                    visit(conn.source_node)
-                    
-            order.append(node_id)
-        
-        for node_id in self.nodes:
-            visit(node_id)
-            
-        self.execution_order = order
-        return order
+        return list(self.compile().execution_order)
     
-    async def execute(self, initial_data: Dict[str, Any] = None) -> Dict[str, Any]:
-        self.calculate_execution_order()
-        results = initial_data or {}
-        if self.custom_prompt:
-            results.setdefault('custom_prompt', self.custom_prompt)
-        
-        print(f"Execution order: {self.execution_order}")
-        print(f"Initial data keys: {list(results.keys())}")
-        
-        for node_id in self.execution_order:
-            node_data = self.nodes[node_id]
+    def compile(self) -> CompiledWorkflow:
+        """Return the cached plan, rebuilding it after edits; raises ValueError on cycles."""
+        compiled = self._compiled
+        if (compiled is None
+                or compiled.custom_prompt != self.custom_prompt
+                or compiled.max_concurrency != max(1, int(self.max_concurrency))
+                or compiled.streaming_ingestion != bool(self.streaming_ingestion)
+                or compiled.stream_queue_size != max(1, int(self.stream_queue_size))):
+            compiled = CompiledWorkflow(
+                {node_id: node_data['instance'] for node_id, node_data in self.nodes.items()},
+                self.connections,
+                custom_prompt=self.custom_prompt,
+                max_concurrency=self.max_concurrency,
+                streaming_ingestion=self.streaming_ingestion,
+                stream_queue_size=self.stream_queue_size
+            )
+            self._compiled = compiled
+            self.execution_order = list(compiled.execution_order)
+        return compiled
+    
+    def ingestion_key(self, content_hash: str) -> Optional[str]:
+        return self.compile().ingestion_key(content_hash)
+    
+    def load_ingestion(self, cache: IngestionCache, key: str) -> Optional[Dict[str, Any]]:
+        return self.compile().load_ingestion(cache, key)
+    
+    def retriever_for(self, vector_store: Any) -> ScoredRetriever:
+        return self.compile().retriever_for(vector_store)
+    
+    def load_saved_vector_store(self) -> Optional[Any]:
+        """The index a vector store node saved on an earlier run, else the last one built in memory."""
+        for node_data in list(self.nodes.values()):
             node = node_data['instance']
-            
-            try:
-                print(f"\nExecuting node: {node_id} ({node.type})")
-                
-                # Prepare input data for this node
-                input_data = {}
-                
-                # Add initial data (file_content, question) if node needs it
-                if node.type == "pdf_loader" and 'file_content' in results:
-                    input_data['file_content'] = results['file_content']
-                elif node.type == "qa_chain" and 'question' in results:
-                    input_data['question'] = results['question']
-                    if 'custom_prompt' in results:
-                        input_data['custom_prompt'] = results['custom_prompt']
-                
-                # Add data from connections
-                for conn in self.connections:
-                    if conn.target_node == node_id:
-                        if conn.source_output in results:
-                            input_data[conn.target_input] = results[conn.source_output]
-                            print(f"  Connected input: {conn.target_input} = {conn.source_output} from {conn.source_node}")
-                        else:
-                            print(f"  WARNING: Source output '{conn.source_output}' not found in results")
-                
-                print(f"  Input data keys: {list(input_data.keys())}")
-                print(f"  Node expects inputs: {node.inputs}")
-                
-                # Execute node
-                if hasattr(node, 'process'):
-                    if node.type == "pdf_loader":
-                        file_content = input_data.get('file_content', results.get('file_content', b''))
-                        result = await node.process(file_content)
-                    elif node.type == "qa_chain":
-                        # Initialize QA chain with retriever if available, or derive from vector_store if missing
-                        retriever = input_data.get('retriever')
-                        if not retriever and 'vector_store' in results:
-                            try:
-                                print("  Deriving retriever from vector_store...")
-                                retriever = results['vector_store'].as_retriever()
-                            except Exception:
-                                retriever = None
-                        if retriever and (not hasattr(node, 'qa_chain') or node.qa_chain is None):
-                            print(f"  Initializing QA chain with retriever...")
-                            node.initialize_chain(retriever)
-                        result = node.process(
-                            input_data.get('question', results.get('question', '')),
-                            custom_prompt=input_data.get('custom_prompt', results.get('custom_prompt'))
-                        )
-                    elif node.type == "vector_store":
-                        # Vector store needs documents (can be chunks from text splitter)
-                        # It creates embeddings internally, so we don't need embeddings input
-                        # Check both 'documents' and 'chunks' from input_data and results
-                        documents = (input_data.get('documents') or 
-                                    input_data.get('chunks') or
-                                    results.get('documents') or
-                                    results.get('chunks'))
-                        if documents:
-                            result = node.process(documents)
-                        else:
-                            raise ValueError(f"Vector Store needs 'documents' or 'chunks' input. Available: input_data={list(input_data.keys())}, results={list(results.keys())}")
-                    elif node.type == "text_splitter":
-                        # Text splitter expects 'documents' as a positional argument
-                        documents = input_data.get('documents') or results.get('documents')
-                        if documents:
-                            result = node.process(documents)
-                        else:
-                            raise ValueError(f"Text Splitter needs 'documents' input. Available: input_data={list(input_data.keys())}, results={list(results.keys())}")
-                    else:
-                        # For other nodes, pass input_data as keyword arguments
-                        # But only pass the keys that the node expects
-                        filtered_input = {k: v for k, v in input_data.items() if k in node.inputs}
-                        if filtered_input:
-                            result = node.process(**filtered_input)
-                        else:
-                            raise ValueError(f"Node {node.type} needs inputs {node.inputs}, got: {list(input_data.keys())}")
-                    
-                    print(f"  Result success: {result.get('success', False)}")
-                    if not result.get('success'):
-                        print(f"  Result error: {result.get('error', 'Unknown error')}")
-                        
-                    # Store results
-                    for output in node.outputs:
-                        if output in result:
-                            results[output] = result[output]
-                            print(f"  Stored output: {output}")
-                    
-                    node_data['data'] = result
-                    node_data['status'] = 'success' if result.get('success') else 'error'
-                else:
-                    raise AttributeError(f"Node {node.type} does not have a 'process' method")
-                    
-            except Exception as e:
-                import traceback
-                error_trace = traceback.format_exc()
-                print(f"ERROR in node {node_id} ({node.type}): {str(e)}")
-                print(f"Traceback: {error_trace}")
-                node_data['status'] = 'error'
-                node_data['data'] = {'error': str(e), 'traceback': error_trace}
-                # Don't stop execution, continue with other nodes
-                
-        print(f"\nFinal results keys: {list(results.keys())}")
-        return results
\ No newline at end of file
+            if node.type == "vector_store" and hasattr(node, 'load_vector_store'):
+                vector_store = node.load_vector_store()
+                if vector_store is not None:
+                    return vector_store
+        # Nodes without an index store keep nothing between runs
+        if self.last_ingestion is not None:
+            return self.last_ingestion.results.get('vector_store')
+        return None
+    
+    def _record_last_run(self, context: RunContext):
+        self.last_run = context
+        for node_id, status in context.statuses.items():
+            if node_id in self.nodes:
+                self.nodes[node_id]['status'] = status
+                self.nodes[node_id]['data'] = context.outputs.get(node_id, {})
+                if status == 'success' and self.nodes[node_id]['instance'].type == "vector_store":
+                    self.last_ingestion = context
+    
+    async def run(self, initial_data: Optional[Dict[str, Any]] = None, **kwargs: Any) -> RunContext:
+        """Execute against a fresh snapshot; see CompiledWorkflow.run for the options."""
+        context = await self.compile().run(initial_data, **kwargs)
+        self._record_last_run(context)
+        return context
+    
+    async def execute(self, initial_data: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        return (await self.run(initial_data, **kwargs)).results